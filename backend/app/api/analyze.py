@@ -1,122 +1,324 @@
 from pathlib import Path as FilePath  
-from fastapi import APIRouter, HTTPException, Depends, Request, Path as FastAPIPath
+from fastapi import APIRouter, HTTPException, Depends, Request, Query, Path as FastAPIPath
 
-from ..models.analyze import AnalyzeRequest, AnalyzeResponse
-from ..services.fetch_post import fetch_post_data
-from ..services.sentiment import analyze_sentiments
-from ..services.topic import analyze_topics
+import asyncio
+import json
+import time
+from contextlib import nullcontext
+from fastapi.responses import StreamingResponse
+from ..models.analyze import AnalyzeRequest, AnalyzeBatchRequest, AnalyzeResponse
+from ..services.pipeline import run_pipeline, run_sampled_pipeline, refresh_pipeline
+from ..services.canonical import canonicalize_url, canonical_identity, PostIdentity
+from ..services.singleflight import SingleFlight
+from ..services.admission import AdmissionController, AdmissionRejected
+from ..services.sentiment import batcher
+from ..services.deadline import deadline_scope
+from ..services.resilience import CircuitOpenError
+from ..services.prefetch import prefetcher
+from ..services import search
+from ..services.analysis_store import (
+    find_fresh_analysis, find_user_post, link_user_post, resolve_analysis, get_shared_analysis,
+    analysis_comments, get_comment_bucket, COMMENT_BUCKET_SIZE,
+)
+from ..services.watch import WatchScheduler, WatchLimitError
+from app.core.config import settings
 from pydantic import ValidationError
-from app.db.mongo import db
+from pymongo.errors import PyMongoError
+from app.db import db
 from app.auth import get_current_user
 from bson import ObjectId
-from langdetect import detect, DetectorFactory, LangDetectException
-DetectorFactory.seed = 0  # for deterministic results
 
 router = APIRouter()
 
+# Concurrent analyses of the same post, by any user, share one pipeline run
+inflight = SingleFlight()
+
+# Simultaneous analyses per platform across all batch requests
+BATCH_PLATFORM_CONCURRENCY = {"reddit": 2, "youtube": 4, "stackexchange": 4, "facebook": 1}
+batch_slots = {platform: asyncio.Semaphore(n) for platform, n in BATCH_PLATFORM_CONCURRENCY.items()}
+
+# Interactive requests that start a pipeline run are admitted (or shed) here
+admission = AdmissionController(
+    max_in_flight=settings.admission_max_in_flight,
+    max_queue=settings.admission_max_queue,
+    max_per_user=settings.admission_max_per_user,
+    max_wait=settings.admission_max_wait,
+    max_inference_backlog=settings.admission_max_inference_backlog,
+    inference_backlog=lambda: batcher.backlog,
+)
+
+# How often a running analysis checks whether its client is still connected (seconds)
+DISCONNECT_POLL_INTERVAL = 1.0
+
 @router.post("/analyze", response_model=AnalyzeResponse)
-async def analyze_post(req: AnalyzeRequest, user: dict = Depends(get_current_user)):
+async def analyze_post(req: AnalyzeRequest, request: Request, user: dict = Depends(get_current_user)):
     print("Received /analyze POST request:", req)
+    # Stages plan around the deadline; the hard timeout is a backstop for one that overruns it
+    with deadline_scope(settings.analyze_deadline_seconds):
+        try:
+            return await asyncio.wait_for(
+                cancel_on_disconnect(request, analyze_for_user(
+                    req.url, user.get("uid"), sampling=sampling_options(req), admit=True
+                )),
+                settings.analyze_deadline_seconds,
+            )
+        except AdmissionRejected as e:
+            print(f"🚦 Shed /analyze request ({e.status_code}): {e.reason}")
+            raise HTTPException(status_code=e.status_code, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+        except CircuitOpenError as e:
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(round(e.retry_after))})
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Analysis did not finish in time")
+
+
+async def cancel_on_disconnect(request: Request, coro):
+    """Await `coro`, cancelling it (and the fetches, browser and scoring under it) if the client goes away."""
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                print("🔌 Client disconnected. Cancelling analysis.")
+                raise HTTPException(status_code=499, detail="Client closed request")
+    finally:
+        task.cancel()
+
+
+async def analyze_when_admitted(url: str, user_id: str, progress=None, **options) -> dict:
+    """analyze_for_user for background work (batch items, jobs), admitted like interactive requests.
+
+    A shed attempt waits out its Retry-After and tries again, so background work yields to
+    interactive load instead of failing; AdmissionRejected is raised once the next attempt would
+    start more than `admission_background_patience` seconds after the first.
+    """
+    give_up = time.monotonic() + settings.admission_background_patience
+    while True:
+        try:
+            return await analyze_for_user(url, user_id, progress, admit=True, **options)
+        except AdmissionRejected as e:
+            if time.monotonic() + e.retry_after > give_up:
+                raise
+            await asyncio.sleep(e.retry_after)
+
+
+def sampling_options(req: AnalyzeRequest) -> dict | None:
+    if req.mode != "sample":
+        return None
+    return {
+        "sample_size": req.sampleSize or settings.sample_default_size,
+        "target_width": req.targetIntervalWidth,
+        "confidence": req.confidence,
+    }
+
+
+def satisfies_sampling(analysis: dict, sampling: dict | None) -> bool:
+    """Whether a stored sampled analysis is at least as precise as the one requested."""
+    if sampling is None:
+        return True
+    estimate = analysis.get("estimate") or {}
+    if estimate.get("confidence") != sampling["confidence"]:
+        return False
+    if estimate.get("sampled", 0) < min(sampling["sample_size"], estimate.get("population", 0)):
+        return False
+    width = estimate.get("intervalWidth")
+    return sampling["target_width"] is None or (width is not None and width <= sampling["target_width"])
+
+
+async def analysis_response(platform: str, analysis: dict, post_id: str, include_comments: bool = True) -> dict:
+    """The AnalyzeResponse body for a user's post, as a plain dict whichever path produced it."""
+    try:
+        response_obj = AnalyzeResponse(
+            platform=platform,
+            post=analysis.get("post", {}),
+            comments=await analysis_comments(analysis) if include_comments else [],
+            sentiment=analysis.get("sentiment", {}),
+            topics=analysis.get("topics", []),
+            postId=post_id,
+            coverage=analysis.get("coverage"),
+            estimate=analysis.get("estimate"),
+            degraded=analysis.get("degraded") or None,
+            commentCount=analysis.get("comment_count", len(analysis.get("comments", []))),
+        )
+    except ValidationError as ve:
+        print("Pydantic validation errors:", ve.json())
+        raise HTTPException(status_code=500, detail="Response validation error")
+    return {**response_obj.model_dump(), "postId": post_id}
+
+
+async def analyze_for_user(url: str, user_id: str, progress=None, sampling: dict | None = None,
+                           admit: bool = False, include_comments: bool = True) -> dict:
+    """Analyze `url` for a user, reusing their previous or a shared analysis when possible.
+
+    With `sampling` ({"sample_size", "target_width", "confidence"}) only a stratified sample is scored.
+    With `admit`, starting a new pipeline run goes through admission control and may raise
+    AdmissionRejected; reused and joined analyses are always served.
+    Without `include_comments` the response carries only `commentCount`, not the comments.
+    """
+    try:
+        identity = canonical_identity(url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    canonical_url = canonicalize_url(url)
+    mode = "sample" if sampling else "full"
 
     # 0. Check for existing analysis
-    existing = db["posts"].find_one({"url": req.url, "user_id": user.get("uid")})
+    existing = await find_user_post(user_id, identity, [canonical_url, url], mode)
     if existing:
-        print("⚠️ Post already analyzed by this user. Returning existing result.")
-        return AnalyzeResponse(
-            platform=existing.get("platform", ""),
-            post=existing.get("post", {}),
-            comments=existing.get("comments", []),
-            sentiment=existing.get("sentiment", {}),
-            topics=existing.get("topics", []),
-            postId=str(existing.get("_id"))
-        )
+        analysis = await resolve_analysis(existing)
+        if satisfies_sampling(analysis, sampling):
+            print("⚠️ Post already analyzed by this user. Returning existing result.")
+            admission.record_cheap()
+            return await analysis_response(existing.get("platform", ""), analysis, str(existing.get("_id")),
+                                           include_comments)
+
+    # Reuse a recent analysis of the same post by any user, otherwise run (or join) the pipeline
+    analysis = await find_fresh_analysis(identity, mode)
+    if analysis and satisfies_sampling(analysis, sampling):
+        print("♻️ Reusing shared analysis for", identity.key)
+        admission.record_cheap()
+    else:
+        if sampling:
+            key = f"sample:{identity.key}:{sampling['sample_size']}:{sampling['target_width']}:{sampling['confidence']}"
+            run = lambda: run_sampled_analysis(url, identity, canonical_url, sampling, progress)
+        else:
+            key = identity.key
+            run = lambda: run_analysis(url, identity, canonical_url, progress)
+        joining = inflight.in_flight(key)
+        if joining:
+            print("⏳ Analysis already in progress for this post. Waiting for it.")
+            admission.record_cheap()
+        async with admission.admit(user_id) if admit and not joining else nullcontext():
+            analysis = await inflight.do(key, run)
+
+    try:
+        reference = await link_user_post(user_id, identity, canonical_url, analysis, mode)
+        post_id_str = str(reference["_id"])
+        search.index_user_post(user_id, reference, analysis)
+    except Exception as e:
+        print("Failed to save to MongoDB:", e)
+        raise HTTPException(status_code=500, detail="Database insert error")
 
+    # 5. Return final response
+    print("Returning successful analysis response")
+    return await analysis_response(identity.platform, analysis, post_id_str, include_comments)
 
-   # 1. Fetch post and comments
-    data = await fetch_post_data(req.url)
-    post = data["post"]
-    post["id"] = str(post["id"])
-    print("🔎 fetch_post_data returned post fields:", list(post.keys()))
 
+@router.post("/analyze/batch")
+async def analyze_batch(req: AnalyzeBatchRequest, user: dict = Depends(get_current_user)):
+    """Analyze many URLs at once, streaming one NDJSON line per URL as it completes.
 
-    comments = data["comments"]
+    URLs are canonicalized and deduplicated first; the last line is an aggregate summary. Each
+    URL is admitted like an interactive analysis (see analyze_when_admitted), and a batch runs at
+    most `admission_max_per_user` of them at once, the most admission lets one user hold.
+    """
+    user_id = user.get("uid")
+    print(f"Received /analyze/batch POST request with {len(req.urls)} URLs")
 
-    # Filter only English comments
-    filtered_comments = []
-    for comment in comments:
-        text = comment.get("text", "")
-        if not text.strip():
-            continue
+    unique, results = {}, []
+    for url in req.urls:
         try:
-            lang = detect(text)
-            if lang == "en":
-                filtered_comments.append(comment)
-        except LangDetectException:
-            # If detection fails, skip comment
+            identity = canonical_identity(url)
+        except ValueError as e:
+            results.append({"url": url, "status": "error", "error": str(e)})
             continue
-    comments = filtered_comments
+        unique.setdefault(identity.key, (url, identity))
 
-    platform = data["platform"]
+    user_slots = asyncio.Semaphore(settings.admission_max_per_user)
 
-    print("🔍 Extracted post object:", post)
+    async def analyze_one(url: str, identity: PostIdentity) -> dict:
+        async with user_slots, batch_slots[identity.platform]:
+            try:
+                # The summary line needs only the stored count, not the comments themselves
+                result = await analyze_when_admitted(url, user_id, include_comments=False)
+                return {
+                    "url": url,
+                    "status": "ok",
+                    "platform": result["platform"],
+                    "postId": result["postId"],
+                    "comments": result["commentCount"],
+                    "sentiment": result["sentiment"],
+                }
+            except HTTPException as e:
+                return {"url": url, "status": "error", "error": e.detail}
+            except AdmissionRejected as e:
+                return {"url": url, "status": "error", "error": e.reason, "retryAfter": e.retry_after}
+            except Exception as e:
+                print(f"Batch analysis failed for {url}:", e)
+                return {"url": url, "status": "error", "error": "Analysis failed"}
 
+    async def lines():
+        tasks = [asyncio.ensure_future(analyze_one(url, identity)) for url, identity in unique.values()]
+        try:
+            for result in results:
+                yield json.dumps(result) + "\n"
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                results.append(result)
+                yield json.dumps(result) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+        yield json.dumps({"summary": summarize_batch(req.urls, results)}) + "\n"
 
-    # 2. Sentiment analysis 
-    comment_texts = [c["text"] for c in comments]
-    sentiment_result = analyze_sentiments(comment_texts)
-    sentiment_counts = sentiment_result["counts"]
-    sentiment_labels = sentiment_result["labels"]
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
-# Attach sentiment label to each comment
-    for i, label in enumerate(sentiment_labels):
-        comments[i]["sentiment"] = label
- 
 
+def summarize_batch(urls: list[str], results: list[dict]) -> dict:
+    sentiment = {"positive": 0, "neutral": 0, "negative": 0}
+    platforms = {}
+    succeeded = [r for r in results if r["status"] == "ok"]
+    for r in succeeded:
+        platforms[r["platform"]] = platforms.get(r["platform"], 0) + 1
+        for label, count in r["sentiment"].items():
+            sentiment[label] = sentiment.get(label, 0) + count
+    total_comments = sum(sentiment.values())
+    return {
+        "submitted": len(urls),
+        "processed": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "platforms": platforms,
+        "comments": total_comments,
+        "sentiment": sentiment,
+        "dominantSentiment": max(sentiment, key=sentiment.get) if total_comments else "neutral",
+    }
 
-    # 3. Topic modeling
-    topics = analyze_topics(comment_texts)
-    print("🔍 topics returned:", topics)
-    if "results" not in topics:
-        raise ValueError("Missing 'results' key in topic analysis output")
 
-    # 4. Store in MongoDB
+async def run_analysis(url: str, identity: PostIdentity, canonical_url: str, progress=None) -> dict:
+    # 1-4. Fetch, filter, score and store, with the stages streaming into each other
+    prefetched = await prefetcher.take(identity.key)
+    if prefetched:
+        print("⚡ Using prefetched data for", identity.key)
     try:
-        document = {
-            "platform": platform,
-            "post": post,
-            "url": req.url,
-            "comments": comments,
-            "sentiment": sentiment_counts,
-            "topics": topics["results"],
-            "user_id": user.get("uid"),
-        }
-        result =  db["posts"].insert_one(document)
-        post_id_str = str(result.inserted_id)
-        print(f"Analysis saved to MongoDB with ID: {post_id_str}")
-    except Exception as e:
+        stored = await run_pipeline(url, identity, canonical_url, progress, prefetched)
+    except PyMongoError as e:
         print("Failed to save to MongoDB:", e)
         raise HTTPException(status_code=500, detail="Database insert error")
+    print(f"Shared analysis saved to MongoDB with ID: {stored['_id']}")
+    search.warm(stored)
+    return stored
 
-    # 5. Return final response
-    print("Returning successful analysis response")
+
+async def run_sampled_analysis(url: str, identity: PostIdentity, canonical_url: str, sampling: dict, progress=None) -> dict:
+    prefetched = await prefetcher.take(identity.key)
     try:
-        response_obj = AnalyzeResponse(
-            platform=platform,
-            post=post,
-            comments=comments,
-            sentiment=sentiment_counts,
-            topics=topics["results"],
-            postId=post_id_str,
+        stored = await run_sampled_pipeline(
+            url, identity, canonical_url, sampling["sample_size"], sampling["target_width"],
+            sampling["confidence"], settings.sample_max_size, progress, prefetched,
         )
-    except ValidationError as ve:
-        print("Pydantic validation errors:", ve.json())
-        raise HTTPException(status_code=500, detail="Response validation error")
-
-    return {**response_obj.dict(), "postId": post_id_str}
+    except PyMongoError as e:
+        print("Failed to save to MongoDB:", e)
+        raise HTTPException(status_code=500, detail="Database insert error")
+    print(f"Sampled analysis saved to MongoDB with ID: {stored['_id']}: {stored['estimate']['sampled']} sampled")
+    search.warm(stored)
+    return stored
 
 
 @router.get("/analyze/{post_id}", response_model=AnalyzeResponse)
 async def get_analysis(post_id: str = FastAPIPath(..., description="ID of the post to retrieve"), 
+                       includeComments: bool = Query(False, description="True to embed every comment; otherwise page them via /comments"),
                        user: dict = Depends(get_current_user)):
     try:
         oid = ObjectId(post_id)
@@ -124,7 +326,7 @@ async def get_analysis(post_id: str = FastAPIPath(..., description="ID of the po
         raise HTTPException(status_code=400, detail="Invalid post ID format")
 
     try:
-        document = db["posts"].find_one({"_id": oid, "user_id": user.get("uid")})
+        document = await db["posts"].find_one({"_id": oid, "user_id": user.get("uid")})
     except Exception as e:
         print(f"MongoDB query failed: {e}")
         raise HTTPException(status_code=500, detail="Database error")
@@ -132,12 +334,13 @@ async def get_analysis(post_id: str = FastAPIPath(..., description="ID of the po
     if not document:
         raise HTTPException(status_code=404, detail="Post not found")
 
-    post_data = document.get("post", {})
+    analysis = await resolve_analysis(document)
+    post_data = analysis.get("post", {})
     if "photo_url" not in post_data:
         post_data["photo_url"] = ""
-    comments_data = document.get("comments", [])
-    sentiment = document.get("sentiment", {})
-    topics = document.get("topics", [])
+    comments_data = await analysis_comments(analysis) if includeComments else []
+    sentiment = analysis.get("sentiment", {})
+    topics = analysis.get("topics", [])
 
     return AnalyzeResponse(
         platform=document.get("platform", ""),
@@ -145,5 +348,126 @@ async def get_analysis(post_id: str = FastAPIPath(..., description="ID of the po
         comments=comments_data,
         sentiment=sentiment,
         topics=topics,
-        postId=str(document.get("_id"))
+        postId=str(document.get("_id")),
+        coverage=analysis.get("coverage"),
+        estimate=analysis.get("estimate"),
+        degraded=analysis.get("degraded") or None,
+        commentCount=analysis.get("comment_count", len(analysis.get("comments", []))),
+    )
+
+
+@router.get("/analyze/{post_id}/comments")
+async def get_analysis_comments(post_id: str = FastAPIPath(..., description="ID of the post"),
+                                bucket: int = Query(0, ge=0, description="Comment bucket number, from 0"),
+                                user: dict = Depends(get_current_user)):
+    """One fixed-size bucket of a post's comments, for clients that load comments lazily."""
+    try:
+        oid = ObjectId(post_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid post ID format")
+
+    document = await db["posts"].find_one({"_id": oid, "user_id": user.get("uid")})
+    if not document:
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    analysis = await resolve_analysis(document)
+    page = await get_comment_bucket(analysis, bucket)
+    if page is None:
+        raise HTTPException(status_code=404, detail="No such comment bucket")
+    total = analysis.get("comment_count", len(analysis.get("comments", [])))
+    return {
+        "postId": post_id,
+        "bucket": bucket,
+        "buckets": -(-total // COMMENT_BUCKET_SIZE),
+        "commentCount": total,
+        "comments": page["comments"],
+    }
+
+
+async def get_user_post(post_id: str, user: dict) -> dict:
+    try:
+        oid = ObjectId(post_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid post ID format")
+
+    document = await db["posts"].find_one({"_id": oid, "user_id": user.get("uid")})
+    if not document:
+        raise HTTPException(status_code=404, detail="Post not found")
+    if "analysis_id" not in document:
+        raise HTTPException(status_code=400, detail="This analysis predates refresh support; analyze the post again")
+    if document.get("mode") == "sample":
+        raise HTTPException(status_code=400, detail="Sampled analyses cannot be refreshed or watched; run a full analysis")
+    return document
+
+
+async def refresh_shared(analysis: dict) -> dict:
+    # Concurrent refreshes of the same shared analysis would merge the same new comments twice
+    key = f"refresh:{analysis['platform']}:{analysis['post_id']}"
+    refreshed = await inflight.do(key, lambda: refresh_pipeline(analysis))
+    search.warm(refreshed)
+    return refreshed
+
+
+async def poll_watched_analysis(analysis_id) -> int:
+    analysis = await get_shared_analysis(analysis_id)
+    if not analysis:
+        raise LookupError(analysis_id)
+    refreshed = await refresh_shared(analysis)
+    return refreshed["last_refresh"]["new_comments"]
+
+
+watcher = WatchScheduler(
+    refresher=poll_watched_analysis,
+    max_watched=settings.watch_max_posts,
+    min_interval=settings.watch_min_interval,
+    max_interval=settings.watch_max_interval,
+)
+
+
+@router.post("/analyze/{post_id}/refresh", response_model=AnalyzeResponse)
+async def refresh_analysis(post_id: str = FastAPIPath(..., description="ID of the post to refresh"),
+                           includeComments: bool = Query(False, description="True to embed every comment; otherwise page them via /comments"),
+                           user: dict = Depends(get_current_user)):
+    document = await get_user_post(post_id, user)
+    analysis = await resolve_analysis(document)
+    if not analysis:
+        raise HTTPException(status_code=404, detail="Analysis not found")
+
+    try:
+        refreshed = await refresh_shared(analysis)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    print(f"🔄 Refreshed analysis {refreshed['_id']}: {refreshed['last_refresh']}")
+
+    return AnalyzeResponse(
+        platform=refreshed.get("platform", ""),
+        post=refreshed.get("post", {}),
+        comments=await analysis_comments(refreshed) if includeComments else [],
+        sentiment=refreshed.get("sentiment", {}),
+        topics=refreshed.get("topics", []),
+        postId=str(document["_id"]),
+        commentCount=refreshed.get("comment_count", 0),
+        lastRefresh={**refreshed["last_refresh"], "at": refreshed["last_refresh"]["at"].isoformat() + "Z"},
     )
+
+
+@router.post("/analyze/{post_id}/watch")
+async def watch_analysis(post_id: str = FastAPIPath(..., description="ID of the post to watch"),
+                         user: dict = Depends(get_current_user)):
+    document = await get_user_post(post_id, user)
+    if document.get("platform") == "facebook":
+        raise HTTPException(status_code=400, detail="Watching is not supported for Facebook posts")
+    try:
+        watch = watcher.watch(document["analysis_id"], document["analysis_id"], user.get("uid"))
+    except WatchLimitError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"postId": post_id, **watch.to_dict()}
+
+
+@router.delete("/analyze/{post_id}/watch")
+async def unwatch_analysis(post_id: str = FastAPIPath(..., description="ID of the post to stop watching"),
+                           user: dict = Depends(get_current_user)):
+    document = await get_user_post(post_id, user)
+    if not watcher.unwatch(document["analysis_id"], user.get("uid")):
+        raise HTTPException(status_code=404, detail="Post is not being watched")
+    return {"message": "Stopped watching post"}
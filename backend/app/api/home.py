@@ -5,9 +5,15 @@ from app.auth import verify_token
 from bson import ObjectId
 from typing import List
 from app.models.home import FeedbackItem, HomeResponse, Stats, PostSentiment
+from app.core.config import settings
+from app.services.analysis_store import get_user_stats
+from app.services.pagination import keyset_page
 
 router = APIRouter()
 
+# Only what the dashboard renders; comment bodies are never loaded here
+HOME_POST_PROJECTION = {"post": 1, "comment_count": 1, "sentiment": 1, "created_at": 1}
+
 @router.get("/home")
 async def get_home_data(request: Request, db=Depends(get_database), user=Depends(verify_token)):
     print("/api/home endpoint hit!")
@@ -27,18 +33,13 @@ async def get_home_data(request: Request, db=Depends(get_database), user=Depends
     if not isinstance(photo_url, str):
         photo_url = str(photo_url)
 
-    # Get posts for this user
-    posts = await db.posts.find({"user_id": user_id}).sort("created_at", -1).to_list(length=100)
-    total_posts = len(posts)
-    all_comments = [comment for post in posts for comment in post.get("comments", [])]
-    total_comments = len(all_comments)
-
-    # Overall sentiment
-    sentiment_counts = {"positive": 0, "neutral": 0, "negative": 0}
-    for comment in all_comments:
-        sentiment = comment.get("sentiment", "").lower()
-        if sentiment in sentiment_counts:
-            sentiment_counts[sentiment] += 1
+    # Totals come from the per-user rollup; posts carry their own sentiment aggregates
+    stats = await get_user_stats(user_id)
+    # The chart shows the newest page of posts
+    posts, _ = await keyset_page(db.posts, {"user_id": user_id}, HOME_POST_PROJECTION, settings.posts_page_max_size)
+    total_posts = stats["posts"]
+    total_comments = stats["comments"]
+    sentiment_counts = stats["sentiment"]
 
     most_common_sentiment = (
         max(sentiment_counts, key=sentiment_counts.get)
@@ -53,7 +54,7 @@ async def get_home_data(request: Request, db=Depends(get_database), user=Depends
         title = post_data.get("text", "[No text]").split("\n")[0]
         author = post_data.get("author", "Unknown")
         avatar = post_data.get("avatar", None)
-        breakdown = count_sentiments(p.get("comments", []))
+        breakdown = count_sentiments(p)
         post_sentiments.append(PostSentiment(
             id=pid,
             title=title,
@@ -71,7 +72,6 @@ async def get_home_data(request: Request, db=Depends(get_database), user=Depends
         post_text = post_data.get("text", "[No text]")
         post_author = post_data.get("author", "Unknown")
         post_sentiment = infer_post_sentiment(post)
-        post_comments = post.get("comments", [])
 
         recent.append({
             "id": str(post.get("_id", ObjectId())),
@@ -80,7 +80,7 @@ async def get_home_data(request: Request, db=Depends(get_database), user=Depends
             "avatar": avatar,
             "sentiment": post_sentiment,
             "emoji": sentiment_emoji(post_sentiment),
-            "sentimentBreakdown": count_sentiments(post_comments)
+            "sentimentBreakdown": count_sentiments(post)
         })
 
     return HomeResponse(
@@ -96,12 +96,8 @@ async def get_home_data(request: Request, db=Depends(get_database), user=Depends
     )
 
 def infer_post_sentiment(post):
-    comment_sentiments = [c.get("sentiment", "neutral").lower() for c in post.get("comments", [])]
-    counts = {"positive": 0, "neutral": 0, "negative": 0}
-    for s in comment_sentiments:
-        if s in counts:
-            counts[s] += 1
-    if not comment_sentiments:
+    counts = count_sentiments(post)
+    if not any(counts.values()):
         return "neutral"
     return max(counts, key=counts.get)
 
@@ -113,10 +109,7 @@ def sentiment_emoji(sentiment):
     }
     return mapping.get(sentiment.lower(), "😐")
 
-def count_sentiments(comments):
-    counts = {"positive": 0, "neutral": 0, "negative": 0}
-    for c in comments:
-        sentiment = c.get("sentiment", "neutral").lower()
-        if sentiment in counts:
-            counts[sentiment] += 1
-    return counts
+def count_sentiments(post):
+    # The stored per-post sentiment aggregate
+    stored = post.get("sentiment") or {}
+    return {label: stored.get(label, 0) for label in ("positive", "neutral", "negative")}
@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+
+from app.api.analyze import analyze_when_admitted, sampling_options
+from app.auth import get_current_user
+from app.core.config import settings
+from app.db import db as async_db
+from app.models.analyze import AnalyzeRequest
+from app.services.deadline import deadline_scope
+from app.services.jobs import JobQueue, PermanentJobError, TERMINAL_STATUSES
+
+router = APIRouter()
+
+
+async def run_analysis_job(job: dict, progress) -> dict:
+    try:
+        # The job timeout doubles as the pipeline's deadline, so stages degrade before it kills the job
+        with deadline_scope(settings.job_timeout_seconds):
+            # Admitted like an interactive analysis; if it stays shed the job is retried later
+            result = await analyze_when_admitted(
+                job["payload"]["url"], job["user_id"], progress, sampling=job["payload"].get("sampling"),
+                include_comments=False,
+            )
+    except HTTPException as e:
+        if e.status_code < 500:
+            raise PermanentJobError(e.detail)
+        raise
+    return {"postId": result["postId"]}
+
+
+queue = JobQueue(
+    async_db["jobs"],
+    handler=run_analysis_job,
+    workers=settings.job_workers,
+    lease_seconds=settings.job_lease_seconds,
+    max_attempts=settings.job_max_attempts,
+    job_timeout=settings.job_timeout_seconds,
+)
+
+
+def job_status(job: dict) -> dict:
+    return {
+        "jobId": str(job["_id"]),
+        "status": job["status"],
+        "stage": job.get("stage"),
+        "percent": job.get("percent", 0),
+        "commentsScored": job.get("comments_scored"),
+        "attempts": job.get("attempts", 0),
+        "result": job.get("result"),
+        "error": job.get("error"),
+    }
+
+
+@router.post("/jobs/analyze", status_code=202)
+async def submit_analysis_job(req: AnalyzeRequest, user: dict = Depends(get_current_user)):
+    job_id = await queue.submit("analyze", {"url": req.url, "sampling": sampling_options(req)}, user.get("uid"))
+    return {"jobId": job_id, "status": "queued"}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, user: dict = Depends(get_current_user)):
+    job = await queue.get(job_id, user.get("uid"))
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_status(job)
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job(job_id: str, user: dict = Depends(get_current_user)):
+    """Server-sent events with the job's progress until it succeeds, fails or is gone (status "gone")."""
+    user_id = user.get("uid")
+    if not await queue.get(job_id, user_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        last = None
+        while True:
+            job = await queue.get(job_id, user_id)
+            if job is None:
+                # Deleted or expired while streaming
+                yield f"data: {json.dumps({'jobId': job_id, 'status': 'gone'})}\n\n"
+                return
+            status = job_status(job)
+            if status != last:
+                yield f"data: {json.dumps(status)}\n\n"
+                last = status
+            if job["status"] in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(1)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
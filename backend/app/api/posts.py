@@ -1,20 +1,66 @@
 # app/api/posts.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from app.auth import get_current_user
+from app.core.config import settings
 from app.db import get_database
-from typing import List
+from app.api.analyze import watcher
+from app.services import search
+from app.services.analysis_store import attach_analyses, delete_user_post
+from app.services.pagination import keyset_page, InvalidCursor
+from bson import ObjectId
+from typing import List, Literal, Optional
 
 router = APIRouter(prefix="/api/posts", tags=["Posts"])
 
+# Listings never include comments; the detail endpoint (/api/analyze/{post_id}) serves those
+SUMMARY_PROJECTION = {
+    "url": 1, "platform": 1, "mode": 1, "post": 1, "created_at": 1, "comment_count": 1, "sentiment": 1,
+}
+FULL_PROJECTION = {"comments": 0}
+
+
 @router.get("/mine")
-async def get_my_posts(user_data: dict = Depends(get_current_user), db=Depends(get_database)):
+async def get_my_posts(response: Response,
+                       view: Literal["summary", "full"] = Query("summary", description="full adds topics and references"),
+                       limit: int = Query(settings.posts_page_default_size, ge=1, le=settings.posts_page_max_size),
+                       cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+                       user_data: dict = Depends(get_current_user), db=Depends(get_database)):
+    """The user's posts, newest first, one page at a time; the next page's cursor is in X-Next-Cursor."""
     user_id = user_data["uid"]  # Firebase UID
 
-    posts_cursor = db.posts.find({ "user_id": user_id }) 
-    posts = []
+    projection = FULL_PROJECTION if view == "full" else SUMMARY_PROJECTION
+    try:
+        posts, next_cursor = await keyset_page(db.posts, {"user_id": user_id}, projection, limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if view == "full":
+        posts = await attach_analyses(posts)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
 
-    async for post in posts_cursor:
+    for post in posts:
         post["_id"] = str(post["_id"])
-        posts.append(post)
-
+        if "analysis_id" in post:
+            post["analysis_id"] = str(post["analysis_id"])
     return posts
+
+
+@router.delete("/{post_id}")
+async def delete_post(post_id: str, user_data: dict = Depends(get_current_user), db=Depends(get_database)):
+    """Remove a post from the user's list; the shared analysis stays for other users."""
+    user_id = user_data["uid"]
+    try:
+        oid = ObjectId(post_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid post ID format")
+
+    post = await delete_user_post(user_id, oid)
+    if post is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+
+    analysis_id = post.get("analysis_id")
+    if analysis_id is None or not await db.posts.find_one({"user_id": user_id, "analysis_id": analysis_id}, {"_id": 1}):
+        search.unindex_user_post(user_id, {**post, "_id": oid})
+        if analysis_id is not None:
+            watcher.unwatch(analysis_id, user_id)
+    return {"message": "Post deleted", "postId": post_id}
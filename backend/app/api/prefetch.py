@@ -0,0 +1,39 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.api.analyze import admission
+from app.auth import get_current_user
+from app.models.analyze import PrefetchRequest
+from app.services.admission import AdmissionRejected
+from app.services.analysis_store import find_fresh_analysis, find_user_post
+from app.services.canonical import canonicalize_url, canonical_identity
+from app.services.prefetch import prefetcher
+
+router = APIRouter()
+
+
+@router.post("/prefetch", status_code=202)
+async def prefetch_post(req: PrefetchRequest, user: dict = Depends(get_current_user)):
+    """Start fetching a pasted URL so the /api/analyze that follows can skip the network fetch.
+
+    Returns immediately; status is "analyzed" when an existing analysis will be reused anyway,
+    otherwise the prefetch state ("started", "running" or "ready"). New prefetches are refused
+    with 429 beyond the per-user limit, and with 503 unless an analysis slot is idle.
+    """
+    try:
+        identity = canonical_identity(req.url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    canonical_url = canonicalize_url(req.url)
+
+    current = prefetcher.status(identity.key)
+    if await find_user_post(user.get("uid"), identity, [canonical_url, req.url]) or await find_fresh_analysis(identity):
+        status = "analyzed"
+    elif current in ("running", "ready"):
+        status = current
+    else:
+        try:
+            admission.check_speculative()
+            status = prefetcher.start(identity.key, req.url, user.get("uid"), req.filterLanguage)
+        except AdmissionRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=e.reason, headers={"Retry-After": str(e.retry_after)})
+    return {"status": status, "platform": identity.platform, "canonicalUrl": canonical_url}
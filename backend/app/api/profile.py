@@ -1,7 +1,9 @@
+from datetime import datetime
+
 from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
 from app.auth import get_current_user
-from app.db.mongo import db
+from app.db import db
 
 router = APIRouter()
 
@@ -16,7 +18,7 @@ class ProfileUpdateRequest(BaseModel):
 @router.get("/profile", response_model=ProfileResponse)
 async def get_profile(request: Request, user=Depends(get_current_user)):
     user_id = user["uid"]
-    user_data =  db["users"].find_one({"uid": user_id})
+    user_data = await db["users"].find_one({"uid": user_id})
     
     if not user_data:
         return ProfileResponse()  # fallback if not found
@@ -36,5 +38,9 @@ async def update_profile(data: ProfileUpdateRequest, request: Request, user=Depe
         "photoURL": data.photoURL
     }
 
-    db["users"].update_one({"uid": user_id}, {"$set": update}, upsert=True)
+    await db["users"].update_one(
+        {"uid": user_id},
+        {"$set": update, "$setOnInsert": {"created_at": datetime.utcnow()}},
+        upsert=True,
+    )
     return {"message": "Profile updated successfully"}
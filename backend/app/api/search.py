@@ -1,18 +1,18 @@
-# backend/app/routes/search.py
+# backend/app/api/search.py
 
-from fastapi import APIRouter, Query, HTTPException
-from typing import List, Optional
+from fastapi import APIRouter, Query, Depends, HTTPException
+from typing import Dict, List, Literal, Optional
 from datetime import datetime, timedelta
-from pymongo import DESCENDING
-from bson import ObjectId
 from pydantic import BaseModel, Field
-from app.db.mongo import db
-import re
+from app.auth import get_current_user
+from app.models.analyze import Comment
+from app.services import search
+from app.services.analysis_store import COMMENT_BUCKET_SIZE
+from app.services.pagination import InvalidCursor
+from app.services.timestamps import parse_timestamp
 
 router = APIRouter()
 
-posts_col = db['feedback']['posts']
-
 # Response model
 class PostSearchResult(BaseModel):
     id: str = Field(..., alias="_id")
@@ -20,10 +20,36 @@ class PostSearchResult(BaseModel):
     avatar: Optional[str] = None
     text: str
     photo_url: Optional[str] = None
-    timestamp: datetime
+    timestamp: Optional[datetime] = None
     platform: str
     sentiment: Optional[str] = None
     comments_count: int
+    score: Optional[float] = None  # BM25 relevance; absent when listing without a query
+
+class SearchFacets(BaseModel):
+    platform: Dict[str, int]
+    sentiment: Dict[str, int]
+    time: Dict[str, int]  # "1d", "7d", "30d" and "any"
+
+class SearchResponse(BaseModel):
+    results: List[PostSearchResult]
+    nextCursor: Optional[str] = None  # pass back as `cursor` for the next page; absent on the last page
+    total: int  # results matching every filter, across all pages
+    facets: SearchFacets  # each facet counted with the other facets' filters applied
+
+class CommentSearchResult(BaseModel):
+    postId: str  # the user's post; open it with /api/analyze/{postId}
+    platform: str
+    postText: str
+    position: int  # index among the post's stored comments
+    bucket: int  # page of /api/analyze/{postId}/comments holding this comment
+    comment: Comment
+    score: float
+
+class CommentSearchResponse(BaseModel):
+    results: List[CommentSearchResult]
+    nextCursor: Optional[str] = None
+    total: int
 
 def parse_time_filter(time_str: str) -> Optional[datetime]:
     if time_str == "any":
@@ -37,51 +63,87 @@ def parse_time_filter(time_str: str) -> Optional[datetime]:
             return None
     return None
 
-@router.post("/search", response_model=List[PostSearchResult])
+@router.post("/search", response_model=SearchResponse)
 async def search_posts(
-    query: Optional[str] = Query(None, description="Text search in post content"),
+    query: Optional[str] = Query(None, description="Text search in post content and comments"),
     platform: Optional[str] = Query("all", description="Platform filter"),
     time: Optional[str] = Query("any", description="Time filter, e.g. '1d', '7d', '30d' or 'any'"),
     sentiments: Optional[List[str]] = Query(None, description="Sentiment filter, multiple allowed"),
     limit: int = Query(20, ge=1, le=100),
-    skip: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="nextCursor of the previous page"),
+    user: dict = Depends(get_current_user),
 ):
-    mongo_filter = {}
-
-    # Platform filter
-    if platform and platform.lower() != "all":
-        mongo_filter["platform"] = platform.lower()
-
-    # Time filter
-    time_threshold = parse_time_filter(time.lower() if time else "any")
-    if time_threshold:
-        mongo_filter["timestamp"] = {"$gte": time_threshold}
+    """Search the current user's analyzed posts, ranked by BM25 over post and comment text."""
+    try:
+        found = await search.search_posts(
+            user.get("uid"),
+            query,
+            platform=platform.lower() if platform and platform.lower() != "all" else None,
+            since=parse_time_filter(time.lower() if time else "any"),
+            sentiments=[s.lower() for s in sentiments] if sentiments else None,
+            limit=limit,
+            cursor=cursor,
+        )
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    # Sentiment filter
-    if sentiments:
-        sentiments_lower = [s.lower() for s in sentiments]
-        mongo_filter["sentiment"] = {"$in": sentiments_lower}
-
-    # Text search filter
-    if query:
-        escaped_query = re.escape(query)
-        mongo_filter["text"] = {"$regex": escaped_query, "$options": "i"}
+    results = [
+        {
+            "_id": str(doc["_id"]),
+            "author": doc.get("post", {}).get("author", ""),
+            "avatar": doc.get("post", {}).get("avatar"),
+            "text": doc.get("post", {}).get("text", ""),
+            "photo_url": doc.get("post", {}).get("photo_url"),
+            "timestamp": parse_timestamp(doc.get("post", {}).get("timestamp")) or doc.get("created_at"),
+            "platform": doc.get("platform", ""),
+            "sentiment": search.dominant_sentiment(doc),
+            "comments_count": doc.get("comment_count", 0),
+            "score": score,
+        }
+        for doc, score in found["results"]
+    ]
+    return {**found, "results": results}
 
-    # Query MongoDB
-    cursor = posts_col.find(mongo_filter).sort("timestamp", DESCENDING).skip(skip).limit(limit)
 
-    results = []
-    for doc in cursor:
-        results.append({
-            "_id": str(doc["_id"]),
-            "author": doc.get("author", ""),
-            "avatar": doc.get("avatar"),
-            "text": doc.get("text", ""),
-            "photo_url": doc.get("photo_url"),
-            "timestamp": doc.get("timestamp"),
-            "platform": doc.get("platform"),
-            "sentiment": doc.get("sentiment"),
-            "comments_count": len(doc.get("comments", []))
-        })
+@router.get("/search/comments", response_model=CommentSearchResponse)
+async def search_comments(
+    query: str = Query(..., min_length=1, description="Text search in comments"),
+    platform: Optional[str] = Query("all", description="Platform filter"),
+    time: Optional[str] = Query("any", description="Comment age filter, e.g. '1d', '7d', '30d' or 'any'"),
+    sentiments: Optional[List[str]] = Query(None, description="Sentiment filter, multiple allowed"),
+    author: Optional[str] = Query(None, description="Comment author, case-insensitive"),
+    sort: Literal["relevance", "newest"] = Query("relevance"),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="nextCursor of the previous page"),
+    user: dict = Depends(get_current_user),
+):
+    """Search comments across all of the current user's analyzed posts."""
+    try:
+        found = await search.search_comments(
+            user.get("uid"),
+            query,
+            platform=platform.lower() if platform and platform.lower() != "all" else None,
+            since=parse_time_filter(time.lower() if time else "any"),
+            sentiments=[s.lower() for s in sentiments] if sentiments else None,
+            author=author,
+            order=sort,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        # An invalid cursor, or a query with nothing to search for
+        raise HTTPException(status_code=400, detail=str(e))
 
-    return results
+    results = [
+        {
+            "postId": str(doc["_id"]),
+            "platform": doc.get("platform", ""),
+            "postText": doc.get("post", {}).get("text", ""),
+            "position": position,
+            "bucket": position // COMMENT_BUCKET_SIZE,
+            "comment": comment,
+            "score": score,
+        }
+        for doc, position, comment, score in found["results"]
+    ]
+    return {**found, "results": results}
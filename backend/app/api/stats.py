@@ -0,0 +1,29 @@
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.auth import get_current_user
+from app.core.config import settings
+
+from app.api.analyze import admission
+from app.services.cache import cache
+from app.services.prefetch import prefetcher
+from app.services.sentiment import batcher
+from app.services.ratelimit import scheduler
+from app.services.resilience import resilience
+from app.services.search import index as search_index
+
+router = APIRouter()
+
+@router.get("/stats")
+async def get_stats(user: dict = Depends(get_current_user)):
+    # Operational state (per-credential quotas, cache and queue counters) is for operators only
+    if settings.stats_admin_uids and user.get("uid") not in settings.stats_admin_uids:
+        raise HTTPException(status_code=403, detail="Not allowed")
+    return {
+        "rate_limits": scheduler.snapshot(),
+        "upstreams": resilience.snapshot(),
+        "response_cache": {**cache.stats, "bytes": cache.size_bytes},
+        "admission": admission.snapshot(),
+        "prefetch": prefetcher.snapshot(),
+        "sentiment_batcher": {**batcher.stats, "backlog": batcher.backlog},
+        "search_index": search_index.snapshot(),
+    }
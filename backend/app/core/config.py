@@ -11,6 +11,98 @@ class Settings(BaseSettings):
     reddit_user_agent: str = "feedback-analyzer"
     youtube_api_key: str
 
+    # MongoDB: one async client for the whole app, opened and closed with its lifespan
+    mongo_uri: str = "mongodb://localhost:27017"
+    mongo_db: str = "feedback"
+    mongo_max_pool_size: int = 50
+    mongo_min_pool_size: int = 0
+    mongo_max_idle_time_ms: int = 60000
+    mongo_connect_timeout_ms: int = 5000
+    mongo_server_selection_timeout_ms: int = 5000
+    mongo_socket_timeout_ms: int = 30000
+    mongo_compressors: str = "zlib"  # comma-separated; zstd/snappy need their Python packages
+
+    # Raw platform response cache (seconds)
+    response_cache_dir: str = ".cache/responses"
+    response_cache_ttl_reddit: int = 300
+    response_cache_ttl_youtube: int = 900
+    response_cache_ttl_stackexchange: int = 1800
+    response_cache_max_bytes: int = 512 * 2**20  # least recently used entries are evicted beyond this
+
+    # Platform rate limits (requests per second) and YouTube Data API daily quota units
+    # Reddit allows 100 OAuth requests per minute per client id, averaged over a 10 minute window,
+    # so short bursts above the steady rate are fine
+    rate_limit_reddit: float = 100 / 60
+    rate_burst_reddit: int = 10
+    rate_limit_youtube: float = 5.0
+    rate_limit_stackexchange: float = 5.0
+    rate_limit_facebook: float = 1.0
+    youtube_daily_quota: int = 10000
+
+    # Speculative prefetch of pasted URLs
+    prefetch_ttl_seconds: float = 120
+    prefetch_max_entries: int = 64
+    prefetch_max_per_user: int = 3
+
+    # Upstream resilience: circuit breaker, retries (at most this share of extra load)
+    breaker_failure_threshold: int = 5
+    breaker_reset_seconds: float = 30
+    retry_max_attempts: int = 3
+    retry_budget_ratio: float = 0.1
+
+    # Shared analyses younger than this are reused instead of re-fetching the post
+    shared_analysis_max_age_hours: int = 6
+
+    # Watch mode: per-node cap and bounds of the adaptive re-poll interval (seconds)
+    watch_max_posts: int = 200
+    watch_min_interval: float = 60
+    watch_max_interval: float = 3600
+
+    # Reddit "load more comments" expansion budget per thread. Calls still take reddit rate permits,
+    # so concurrency only overlaps their latency; beyond rate_burst_reddit they run at the rate limit
+    reddit_expand_max_requests: int = 32
+    reddit_expand_time_budget: float = 10.0
+    reddit_expand_concurrency: int = 4
+
+    # Sampling mode: default comments scored per sample and the cap when growing it to a CI target
+    sample_default_size: int = 400
+    sample_max_size: int = 5000
+
+    # End-to-end budget of an interactive /api/analyze request (seconds)
+    analyze_deadline_seconds: float = 120
+
+    # Admission control for interactive analyses that start a pipeline run
+    admission_max_in_flight: int = 4
+    admission_max_queue: int = 16
+    admission_max_per_user: int = 2
+    admission_max_wait: float = 20.0
+    admission_max_inference_backlog: int = 20000  # texts queued for the sentiment model
+    admission_background_patience: float = 300  # how long shed batch items and jobs keep retrying
+
+    # Post listings: default and maximum page size
+    posts_page_default_size: int = 20
+    posts_page_max_size: int = 100
+
+    # Full-text search: where index segments are persisted, and how many indexed posts plus
+    # comments the in-memory segment cache may hold
+    search_index_dir: str = "search_index"
+    search_cache_max_units: int = 5_000_000
+    # Users whose search index stays loaded, and how long before one is reloaded from the database
+    # (it is kept current in process; the reload picks up writes made by other processes)
+    search_max_user_indexes: int = 256
+    search_user_index_ttl_seconds: float = 300
+    # Matches held by cached search result sets, which later pages of a search are cut from
+    search_result_cache_max_entries: int = 1_000_000
+
+    # Firebase UIDs allowed to read /api/stats; empty allows any signed-in user
+    stats_admin_uids: list[str] = []
+
+    # Background analysis jobs
+    job_workers: int = 2
+    job_lease_seconds: int = 60
+    job_max_attempts: int = 3
+    job_timeout_seconds: int = 900
+
     model_config = SettingsConfigDict(extra="ignore")  # ✅ allow extra vars
 
 settings = Settings()
@@ -1,13 +1,42 @@
 # app/db/__init__.py
 
 from motor.motor_asyncio import AsyncIOMotorClient
-from fastapi import Depends
-import os
 
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
-client = AsyncIOMotorClient(MONGO_URI)
-db = client["feedback"]  # Change this to your actual database name
+from app.core.config import settings
+from app.db.indexes import apply_indexes
+
+# The only Mongo client in the app. Motor does no I/O until first use, so modules can hold
+# collections from import time; the app lifespan verifies the connection and closes the pool.
+client = AsyncIOMotorClient(
+    settings.mongo_uri,
+    maxPoolSize=settings.mongo_max_pool_size,
+    minPoolSize=settings.mongo_min_pool_size,
+    maxIdleTimeMS=settings.mongo_max_idle_time_ms,
+    connectTimeoutMS=settings.mongo_connect_timeout_ms,
+    serverSelectionTimeoutMS=settings.mongo_server_selection_timeout_ms,
+    socketTimeoutMS=settings.mongo_socket_timeout_ms,
+    compressors=settings.mongo_compressors or None,
+)
+db = client[settings.mongo_db]
+
+users_collection = db["users"]
+posts_collection = db["posts"]
+
 
 # Dependency for FastAPI routes
 def get_database():
     return db
+
+
+async def connect():
+    await client.admin.command("ping")
+    await ensure_indexes()
+
+
+def close():
+    client.close()
+
+
+async def ensure_indexes():
+    for change in await apply_indexes(db):
+        print("Index:", change)
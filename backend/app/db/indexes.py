@@ -0,0 +1,183 @@
+# app/db/indexes.py
+"""Declarative registry of every Mongo index the app relies on.
+
+Applied idempotently at startup (app.db.connect) or from the command line:
+
+    python -m app.db.indexes            # create missing / changed indexes, drop retired ones
+    python -m app.db.indexes --dry-run  # only print what would change
+    python -m app.db.indexes --check    # explain the hot queries; exit 1 if any is a COLLSCAN
+"""
+
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from typing import NamedTuple
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+
+class IndexSpec(NamedTuple):
+    collection: str
+    name: str
+    keys: list
+    options: dict = {}
+
+
+class HotQuery(NamedTuple):
+    collection: str
+    description: str
+    filter: dict
+    sort: list | None = None
+
+
+INDEXES = [
+    # posts.find_one({url, user_id}) for legacy lookups; a user may hold a full and a sampled analysis of a URL
+    IndexSpec("posts", "url_user_mode_unique", [("url", ASCENDING), ("user_id", ASCENDING), ("mode", ASCENDING)],
+              {"unique": True}),
+    # posts.find_one({user_id, post_key}): the user's reference to a shared analysis
+    IndexSpec("posts", "user_post_key_unique", [("user_id", ASCENDING), ("post_key", ASCENDING)],
+              {"unique": True, "partialFilterExpression": {"post_key": {"$exists": True}}}),
+    # posts.find({user_id}).sort(created_at desc, _id desc): home and "my posts" keyset pages
+    IndexSpec("posts", "user_created_id",
+              [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]),
+    # posts.find({analysis_id}): copying a changed analysis' aggregates onto its references
+    IndexSpec("posts", "analysis", [("analysis_id", ASCENDING)]),
+    # users.find_one({uid})
+    IndexSpec("users", "uid_unique", [("uid", ASCENDING)], {"unique": True}),
+    # analyses.find_one({platform, post_id, mode}): shared analysis lookup and upsert
+    IndexSpec("analyses", "platform_post_mode_unique",
+              [("platform", ASCENDING), ("post_id", ASCENDING), ("mode", ASCENDING)], {"unique": True}),
+    # comment_buckets.find({analysis_id, generation}).sort(seq), single-bucket reads and dropping
+    # superseded generations
+    IndexSpec("comment_buckets", "analysis_generation_seq_unique",
+              [("analysis_id", ASCENDING), ("generation", ASCENDING), ("seq", ASCENDING)], {"unique": True}),
+    # user_stats.find_one({uid}) and the $inc rollup updates
+    IndexSpec("user_stats", "uid_unique", [("uid", ASCENDING)], {"unique": True}),
+    # Job claim: queued and due, oldest first; or running with an expired lease
+    IndexSpec("jobs", "jobs_claim", [("status", ASCENDING), ("run_after", ASCENDING), ("created_at", ASCENDING)]),
+    IndexSpec("jobs", "jobs_lease", [("status", ASCENDING), ("lease_until", ASCENDING)]),
+]
+
+# Indexes superseded by ones above, dropped when found
+RETIRED_INDEXES = [
+    ("posts", "url_user_unique"),
+    ("analyses", "platform_post_unique"),
+    ("posts", "user_created"),
+    # Blocks a second generation of an analysis' buckets
+    ("comment_buckets", "analysis_seq_unique"),
+]
+
+def hot_queries() -> list[HotQuery]:
+    """The app's frequent queries, built by the same functions the app uses to issue them.
+
+    Imported lazily: the query builders live in modules that import app.db, which imports this one.
+    """
+    from bson import ObjectId
+
+    from app.services.analysis_store import analysis_key, bucket_query, fresh_analysis_query, user_post_query
+    from app.services.canonical import PostIdentity
+    from app.services.jobs import CLAIM_ORDER, claim_query
+    from app.services.pagination import NEWEST_FIRST, after_cursor, encode_cursor
+
+    identity = PostIdentity("youtube", "abc")
+    url = "https://www.youtube.com/watch?v=abc"
+    analysis_id = ObjectId()
+    now = datetime(2000, 1, 1)
+    next_page = after_cursor(encode_cursor({"_id": ObjectId(), "created_at": now}))
+    return [
+        HotQuery("posts", "user post by identity or legacy URL", user_post_query("uid", identity, [url])),
+        HotQuery("posts", "sampled user post", user_post_query("uid", identity, [url], "sample")),
+        HotQuery("posts", "user posts, first page", {"user_id": "uid"}, NEWEST_FIRST),
+        HotQuery("posts", "user posts, next page", {"$and": [{"user_id": "uid"}, next_page]}, NEWEST_FIRST),
+        HotQuery("posts", "references to an analysis", {"analysis_id": analysis_id}),
+        HotQuery("users", "user by uid", {"uid": "uid"}),
+        HotQuery("user_stats", "rollup by uid", {"uid": "uid"}),
+        HotQuery("analyses", "shared analysis", analysis_key(identity)),
+        HotQuery("analyses", "fresh shared analysis", fresh_analysis_query(identity)),
+        HotQuery("analyses", "fresh sampled analysis", fresh_analysis_query(identity, "sample")),
+        HotQuery("comment_buckets", "comments of an analysis", bucket_query(analysis_id, 1), [("seq", ASCENDING)]),
+        HotQuery("comment_buckets", "comments of a legacy analysis", bucket_query(analysis_id, None),
+                 [("seq", ASCENDING)]),
+        HotQuery("jobs", "job claim", claim_query(3, now), CLAIM_ORDER),
+        HotQuery("jobs", "expired leases", {"status": "running", "lease_until": {"$lt": now}, "attempts": {"$gte": 3}}),
+    ]
+
+
+def _matches(existing: dict, spec: IndexSpec) -> bool:
+    if [tuple(k) for k in existing["key"]] != [tuple(k) for k in spec.keys]:
+        return False
+    return all(existing.get(option) == value for option, value in spec.options.items())
+
+
+async def apply_indexes(db, dry_run: bool = False) -> list[str]:
+    """Bring the database's indexes in line with the registry; returns the changes made (and failures)."""
+    changes = []
+    for collection, name in RETIRED_INDEXES:
+        if name in await db[collection].index_information():
+            changes.append(f"drop {collection}.{name} (retired)")
+            if not dry_run:
+                await db[collection].drop_index(name)
+
+    for spec in INDEXES:
+        existing = (await db[spec.collection].index_information()).get(spec.name)
+        if existing and _matches(existing, spec):
+            continue
+        if existing:
+            changes.append(f"drop {spec.collection}.{spec.name} (definition changed)")
+            if not dry_run:
+                await db[spec.collection].drop_index(spec.name)
+        changes.append(f"create {spec.collection}.{spec.name} {spec.keys}")
+        if not dry_run:
+            try:
+                await db[spec.collection].create_index(spec.keys, name=spec.name, **spec.options)
+            except OperationFailure as e:
+                # Typically duplicates that must be cleaned up before a unique index can be built
+                changes.append(f"failed {spec.collection}.{spec.name}: {e}")
+    return changes
+
+
+def _stages(plan: dict):
+    yield plan.get("stage")
+    for child in ("inputStage", "queryPlan"):
+        if child in plan:
+            yield from _stages(plan[child])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+async def find_collscans(db) -> list[str]:
+    """Explain every hot query and return the ones whose winning plan scans a whole collection."""
+    offenders = []
+    for query in hot_queries():
+        cursor = db[query.collection].find(query.filter)
+        if query.sort:
+            cursor = cursor.sort(query.sort)
+        plan = (await cursor.limit(1).explain())["queryPlanner"]["winningPlan"]
+        if "COLLSCAN" in _stages(plan):
+            offenders.append(f"{query.collection}: {query.description}")
+    return offenders
+
+
+async def _main(args) -> int:
+    from app.db import db, close
+
+    try:
+        if args.check:
+            offenders = await find_collscans(db)
+            for offender in offenders:
+                print(f"COLLSCAN: {offender}")
+            return 1 if offenders else 0
+        for change in await apply_indexes(db, dry_run=args.dry_run):
+            print(change)
+        return 0
+    finally:
+        close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply or check the Mongo index registry")
+    parser.add_argument("--dry-run", action="store_true", help="print changes without applying them")
+    parser.add_argument("--check", action="store_true", help="fail if a hot query does a collection scan")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
@@ -0,0 +1,91 @@
+# app/db/migrate_comment_buckets.py
+"""Move embedded comments into the `comment_buckets` collection.
+
+    python -m app.db.migrate_comment_buckets [--dry-run]
+
+Shared analyses that still embed their comments are rewritten as buckets. Legacy per-user post
+documents (from before shared analyses) become a shared analysis plus a reference, like the ones
+/api/analyze creates now. Safe to re-run: only documents that still have a `comments` array are touched.
+"""
+
+import argparse
+import asyncio
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.db import close
+from app.services.analysis_store import (
+    analyses_collection, posts_collection, analysis_key, user_post_key, bucket_embedded_comments, _write_buckets,
+)
+from app.services.canonical import canonical_identity, canonicalize_url
+
+
+async def migrate_analyses(dry_run: bool) -> int:
+    migrated = 0
+    async for analysis in analyses_collection.find({"comments": {"$exists": True}}):
+        if not dry_run:
+            await bucket_embedded_comments(analysis)
+        migrated += 1
+    return migrated
+
+
+async def migrate_legacy_post(post: dict) -> str:
+    try:
+        identity = canonical_identity(post.get("url", ""))
+    except ValueError:
+        return "skipped"
+
+    created_at = post.get("created_at") or post["_id"].generation_time.replace(tzinfo=None)
+    # Reuse a shared analysis of the same post if one exists, otherwise promote this one
+    analysis = await analyses_collection.find_one_and_update(
+        analysis_key(identity),
+        {"$setOnInsert": {
+            "mode": "full",
+            "url": canonicalize_url(post["url"]),
+            "post": post.get("post", {}),
+            "sentiment": post.get("sentiment", {}),
+            "topics": post.get("topics", []),
+            "status": "complete",
+            "analyzed_at": created_at,
+            "created_at": created_at,
+            "high_water_mark": None,
+            "degraded": [],
+            "migrated_from": post["_id"],
+        }},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    if analysis.get("migrated_from") == post["_id"] and "comment_count" not in analysis:
+        await _write_buckets(analysis["_id"], None, 0, post["comments"])
+        await analyses_collection.update_one(
+            {"_id": analysis["_id"]}, {"$set": {"comment_count": len(post["comments"])}}
+        )
+
+    fields = {"analysis_id": analysis["_id"], "mode": "full", "created_at": created_at}
+    unset = {"comments": "", "sentiment": "", "topics": ""}
+    try:
+        await posts_collection.update_one(
+            {"_id": post["_id"]}, {"$set": {**fields, "post_key": user_post_key(identity)}, "$unset": unset}
+        )
+    except DuplicateKeyError:
+        # The user already has a reference to this post under another URL; link it without a key
+        await posts_collection.update_one({"_id": post["_id"]}, {"$set": fields, "$unset": unset})
+    return "migrated"
+
+
+async def main(dry_run: bool):
+    try:
+        print(f"Analyses with embedded comments: {await migrate_analyses(dry_run)}")
+        results = {"migrated": 0, "skipped": 0}
+        async for post in posts_collection.find({"comments": {"$exists": True}, "analysis_id": {"$exists": False}}):
+            results[await migrate_legacy_post(post) if not dry_run else "migrated"] += 1
+        print(f"Legacy posts: {results}")
+    finally:
+        close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move embedded comments into comment buckets")
+    parser.add_argument("--dry-run", action="store_true", help="count documents without changing them")
+    asyncio.run(main(parser.parse_args().dry_run))
@@ -13,6 +13,11 @@ import os
 
 from app.api import analyze
 from app.api import search
+from app.api import stats
+from app.api import jobs
+from app.api import prefetch
+from app import db
+from contextlib import asynccontextmanager
 
 # ---------- Load environment and Firebase ----------
 load_dotenv(dotenv_path="C:/Users/whibi/Desktop/dev/backend/app/.env")
@@ -21,7 +26,17 @@ cred = credentials.Certificate(firebase_path)
 initialize_app(cred)
 
 # ---------- Initialize FastAPI ----------
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await db.connect()
+    analyze.watcher.start()
+    jobs.queue.start()
+    yield
+    await analyze.watcher.stop()
+    await jobs.queue.stop()
+    db.close()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -29,6 +44,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Retry-After"],
 )
 
 # ---------- Auth Helpers ----------
@@ -61,4 +77,7 @@ app.include_router(users.router)
 app.include_router(home.router, prefix="/api")
 app.include_router(search.router, prefix="/api")
 app.include_router(profile.router)
+app.include_router(stats.router, prefix="/api")
+app.include_router(jobs.router, prefix="/api")
+app.include_router(prefetch.router, prefix="/api")
 
@@ -1,8 +1,20 @@
-from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Optional, Literal
 
 class AnalyzeRequest(BaseModel):
     url: str
+    # "sample" scores a stratified random sample and returns estimated proportions with confidence intervals
+    mode: Literal["full", "sample"] = "full"
+    sampleSize: Optional[int] = Field(None, ge=30, le=5000)
+    targetIntervalWidth: Optional[float] = Field(None, gt=0, lt=1)
+    confidence: float = Field(0.95, gt=0.5, lt=1)
+
+class PrefetchRequest(BaseModel):
+    url: str
+    filterLanguage: bool = True  # also run language detection ahead of time
+
+class AnalyzeBatchRequest(BaseModel):
+    urls: List[str] = Field(..., min_length=1, max_length=100)
 
 class Comment(BaseModel):
     id: str
@@ -26,3 +38,8 @@ class AnalyzeResponse(BaseModel):
     sentiment: Dict[str, int]
     topics: List[Dict[str, Any]]
     postId: str  # MongoDB document ID as a string
+    coverage: Optional[Dict[str, Any]] = None  # share of the thread that was loaded, when the platform reports it
+    lastRefresh: Optional[Dict[str, Any]] = None  # {"at", "new_comments"} after an incremental refresh
+    estimate: Optional[Dict[str, Any]] = None  # sampling mode: sample size and per-label proportion intervals
+    degraded: Optional[List[str]] = None  # parts cut short by the request deadline ("comments", "topics")
+    commentCount: Optional[int] = None  # total stored comments, also when `comments` is omitted
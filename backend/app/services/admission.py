@@ -0,0 +1,111 @@
+# app/services/admission.py
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; `status_code` is 429 (per-user limit) or 503 (overload)."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Admission control for expensive (pipeline-running) analyze requests.
+
+    At most `max_in_flight` run at once and at most `max_queue` more wait for a slot, each for up
+    to `max_wait` seconds. A user may hold `max_per_user` running or waiting requests. Requests are
+    also shed while the shared inference backlog (`inference_backlog()`, in texts) exceeds
+    `max_inference_backlog`, since that load also comes from jobs and batch analyses.
+    Cheap requests (cache hits, joining an in-flight run) never take a slot and are only counted.
+    Speculative work (prefetches) is only let through while a slot is free and nobody is waiting.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, max_per_user: int, max_wait: float,
+                 max_inference_backlog: int, inference_backlog=lambda: 0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self.max_wait = max_wait
+        self.max_inference_backlog = max_inference_backlog
+        self.inference_backlog = inference_backlog
+        self.slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.per_user: dict[str, int] = {}
+        self.service_time = 30.0  # moving average of a run, seeds the Retry-After estimate
+        self.stats = {"admitted": 0, "cheap": 0, "shed_user": 0, "shed_overload": 0, "shed_timeout": 0,
+                      "shed_speculative": 0}
+
+    def retry_after(self) -> int:
+        # Time for the runs ahead of a new request to drain, in whole seconds within [1, 120]
+        ahead = (self.in_flight + self.waiting) / self.max_in_flight
+        return max(1, min(120, round(self.service_time * ahead)))
+
+    def _reject(self, stat: str, status_code: int, reason: str):
+        self.stats[stat] += 1
+        raise AdmissionRejected(status_code, reason, self.retry_after())
+
+    def record_cheap(self):
+        self.stats["cheap"] += 1
+
+    def check_speculative(self):
+        """Raise AdmissionRejected (503) unless there is idle capacity for work nobody waits on yet."""
+        if self.inference_backlog() > self.max_inference_backlog:
+            self._reject("shed_speculative", 503, "Sentiment analysis is overloaded")
+        if self.waiting or self.in_flight >= self.max_in_flight:
+            self._reject("shed_speculative", 503, "No capacity for prefetching")
+
+    @asynccontextmanager
+    async def admit(self, user_id: str):
+        if self.per_user.get(user_id, 0) >= self.max_per_user:
+            self._reject("shed_user", 429, "Too many analyses in progress for this user")
+        if self.inference_backlog() > self.max_inference_backlog:
+            self._reject("shed_overload", 503, "Sentiment analysis is overloaded")
+        if self.in_flight + self.waiting >= self.max_in_flight + self.max_queue:
+            self._reject("shed_overload", 503, "Too many analyses in progress")
+
+        self.per_user[user_id] = self.per_user.get(user_id, 0) + 1
+        try:
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self.slots.acquire(), self.max_wait)
+            except asyncio.TimeoutError:
+                self._reject("shed_timeout", 503, "Timed out waiting for an analysis slot")
+            finally:
+                self.waiting -= 1
+
+            self.stats["admitted"] += 1
+            self.in_flight += 1
+            started = time.monotonic()
+            try:
+                yield
+            finally:
+                self.in_flight -= 1
+                self.slots.release()
+                self.service_time = 0.8 * self.service_time + 0.2 * (time.monotonic() - started)
+        finally:
+            self.per_user[user_id] -= 1
+            if not self.per_user[user_id]:
+                del self.per_user[user_id]
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "users": len(self.per_user),
+            "inference_backlog": self.inference_backlog(),
+            "avg_service_seconds": round(self.service_time, 2),
+            "limits": {
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "max_per_user": self.max_per_user,
+                "max_inference_backlog": self.max_inference_backlog,
+            },
+        }
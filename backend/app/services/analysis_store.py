@@ -0,0 +1,493 @@
+# app/services/analysis_store.py
+
+import asyncio
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from app.core.config import settings
+from app.db import db
+from app.services.canonical import PostIdentity
+
+# One analysis per (platform, native post id), shared by every user who analyzed that post.
+# Per-user `posts` documents only reference it via `analysis_id`. Sampled analyses
+# (mode "sample") are stored alongside, never reused for a full analysis and vice versa.
+# Analyses hold metadata and aggregates only; their comments live in `comment_buckets`,
+# COMMENT_BUCKET_SIZE per document in stored order ({analysis_id, generation, seq, count, sentiment,
+# comments}). A re-analysis writes a new generation next to the published one (described by the
+# analysis' `pending` subdocument) and publishes it in one update when it finishes, so readers see
+# either the previous run or the new one in full. Documents and buckets from before generations
+# have none and are generation None.
+# Each post reference carries a copy of its analysis' aggregates (comment_count, sentiment), and
+# `user_stats` rolls them up per user ({uid, posts, comments, sentiment}) so the home screen reads
+# neither comments nor analyses. Both are adjusted with $inc whenever a reference is created,
+# its analysis changes, or it is deleted.
+analyses_collection = db["analyses"]
+posts_collection = db["posts"]
+buckets_collection = db["comment_buckets"]
+user_stats_collection = db["user_stats"]
+
+COMMENT_BUCKET_SIZE = 200
+EMPTY_SENTIMENT = {"positive": 0, "neutral": 0, "negative": 0}
+
+
+def analysis_key(identity: PostIdentity, mode: str = "full") -> dict:
+    # Analyses stored before sampling support have no mode and are full analyses
+    return {
+        "platform": identity.platform,
+        "post_id": identity.post_id,
+        "mode": mode if mode != "full" else {"$in": [None, "full"]},
+    }
+
+
+def user_post_key(identity: PostIdentity, mode: str = "full") -> str:
+    return identity.key if mode == "full" else f"{identity.key}#{mode}"
+
+
+def _sentiment_inc(comments: list) -> dict:
+    counts = {}
+    for comment in comments:
+        label = f"sentiment.{comment.get('sentiment', 'neutral')}"
+        counts[label] = counts.get(label, 0) + 1
+    return counts
+
+
+class AnalysisSuperseded(RuntimeError):
+    """A newer run of the same analysis started or was published while this one was running."""
+
+
+def bucket_query(analysis_id, generation: int | None) -> dict:
+    """The comment buckets of one generation of an analysis (sorted by seq for stored order)."""
+    return {"analysis_id": analysis_id, "generation": generation}
+
+
+async def _write_buckets(analysis_id, generation: int | None, offset: int, comments: list):
+    """Store `comments` at positions offset, offset + 1, ... filling the fixed-size buckets in order."""
+    position = offset
+    while comments:
+        seq, used = divmod(position, COMMENT_BUCKET_SIZE)
+        chunk, comments = comments[:COMMENT_BUCKET_SIZE - used], comments[COMMENT_BUCKET_SIZE - used:]
+        await buckets_collection.update_one(
+            {**bucket_query(analysis_id, generation), "seq": seq},
+            {"$push": {"comments": {"$each": chunk}}, "$inc": {"count": len(chunk), **_sentiment_inc(chunk)}},
+            upsert=True,
+        )
+        position += len(chunk)
+
+
+def post_aggregates(document: dict) -> dict:
+    """The aggregates a post reference keeps of its analysis (legacy documents may embed comments)."""
+    sentiment = document.get("sentiment") or {}
+    return {
+        "comment_count": document.get("comment_count", len(document.get("comments", []))),
+        "sentiment": {label: sentiment.get(label, 0) for label in EMPTY_SENTIMENT},
+    }
+
+
+def _stats_inc(new: dict, old: dict | None = None, posts: int = 0) -> dict:
+    old = old or {"comment_count": 0, "sentiment": EMPTY_SENTIMENT}
+    inc = {"posts": posts, "comments": new["comment_count"] - old["comment_count"]}
+    for label in EMPTY_SENTIMENT:
+        inc[f"sentiment.{label}"] = new["sentiment"][label] - old["sentiment"][label]
+    return inc
+
+
+async def _update_user_stats(user_id: str, inc: dict):
+    # No upsert: a missing rollup is built from the user's posts on first read (get_user_stats)
+    await user_stats_collection.update_one({"uid": user_id}, {"$inc": inc, "$set": {"updated_at": datetime.utcnow()}})
+
+
+async def sync_post_aggregates(analysis: dict | None) -> dict | None:
+    """Copy an analysis' aggregates onto every post referencing it and roll the change into user_stats."""
+    if not analysis:
+        return analysis
+    new = post_aggregates(analysis)
+    cursor = posts_collection.find({"analysis_id": analysis["_id"]}, {"user_id": 1, "comment_count": 1, "sentiment": 1})
+    async for post in cursor:
+        if "comment_count" not in post:
+            continue  # Not backfilled yet; backfill_post_aggregates will copy the current values
+        old = post_aggregates(post)
+        if old == new:
+            continue
+        # Conditional on the values read, so a concurrent sync cannot apply the same difference twice
+        result = await posts_collection.update_one(
+            {"_id": post["_id"], "comment_count": post["comment_count"], "sentiment": post.get("sentiment")},
+            {"$set": new},
+        )
+        if result.modified_count:
+            await _update_user_stats(post["user_id"], _stats_inc(new, old))
+    return analysis
+
+
+def fresh_analysis_query(identity: PostIdentity, mode: str = "full") -> dict:
+    cutoff = datetime.utcnow() - timedelta(hours=settings.shared_analysis_max_age_hours)
+    return {
+        **analysis_key(identity, mode),
+        "analyzed_at": {"$gte": cutoff},
+        "status": {"$ne": "running"},
+        # Analyses cut short by a request deadline are redone rather than shared
+        "degraded": {"$in": [None, []]},
+    }
+
+
+async def find_fresh_analysis(identity: PostIdentity, mode: str = "full") -> dict | None:
+    return await analyses_collection.find_one(fresh_analysis_query(identity, mode))
+
+
+def _next_generation(now: datetime, **published_defaults) -> dict:
+    # Pipeline-update stage: allocate the next generation number; a new document also gets the
+    # fields readers expect, but stays "running" (and unpublished) until its first run finishes
+    return {"$set": {
+        "last_generation": {"$add": [{"$ifNull": ["$last_generation", 0]}, 1]},
+        "created_at": {"$ifNull": ["$created_at", now]},
+        "status": {"$ifNull": ["$status", "running"]},
+        "comment_count": {"$ifNull": ["$comment_count", 0]},
+        "sentiment": {"$ifNull": ["$sentiment", {"$literal": dict(EMPTY_SENTIMENT)}]},
+        "topics": {"$ifNull": ["$topics", []]},
+        **{field: {"$ifNull": [f"${field}", {"$literal": value}]} for field, value in published_defaults.items()},
+    }}
+
+
+async def _drop_older_generations(analysis_id, generation: int):
+    await buckets_collection.delete_many({"analysis_id": analysis_id, "generation": {"$not": {"$gte": generation}}})
+
+
+async def abort_shared_analysis(analysis_id, generation: int):
+    """Discard an unfinished generation; the published one (if any) stays as it was."""
+    await buckets_collection.delete_many(bucket_query(analysis_id, generation))
+    await analyses_collection.update_one({"_id": analysis_id, "pending.generation": generation}, {"$unset": {"pending": ""}})
+    # A first run that never finished leaves nothing worth keeping
+    await analyses_collection.delete_one(
+        {"_id": analysis_id, "generation": {"$exists": False}, "status": "running", "pending": {"$exists": False}}
+    )
+
+
+async def start_shared_analysis(identity: PostIdentity, url: str, post: dict, coverage: dict | None = None) -> dict:
+    """Open a new generation of the shared analysis for a post; returns {"_id", "generation"}.
+
+    The published generation stays readable until finish_shared_analysis swaps the new one in.
+    """
+    now = datetime.utcnow()
+    analysis = await analyses_collection.find_one_and_update(
+        analysis_key(identity),
+        [
+            _next_generation(now, mode="full", url=url, post=post),
+            {"$set": {"pending": {
+                "generation": "$last_generation",
+                "url": url,
+                "post": {"$literal": post},
+                "coverage": {"$literal": coverage},
+                "comment_count": 0,
+                "sentiment": {"$literal": dict(EMPTY_SENTIMENT)},
+                "started_at": now,
+            }}},
+        ],
+        projection={"last_generation": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return {"_id": analysis["_id"], "generation": analysis["last_generation"]}
+
+
+async def append_comments(analysis_id, generation: int, comments: list, counts: dict):
+    """Append scored comments to a pending generation opened by start_shared_analysis."""
+    # Reserving the positions first keeps concurrent appends from writing to the same slots
+    before = await analyses_collection.find_one_and_update(
+        {"_id": analysis_id, "pending.generation": generation},
+        {"$inc": {"pending.comment_count": len(comments), **{f"pending.sentiment.{label}": n for label, n in counts.items()}}},
+        projection={"pending.comment_count": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if before is None:
+        raise AnalysisSuperseded(f"Generation {generation} of analysis {analysis_id} is no longer pending")
+    await _write_buckets(analysis_id, generation, before["pending"]["comment_count"], comments)
+
+
+async def append_refreshed_comments(analysis: dict, comments: list, counts: dict):
+    """Append comments found by a refresh to the published generation they were fetched for."""
+    generation = analysis.get("generation")
+    before = await analyses_collection.find_one_and_update(
+        {"_id": analysis["_id"], "generation": generation},
+        {"$inc": {"comment_count": len(comments), **{f"sentiment.{label}": n for label, n in counts.items()}}},
+        projection={"comment_count": 1},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if before is None:
+        raise AnalysisSuperseded(f"Analysis {analysis['_id']} was re-analyzed during the refresh")
+    await _write_buckets(analysis["_id"], generation, before.get("comment_count", 0), comments)
+
+
+async def finish_shared_analysis(analysis_id, generation: int, topics: list, high_water_mark: datetime | None,
+                           degraded: list[str] | None = None) -> dict:
+    """Publish a pending generation in one update, then drop the buckets of the ones before it."""
+    analysis = await analyses_collection.find_one_and_update(
+        {"_id": analysis_id, "pending.generation": generation},
+        [
+            {"$set": {
+                "url": "$pending.url",
+                "post": "$pending.post",
+                "coverage": "$pending.coverage",
+                "comment_count": "$pending.comment_count",
+                "sentiment": "$pending.sentiment",
+                "generation": generation,
+                "topics": {"$literal": topics},
+                "degraded": {"$literal": degraded or []},
+                "status": "complete",
+                "analyzed_at": datetime.utcnow(),
+                "high_water_mark": high_water_mark,
+            }},
+            {"$unset": ["pending", "comments"]},
+        ],
+        return_document=ReturnDocument.AFTER,
+    )
+    if analysis is None:
+        raise AnalysisSuperseded(f"Generation {generation} of analysis {analysis_id} is no longer pending")
+    await _drop_older_generations(analysis_id, generation)
+    return await sync_post_aggregates(analysis)
+
+
+async def save_sampled_analysis(identity: PostIdentity, url: str, post: dict, comments: list, sentiment: dict,
+                          topics: list, estimate: dict, coverage: dict | None = None,
+                          degraded: list[str] | None = None) -> dict:
+    now = datetime.utcnow()
+    allocated = await analyses_collection.find_one_and_update(
+        analysis_key(identity, "sample"),
+        [_next_generation(now, url=url, post=post)],
+        projection={"last_generation": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    analysis_id, generation = allocated["_id"], allocated["last_generation"]
+    try:
+        await _write_buckets(analysis_id, generation, 0, comments)
+        # Never replaces a newer sample published while this one was being written
+        analysis = await analyses_collection.find_one_and_update(
+            {"_id": analysis_id, "generation": {"$not": {"$gte": generation}}},
+            {"$set": {
+                "url": url,
+                "post": post,
+                "comment_count": len(comments),
+                "sentiment": sentiment,
+                "topics": topics,
+                "estimate": estimate,
+                "coverage": coverage,
+                "degraded": degraded or [],
+                "generation": generation,
+                "status": "complete",
+                "analyzed_at": now,
+            }, "$unset": {"comments": ""}},
+            return_document=ReturnDocument.AFTER,
+        )
+    except BaseException:
+        await asyncio.shield(abort_shared_analysis(analysis_id, generation))
+        raise
+    if analysis is None:
+        await abort_shared_analysis(analysis_id, generation)
+        return await get_shared_analysis(analysis_id)
+    await _drop_older_generations(analysis_id, generation)
+    return await sync_post_aggregates(analysis)
+
+
+async def record_refresh(analysis: dict, new_comments: int, high_water_mark: datetime) -> dict:
+    now = datetime.utcnow()
+    refreshed = await analyses_collection.find_one_and_update(
+        {"_id": analysis["_id"], "generation": analysis.get("generation")},
+        {
+            "$set": {
+                "high_water_mark": high_water_mark,
+                "refreshed_at": now,
+                "last_refresh": {"at": now, "new_comments": new_comments},
+            },
+            "$inc": {"refresh_count": 1},
+        },
+        return_document=ReturnDocument.AFTER,
+    )
+    if refreshed is None:
+        raise AnalysisSuperseded(f"Analysis {analysis['_id']} was re-analyzed during the refresh")
+    return await sync_post_aggregates(refreshed)
+
+
+def user_post_query(user_id: str, identity: PostIdentity, urls: list[str], mode: str = "full") -> dict:
+    if mode != "full":
+        return {"user_id": user_id, "post_key": user_post_key(identity, mode)}
+    # Legacy documents predate post_key and can only be matched by URL
+    return {
+        "user_id": user_id,
+        "$or": [{"post_key": identity.key}, {"url": {"$in": urls}, "mode": {"$ne": "sample"}}],
+    }
+
+
+async def find_user_post(user_id: str, identity: PostIdentity, urls: list[str], mode: str = "full") -> dict | None:
+    return await posts_collection.find_one(user_post_query(user_id, identity, urls, mode))
+
+
+async def link_user_post(user_id: str, identity: PostIdentity, url: str, analysis: dict, mode: str = "full") -> dict:
+    """Idempotently create the user's lightweight reference to a shared analysis."""
+    query = {"user_id": user_id, "post_key": user_post_key(identity, mode)}
+    reference = {
+        "user_id": user_id,
+        "post_key": user_post_key(identity, mode),
+        "mode": mode,
+        "url": url,
+        "platform": identity.platform,
+        "post": analysis.get("post", {}),
+        "analysis_id": analysis["_id"],
+        "created_at": datetime.utcnow(),
+        **post_aggregates(analysis),
+    }
+    try:
+        result = await posts_collection.update_one(query, {"$setOnInsert": reference}, upsert=True)
+    except DuplicateKeyError:
+        # Another request linked the same post for this user first
+        return await posts_collection.find_one(query)
+    if result.upserted_id is not None:
+        await _update_user_stats(user_id, _stats_inc(reference, posts=1))
+    return await posts_collection.find_one(query)
+
+
+async def delete_user_post(user_id: str, post_id) -> dict | None:
+    """Delete a user's post reference (the shared analysis stays) and take it out of their rollup."""
+    post = await posts_collection.find_one_and_delete(
+        {"_id": post_id, "user_id": user_id},
+        projection={"analysis_id": 1, "comment_count": 1, "sentiment": 1, "comments": 1},
+    )
+    if post is None:
+        return None
+    if "comment_count" not in post and "analysis_id" in post:
+        # Deleted before its aggregates were backfilled; they are still on the analysis
+        post.update(post_aggregates(await get_shared_analysis(post["analysis_id"]) or {}))
+    await _update_user_stats(user_id, _stats_inc(post_aggregates({"comment_count": 0}), post_aggregates(post), posts=-1))
+    return post
+
+
+async def backfill_post_aggregates(user_id: str):
+    """Copy aggregates onto a user's posts written before references carried them."""
+    posts = await posts_collection.find(
+        {"user_id": user_id, "comment_count": {"$exists": False}},
+        {"analysis_id": 1, "sentiment": 1, "legacy_count": {"$size": {"$ifNull": ["$comments", []]}}},
+    ).to_list(length=None)
+    for post in posts:
+        legacy_count = post.pop("legacy_count")
+        if "analysis_id" in post:
+            post.pop("sentiment", None)
+        else:
+            post["comment_count"] = legacy_count
+    for post in await attach_analyses(posts):
+        await posts_collection.update_one(
+            {"_id": post["_id"], "comment_count": {"$exists": False}}, {"$set": post_aggregates(post)}
+        )
+
+
+async def rebuild_user_stats(user_id: str) -> dict:
+    """Recompute a user's rollup from the aggregates stored on their posts."""
+    await backfill_post_aggregates(user_id)
+    group = {"_id": None, "posts": {"$sum": 1}, "comments": {"$sum": "$comment_count"}}
+    group.update({label: {"$sum": f"$sentiment.{label}"} for label in EMPTY_SENTIMENT})
+    rows = await posts_collection.aggregate([{"$match": {"user_id": user_id}}, {"$group": group}]).to_list(length=1)
+    totals = rows[0] if rows else {}
+    stats = {
+        "uid": user_id,
+        "posts": totals.get("posts", 0),
+        "comments": totals.get("comments", 0),
+        "sentiment": {label: totals.get(label, 0) for label in EMPTY_SENTIMENT},
+        "updated_at": datetime.utcnow(),
+    }
+    await user_stats_collection.replace_one({"uid": user_id}, stats, upsert=True)
+    return stats
+
+
+async def get_user_stats(user_id: str) -> dict:
+    return await user_stats_collection.find_one({"uid": user_id}) or await rebuild_user_stats(user_id)
+
+
+async def get_shared_analysis(analysis_id) -> dict | None:
+    return await analyses_collection.find_one({"_id": analysis_id})
+
+
+async def resolve_analysis(post_doc: dict) -> dict:
+    """Return the analysis fields for a user post, following its shared reference if it has one."""
+    if "analysis_id" not in post_doc:
+        return post_doc
+    return await get_shared_analysis(post_doc["analysis_id"]) or {}
+
+
+async def bucket_embedded_comments(analysis: dict) -> dict:
+    """Move comments still embedded in an analysis (or legacy post) document into buckets."""
+    if "comments" not in analysis:
+        return analysis
+    comments = analysis["comments"]
+    generation = analysis.get("generation")
+    await buckets_collection.delete_many(bucket_query(analysis["_id"], generation))
+    await _write_buckets(analysis["_id"], generation, 0, comments)
+    return await analyses_collection.find_one_and_update(
+        {"_id": analysis["_id"]},
+        {"$set": {"comment_count": len(comments)}, "$unset": {"comments": ""}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def analysis_comments(analysis: dict) -> list:
+    """Every comment of an analysis in stored order; legacy documents still embed them."""
+    if "comments" in analysis:
+        return analysis["comments"]
+    if "_id" not in analysis:
+        return []
+    cursor = buckets_collection.find(bucket_query(analysis["_id"], analysis.get("generation")), {"comments": 1}).sort("seq", 1)
+    return [comment async for bucket in cursor for comment in bucket["comments"]]
+
+
+async def get_comment_bucket(analysis: dict, seq: int) -> dict | None:
+    """One bucket of comments ({seq, count, sentiment, comments}), for readers that page lazily."""
+    if "comments" in analysis:
+        comments = analysis["comments"][seq * COMMENT_BUCKET_SIZE:(seq + 1) * COMMENT_BUCKET_SIZE]
+        if not comments:
+            return None
+        return {"seq": seq, "count": len(comments), "comments": comments}
+    return await buckets_collection.find_one(
+        {**bucket_query(analysis["_id"], analysis.get("generation")), "seq": seq},
+        {"_id": 0, "analysis_id": 0, "generation": 0}
+    )
+
+
+async def comments_at(analysis_id, generation: int | None, positions: list[int]) -> dict[int, dict]:
+    """The comments at the given stored positions of an analysis generation, fetching only their buckets."""
+    seqs = sorted({position // COMMENT_BUCKET_SIZE for position in positions})
+    query = {**bucket_query(analysis_id, generation), "seq": {"$in": seqs}}
+    buckets = {b["seq"]: b["comments"] async for b in buckets_collection.find(query, {"seq": 1, "comments": 1})}
+    if not buckets:
+        # Not migrated to comment buckets yet
+        analysis = await analyses_collection.find_one({"_id": analysis_id, "comments": {"$exists": True}}, {"comments": 1})
+        comments = (analysis or {}).get("comments", [])
+        return {p: comments[p] for p in positions if p < len(comments)}
+    found = {}
+    for position in positions:
+        seq, offset = divmod(position, COMMENT_BUCKET_SIZE)
+        bucket = buckets.get(seq, [])
+        if offset < len(bucket):
+            found[position] = bucket[offset]
+    return found
+
+
+async def attach_analyses(posts: list[dict]) -> list[dict]:
+    """Fill sentiment/topics/comment_count on referenced posts with one batched query (no comment bodies)."""
+    for p in posts:
+        if "comments" in p:
+            # Legacy post documents embed their comments
+            p.setdefault("comment_count", len(p["comments"]))
+    ids = [p["analysis_id"] for p in posts if "analysis_id" in p]
+    if not ids:
+        return posts
+    projection = {
+        "sentiment": 1,
+        "topics": 1,
+        # Analyses not yet migrated to comment buckets still embed their comments
+        "comment_count": {"$ifNull": ["$comment_count", {"$size": {"$ifNull": ["$comments", []]}}]},
+    }
+    analyses = {a["_id"]: a async for a in analyses_collection.find({"_id": {"$in": ids}}, projection)}
+    for p in posts:
+        analysis = analyses.get(p.get("analysis_id"), {})
+        p.setdefault("sentiment", analysis.get("sentiment", {}))
+        p.setdefault("topics", analysis.get("topics", []))
+        p.setdefault("comment_count", analysis.get("comment_count", 0))
+    return posts
@@ -0,0 +1,224 @@
+# app/services/cache.py
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import urlencode
+
+import aiohttp
+
+from app.core.config import settings
+from app.services.deadline import request_timeout
+from app.services.ratelimit import scheduler
+from app.services.resilience import resilience, UpstreamError
+
+logger = logging.getLogger(__name__)
+
+# Query parameters that identify the caller rather than the resource
+IGNORED_PARAMS = {"key", "access_token"}
+
+
+class ResponseCache:
+    """Disk cache of raw platform responses, stored zlib-compressed with their validators.
+
+    The directory is capped at `max_bytes`; least recently used entries are evicted first (reads
+    touch an entry's mtime). File I/O and (de)compression run in the default executor.
+    """
+
+    def __init__(self, directory: str, ttls: dict[str, int], default_ttl: int = 300, max_bytes: int = 512 * 2**20):
+        self.directory = Path(directory)
+        self.ttls = ttls
+        self.default_ttl = default_ttl
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "stores": 0, "bytes_saved": 0, "evictions": 0}
+        # Entry path -> size on disk, least recently used first; loaded from the directory on first use
+        self._entries: OrderedDict[Path, int] | None = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(platform: str, url: str, params: dict | None = None) -> str:
+        params = {k: v for k, v in (params or {}).items() if k not in IGNORED_PARAMS}
+        raw = f"{platform}:{url}?{urlencode(sorted(params.items()))}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _path(self, platform: str, key: str) -> Path:
+        return self.directory / platform / f"{key}.json.z"
+
+    def _index(self) -> OrderedDict:
+        # Called with the lock held
+        if self._entries is None:
+            found = []
+            for path in self.directory.glob("*/*.json.z"):
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                found.append((st.st_mtime, path, st.st_size))
+            self._entries = OrderedDict((path, size) for _, path, size in sorted(found, key=lambda f: f[0]))
+            self._bytes = sum(self._entries.values())
+        return self._entries
+
+    def _touch(self, path: Path, size: int | None):
+        with self._lock:
+            entries = self._index()
+            self._bytes -= entries.pop(path, 0)
+            if size is not None:
+                entries[path] = size
+                self._bytes += size
+            evict = []
+            while self._bytes > self.max_bytes and len(entries) > 1:
+                victim, victim_size = entries.popitem(last=False)
+                self._bytes -= victim_size
+                evict.append(victim)
+        for victim in evict:
+            try:
+                victim.unlink()
+                self.stats["evictions"] += 1
+            except OSError:
+                pass
+
+    def _read(self, path: Path) -> dict | None:
+        try:
+            raw = path.read_bytes()
+        except FileNotFoundError:
+            self._touch(path, None)
+            return None
+        except OSError as e:
+            logger.warning(f"Discarding unreadable cache entry {path}: {e}")
+            return None
+        try:
+            entry = json.loads(zlib.decompress(raw))
+        except (zlib.error, ValueError) as e:
+            logger.warning(f"Discarding unreadable cache entry {path}: {e}")
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._touch(path, len(raw))
+        return entry
+
+    def _write(self, path: Path, entry: dict):
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            data = zlib.compress(json.dumps(entry).encode())
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self.stats["stores"] += 1
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {path}: {e}")
+            return
+        self._touch(path, len(data))
+
+    async def get(self, platform: str, key: str) -> dict | None:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._read, self._path(platform, key))
+
+    async def put(self, platform: str, key: str, payload, size: int, etag: str | None = None,
+                  last_modified: str | None = None):
+        entry = {
+            "stored_at": time.time(),
+            "size": size,
+            "etag": etag,
+            "last_modified": last_modified,
+            "payload": payload,
+        }
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write, self._path(platform, key), entry)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def is_fresh(self, platform: str, entry: dict, max_age: int | None = None) -> bool:
+        ttl = self.ttls.get(platform, self.default_ttl) if max_age is None else max_age
+        return time.time() - entry["stored_at"] < ttl
+
+    def record_hit(self, entry: dict, revalidated: bool = False):
+        self.stats["revalidated" if revalidated else "hits"] += 1
+        self.stats["bytes_saved"] += entry.get("size", 0)
+
+
+cache = ResponseCache(
+    settings.response_cache_dir,
+    ttls={
+        "reddit": settings.response_cache_ttl_reddit,
+        "youtube": settings.response_cache_ttl_youtube,
+        "stackexchange": settings.response_cache_ttl_stackexchange,
+    },
+    max_bytes=settings.response_cache_max_bytes,
+)
+
+
+async def cached_get_json(session: aiohttp.ClientSession, platform: str, url: str, params: dict | None = None, max_age: int | None = None):
+    """GET a JSON resource through the response cache.
+
+    Returns (status, data). Network calls take a permit from the rate scheduler first and go through
+    the platform's circuit breaker, hedging and retries (CircuitOpenError while it is open).
+    Stale entries are revalidated with If-None-Match / If-Modified-Since when the upstream sent
+    validators; only 200 responses are stored. `max_age` overrides the
+    platform TTL, e.g. 0 to always revalidate when polling for new activity.
+    """
+    key = cache.make_key(platform, url, params)
+    entry = await cache.get(platform, key)
+    if entry and cache.is_fresh(platform, entry, max_age):
+        cache.record_hit(entry)
+        return 200, entry["payload"]
+
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    endpoint = url.rstrip("/").rsplit("/", 1)[-1]
+    credential = None
+    if params and params.get("key"):
+        credential = hashlib.sha256(params["key"].encode()).hexdigest()[:8]
+
+    async def attempt():
+        await scheduler.acquire(platform, endpoint=endpoint, credential=credential)
+        async with session.get(url, params=params, headers=headers, timeout=request_timeout(session.timeout)) as resp:
+            if resp.status == 304 and entry:
+                return 304, None, resp.headers
+            body = await resp.read()
+            try:
+                data = json.loads(body) if body else {}
+            except ValueError:
+                data = {}
+            # StackExchange asks clients to pause via a `backoff` field in the body
+            backoff = data.get("backoff") if isinstance(data, dict) else None
+            scheduler.report(platform, resp.status, backoff=backoff, credential=credential)
+            if resp.status >= 500:
+                raise UpstreamError(resp.status, data)
+            return resp.status, (data, len(body)), resp.headers
+
+    try:
+        # GETs are idempotent, so slow attempts are hedged
+        status, result, resp_headers = await resilience.call(platform, attempt, hedge=True)
+    except UpstreamError as e:
+        return e.status, e.data if e.data is not None else {}
+
+    if status == 304:
+        await cache.put(platform, key, entry["payload"], entry["size"], entry.get("etag"), entry.get("last_modified"))
+        cache.record_hit(entry, revalidated=True)
+        return 200, entry["payload"]
+
+    data, size = result
+    if status != 200:
+        return status, data
+
+    cache.stats["misses"] += 1
+    await cache.put(platform, key, data, size, resp_headers.get("ETag"), resp_headers.get("Last-Modified"))
+    return status, data
@@ -0,0 +1,97 @@
+# app/services/canonical.py
+
+from typing import NamedTuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from app.services.reddit import extract_reddit_id
+from app.services.youtube import extract_video_id
+from app.services.stackexchange import extract_question_id, api_site
+
+# Host prefixes that serve the same content as the bare domain
+HOST_PREFIXES = ("www.", "m.", "mobile.", "old.", "new.")
+
+# Query parameters used for tracking/sharing that never change which post a URL points to
+TRACKING_PARAMS = {"fbclid", "gclid", "si", "feature", "share_id", "ref", "ref_src", "context", "utm"}
+
+# Facebook pages that identify the post by query parameters rather than by path
+FACEBOOK_QUERY_PAGES = {"permalink.php", "story.php", "watch", "photo.php", "photo", "video.php"}
+FACEBOOK_ID_PARAMS = ("story_fbid", "id", "v", "fbid")
+
+
+def _is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith("utm_")
+
+
+def canonicalize_url(url: str) -> str:
+    """Normalize a post URL so trivially different spellings of it compare equal."""
+    parsed = urlsplit(url.strip())
+    host = (parsed.hostname or "").lower()
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    path = parsed.path.rstrip("/") or "/"
+    query = sorted(
+        (k, v) for k, v in parse_qsl(parsed.query, keep_blank_values=True)
+        if not _is_tracking_param(k)
+    )
+    return urlunsplit(("https", host, path, urlencode(query), ""))
+
+
+class PostIdentity(NamedTuple):
+    platform: str
+    post_id: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.platform}:{self.post_id}"
+
+
+def detect_platform(url: str) -> str:
+    if "reddit.com" in url:
+        return "reddit"
+    elif "youtube.com" in url or "youtu.be" in url:
+        return "youtube"
+    elif "facebook.com" in url:
+        return "facebook"
+    elif "stackexchange.com" in url or "stackoverflow.com" in url:
+        return "stackexchange"
+    else:
+        raise ValueError("Unsupported platform")
+
+
+def _facebook_post_id(canonical: str) -> str:
+    # Facebook post URLs carry no single extractable id. The canonical path identifies most posts;
+    # permalink.php, story.php, watch/ and photo pages need their identifying query parameters too.
+    parts = urlsplit(canonical)
+    path = parts.path.strip("/")
+    params = dict(parse_qsl(parts.query))
+    ids = [(name, params[name]) for name in FACEBOOK_ID_PARAMS if params.get(name)]
+    if path in FACEBOOK_QUERY_PAGES and not ids:
+        raise ValueError("Invalid Facebook URL")
+    return f"{path}?{urlencode(ids)}" if ids else path
+
+
+def canonical_identity(url: str) -> PostIdentity:
+    """Map any spelling of a post URL to its (platform, native post id)."""
+    platform = detect_platform(url)
+    canonical = canonicalize_url(url)
+
+    if platform == "reddit":
+        # Subreddit and title slugs vary between links to the same submission; the id does not
+        post_id = extract_reddit_id(urlsplit(canonical).path + "/")
+    elif platform == "youtube":
+        post_id = extract_video_id(url)
+        if not post_id:
+            raise ValueError("Invalid YouTube URL")
+    elif platform == "stackexchange":
+        question_id = extract_question_id(canonical)
+        if not question_id:
+            raise ValueError("Invalid StackExchange URL")
+        # Question ids are only unique within a site
+        post_id = f"{api_site(urlsplit(canonical).hostname)}/{question_id}"
+    else:
+        post_id = _facebook_post_id(canonical)
+
+    return PostIdentity(platform, post_id)
@@ -0,0 +1,54 @@
+# app/services/deadline.py
+
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+
+import aiohttp
+
+# Set per request; asyncio tasks copy the context when created, so every stage and platform
+# call started on behalf of the request (including a shared single-flight run) sees it
+_current = contextvars.ContextVar("deadline", default=None)
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+
+@contextmanager
+def deadline_scope(seconds: float):
+    token = _current.set(Deadline(seconds))
+    try:
+        yield _current.get()
+    finally:
+        _current.reset(token)
+
+
+def time_left(default: float | None = None) -> float | None:
+    """Seconds left before the current deadline, capped at `default`; `default` if there is none."""
+    deadline = _current.get()
+    if deadline is None:
+        return default
+    left = deadline.remaining()
+    return left if default is None else min(default, left)
+
+
+def request_timeout(default: aiohttp.ClientTimeout) -> aiohttp.ClientTimeout:
+    """An aiohttp timeout that also ends at the current deadline.
+
+    Raises asyncio.TimeoutError if the deadline has already passed (aiohttp treats 0 as no timeout).
+    """
+    left = time_left()
+    if left is None:
+        return default
+    if left <= 0:
+        raise asyncio.TimeoutError("Analysis deadline exceeded")
+    return aiohttp.ClientTimeout(
+        total=min(default.total, left) if default.total else left,
+        sock_connect=default.sock_connect,
+    )
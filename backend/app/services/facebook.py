@@ -1,18 +1,89 @@
 import json
+import logging
+import threading
 import time
 import urllib.parse
-import requests
+import aiohttp
 from datetime import datetime
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
 from concurrent.futures import ThreadPoolExecutor
 import asyncio
+from app.services.deadline import request_timeout, time_left
+from app.services.ratelimit import scheduler
+from app.services.resilience import resilience, UpstreamError, CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+COMMENTS_QUERY_NAME = "CommentsListComponentsPaginationQuery"
+GRAPHQL_URL_PREFIX = "https://www.facebook.com/api/graphql/"
+
+# Resource types that are never needed to read the post or capture the GraphQL request
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+FIRST_PARTY_HOSTS = ("facebook.com", "fbcdn.net", "facebook.net")
+
+COMMENTS_REQUEST_TIMEOUT_MS = 2000
+
+GRAPHQL_MAX_COMMENTS = 2000
+GRAPHQL_PAGE_TIMEOUT = 30
+GRAPHQL_KEEPALIVE_TIMEOUT = 30
+PAGE_LOAD_TIMEOUT_MS = 60000
+
+
+class ScrapeCancelled(Exception):
+    pass
+
+
+def _is_first_party(url: str) -> bool:
+    host = urllib.parse.urlparse(url).hostname or ""
+    return any(host == h or host.endswith("." + h) for h in FIRST_PARTY_HOSTS)
+
+
+def _block_heavy_resources(route):
+    request = route.request
+    if request.resource_type in BLOCKED_RESOURCE_TYPES:
+        return route.abort()
+    if request.resource_type == "script" and not _is_first_party(request.url):
+        return route.abort()
+    return route.continue_()
+
+
+def _is_comments_request(request) -> bool:
+    return (
+        request.url.startswith(GRAPHQL_URL_PREFIX)
+        and COMMENTS_QUERY_NAME in request.headers.get("x-fb-friendly-name", "")
+    )
+
 
 # === SYNC FUNCTION ===
-def scrape_facebook_post_sync(post_url: str):
+def scrape_facebook_post_sync(post_url: str, lean: bool = True, cancel: threading.Event | None = None,
+                              timeout_ms: int = PAGE_LOAD_TIMEOUT_MS):
+    """Scrape the post and capture its comments query.
+
+    `cancel` is checked between steps: once set, the browser is closed and ScrapeCancelled raised.
+    """
+    def check_cancelled():
+        if cancel is not None and cancel.is_set():
+            raise ScrapeCancelled(post_url)
+
+    started = time.perf_counter()
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
         page = browser.new_page()
-        page.goto(post_url, timeout=60000)
+        if lean:
+            # Image/avatar URLs are read from DOM attributes, so the bytes never need to load
+            page.route("**/*", _block_heavy_resources)
+
+        # Capture the comments query as soon as the page fires it, even during the initial load
+        captured = []
+
+        def on_request(request):
+            if not captured and _is_comments_request(request):
+                captured.append((request, time.perf_counter()))
+
+        page.on("request", on_request)
+
+        page.goto(post_url, timeout=timeout_ms)
+        check_cancelled()
 
         try:
             user_selector = "span.html-span.xdj266r.x14z9mp.xat24cr.x1lziwak.xexx8yu.xyri2b.x18d9i69.x1c1uobl.x1hl2dhg.x16tdsg8.x1vvkbs"
@@ -38,37 +109,41 @@ def scrape_facebook_post_sync(post_url: str):
         except:
             profile_img = None
 
-        # Attempt to capture GraphQL request
-        graphql_request = None
+        # Attempt to capture GraphQL request: scroll until it fires or the container stops growing
         try:
             scroll_container = page.locator("div.xb57i2i.x1q594ok")
             previous_height = scroll_container.evaluate("el => el.scrollHeight")
 
-            while True:
+            while not captured:
+                check_cancelled()
+                scroll_container.evaluate("el => el.scrollBy(0, 3000)")
                 try:
-                    with page.expect_request(
-                        lambda request: request.url.startswith("https://www.facebook.com/api/graphql/")
-                        and "CommentsListComponentsPaginationQuery" in request.headers.get("x-fb-friendly-name", ""),
-                        timeout=500
-                    ) as req_info:
-                        scroll_container.evaluate("el => el.scrollBy(0, 3000)")
-                        graphql_request = req_info.value
+                    # Returns as soon as the query fires; the timeout only bounds a scroll that loads nothing
+                    page.wait_for_event("request", predicate=_is_comments_request, timeout=COMMENTS_REQUEST_TIMEOUT_MS)
+                except PlaywrightTimeoutError:
+                    if captured:
                         break
-                except:
                     new_height = scroll_container.evaluate("el => el.scrollHeight")
                     if new_height == previous_height:
                         break
                     previous_height = new_height
-                    time.sleep(0.5)
         finally:
             browser.close()
 
+        graphql_request = None
+        capture_ms = None
+        if captured:
+            graphql_request, captured_at = captured[0]
+            capture_ms = round((captured_at - started) * 1000)
+            logger.info(f"Captured {COMMENTS_QUERY_NAME} for {post_url} in {capture_ms} ms (lean={lean})")
+
         result = {
             "post_url": post_url,
             "username": username,
             "post_text": post_text,
             "post_img": post_img,
             "profile_img": profile_img,
+            "graphql_capture_ms": capture_ms,
         }
 
         if graphql_request:
@@ -81,74 +156,123 @@ def scrape_facebook_post_sync(post_url: str):
         return result
 
 
-def fetch_comments_from_graphql(graphql_url, graphql_headers, graphql_body, post_url):
-    headers = {
+def _graphql_request_headers(graphql_headers, post_url):
+    return {
         "Content-Type": "application/x-www-form-urlencoded",
         "x-asbd-id": graphql_headers.get("x-asbd-id", "129477"),
-        "x-fb-friendly-name": graphql_headers.get("x-fb-friendly-name", "CommentsListComponentsPaginationQuery"),
+        "x-fb-friendly-name": graphql_headers.get("x-fb-friendly-name", COMMENTS_QUERY_NAME),
         "x-fb-lsd": graphql_headers.get("x-fb-lsd", ""),
         "User-Agent": "Mozilla/5.0",
         "accept": "*/*",
         "referer": post_url,
     }
 
+
+def _parse_comments_page(text: str):
+    # Responses are newline-delimited JSON; only the first object carries the comments
+    data = json.loads(text.partition("\n")[0])
+    connection = data['data']['node']['comment_rendering_instance_for_feed_location']['comments']
+    page_info = connection['page_info']
+    cursor = page_info['end_cursor'] if page_info['has_next_page'] else None
+    return connection['edges'], cursor
+
+
+def _comments_from_edges(edges):
+    return [
+        {
+            "author": edge["node"]["author"]["name"],
+            "text": edge["node"]["body"]["text"],
+            "author_img": edge["node"]["author"]["profile_picture_depth_0"]["uri"]
+        }
+        for edge in edges if edge["node"]["body"]
+    ]
+
+
+async def _post_comments_page(session: aiohttp.ClientSession, graphql_url: str, body: dict, variables: dict, cursor):
+    page_body = dict(body)
+    page_body["variables"] = [json.dumps({**variables, "commentsAfterCursor": cursor})]
+    encoded = urllib.parse.urlencode(page_body, doseq=True)
+
+    async def attempt():
+        await scheduler.acquire("facebook")
+        async with session.post(graphql_url, data=encoded, timeout=request_timeout(session.timeout)) as response:
+            scheduler.report("facebook", response.status)
+            if response.status >= 500:
+                raise UpstreamError(response.status)
+            response.raise_for_status()
+            return await response.text()
+
+    # Pages are POSTs, so they are retried under the breaker but never hedged
+    return await resilience.call(
+        "facebook", attempt, retry_on=(aiohttp.ClientConnectionError, asyncio.TimeoutError, UpstreamError)
+    )
+
+
+async def iter_comments_from_graphql(graphql_url, graphql_headers, graphql_body, post_url, max_comments: int = GRAPHQL_MAX_COMMENTS):
+    """Yield batches of comments page by page.
+
+    The request for page N+1 is in flight while page N is parsed and handed to the consumer.
+    """
     body = urllib.parse.parse_qs(graphql_body)
     variables = json.loads(body["variables"][0])
-    variables["commentsAfterCursor"] = None
 
-    comments = []
+    # A single keep-alive connection is reused for every page of the thread
+    connector = aiohttp.TCPConnector(limit=1, keepalive_timeout=GRAPHQL_KEEPALIVE_TIMEOUT)
+    timeout = aiohttp.ClientTimeout(total=GRAPHQL_PAGE_TIMEOUT)
+    headers = _graphql_request_headers(graphql_headers, post_url)
 
-    while True:
+    async with aiohttp.ClientSession(connector=connector, headers=headers, timeout=timeout) as session:
+        pending = asyncio.create_task(_post_comments_page(session, graphql_url, body, variables, None))
+        total = 0
         try:
-            body["variables"][0] = json.dumps(variables)
-            encoded = urllib.parse.urlencode(body, doseq=True)
-            response = requests.post(graphql_url, headers=headers, data=encoded)
-
-            data = json.loads(response.text.split("\n")[0])
-            edges = data['data']['node']['comment_rendering_instance_for_feed_location']['comments']['edges']
-            comments.extend([
-                {
-                    "author": edge["node"]["author"]["name"],
-                    "text": edge["node"]["body"]["text"],
-                    "author_img": edge["node"]["author"]["profile_picture_depth_0"]["uri"]
-                }
-                for edge in edges if edge["node"]["body"]
-            ])
-            page_info = data['data']['node']['comment_rendering_instance_for_feed_location']['comments']['page_info']
-            if not page_info['has_next_page']:
-                break
-            variables["commentsAfterCursor"] = page_info['end_cursor']
-        except Exception as e:
-            print("GraphQL fetch error:", e)
-            break
-
-    return comments
+            while pending is not None:
+                try:
+                    text = await pending
+                    edges, cursor = _parse_comments_page(text)
+                except CircuitOpenError as e:
+                    logger.warning(f"Stopping GraphQL pagination for {post_url}: {e}")
+                    break
+                except Exception as e:
+                    # Retries are exhausted (or the page is unparseable); keep the comments so far
+                    logger.error(f"GraphQL fetch error: {e}")
+                    break
+
+                pending = None
+                if cursor and total + len(edges) < max_comments:
+                    pending = asyncio.create_task(_post_comments_page(session, graphql_url, body, variables, cursor))
+
+                batch = _comments_from_edges(edges)[:max_comments - total]
+                total += len(batch)
+                if batch:
+                    yield batch
+        finally:
+            if pending is not None:
+                pending.cancel()
 
 
 # === ASYNC WRAPPER FOR FASTAPI ===
 executor = ThreadPoolExecutor()
 
-async def scrape_facebook_post(post_url: str):
+async def stream_facebook_data(post_url: str, since: datetime | None = None):
+    """Yield the post first, then comment batches as the GraphQL pager returns them."""
+    if since:
+        # Scraped comments carry no timestamps, so there is no way to tell which ones are new
+        raise ValueError("Incremental refresh is not supported for Facebook posts")
     loop = asyncio.get_event_loop()
-    data = await loop.run_in_executor(executor, scrape_facebook_post_sync, post_url)
-
-    # if GraphQL present → fetch comments
-    if "graphql_url" in data:
-        comments = await loop.run_in_executor(
-            executor,
-            fetch_comments_from_graphql,
-            data["graphql_url"],
-            data["graphql_headers"],
-            data["graphql_body"],
-            data["post_url"]
-        )
-    else:
-        comments = []
+    cancel = threading.Event()
+    # Playwright treats 0 as no timeout
+    timeout_ms = max(1000, int(time_left(PAGE_LOAD_TIMEOUT_MS / 1000) * 1000))
+    try:
+        data = await loop.run_in_executor(executor, scrape_facebook_post_sync, post_url, True, cancel, timeout_ms)
+    except asyncio.CancelledError:
+        # The worker thread cannot be interrupted; it closes its browser at the next checkpoint
+        cancel.set()
+        raise
 
     post_id = post_url.split("/")[-1].split("?")[0]
     timestamp = datetime.utcnow().timestamp()
 
-    return {
+    yield {
         "platform": "facebook",
         "post": {
             "id": post_id,
@@ -158,12 +282,24 @@ async def scrape_facebook_post(post_url: str):
             "timestamp": timestamp,
             "image": data.get("post_img")
         },
-        "comments": [
-            {
-                "author": c["author"],
-                "text": c["text"],
-                "author_img": c["author_img"]
-            }
-            for c in comments
-        ]
+        "comments": []
     }
+
+    # if GraphQL present → stream comments
+    if "graphql_url" in data:
+        async for batch in iter_comments_from_graphql(
+            data["graphql_url"],
+            data["graphql_headers"],
+            data["graphql_body"],
+            data["post_url"]
+        ):
+            yield {
+                "comments": [
+                    {
+                        "author": c["author"],
+                        "text": c["text"],
+                        "author_img": c["author_img"]
+                    }
+                    for c in batch
+                ]
+            }
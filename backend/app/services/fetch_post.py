@@ -1,16 +1,31 @@
-from ..services.reddit import fetch_reddit_data
-from ..services.youtube import fetch_youtube_data
-from ..services.stackexchange import fetch_stackexchange_data
-from ..services.facebook import scrape_facebook_post
+from datetime import datetime
+from ..services.reddit import stream_reddit_data
+from ..services.youtube import stream_youtube_data
+from ..services.stackexchange import stream_stackexchange_data
+from ..services.facebook import stream_facebook_data
+from ..services.canonical import detect_platform
 
-async def fetch_post_data(url: str):
-    if "reddit.com" in url:
-        return await fetch_reddit_data(url)
-    elif "youtube.com" in url or "youtu.be" in url:
-        return await fetch_youtube_data(url)
-    elif "facebook.com" in url:
-        return await scrape_facebook_post(url)
-    elif "stackexchange.com" in url or "stackoverflow.com" in url:
-        return await fetch_stackexchange_data(url)
+def stream_post_data(url: str, since: datetime | None = None):
+    """Async generator over a post's data.
+
+    The first chunk carries "platform" and "post"; every chunk carries a page of "comments".
+    With `since`, only comments created after it are yielded.
+    """
+    platform = detect_platform(url)
+    if platform == "reddit":
+        return stream_reddit_data(url, since)
+    elif platform == "youtube":
+        return stream_youtube_data(url, since)
+    elif platform == "facebook":
+        return stream_facebook_data(url, since)
     else:
-        raise ValueError("Unsupported platform")
+        return stream_stackexchange_data(url, since)
+
+async def fetch_post_data(url: str):
+    data = None
+    async for chunk in stream_post_data(url):
+        if data is None:
+            data = chunk
+        else:
+            data["comments"].extend(chunk["comments"])
+    return data
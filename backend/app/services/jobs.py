@@ -0,0 +1,178 @@
+# app/services/jobs.py
+
+import asyncio
+import logging
+import socket
+import os
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {"succeeded", "failed"}
+CLAIM_ORDER = [("created_at", 1)]
+
+
+def claim_query(max_attempts: int, now: datetime) -> dict:
+    """Jobs a worker may claim: queued and due, or running with an expired lease."""
+    return {
+        "attempts": {"$lt": max_attempts},
+        "$or": [
+            {"status": "queued", "run_after": {"$lte": now}},
+            # Lease expired: the worker holding it died or hung
+            {"status": "running", "lease_until": {"$lt": now}},
+        ],
+    }
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying the job cannot help (bad input, unsupported post...)."""
+
+
+class JobQueue:
+    """Persistent job queue on a Mongo collection, processed by a bounded pool of async workers.
+
+    Jobs are claimed with an atomic find_one_and_update and hold a lease that a heartbeat keeps
+    extending while they run. A job whose lease expires (worker crashed, process restarted) is
+    picked up again by any worker until it runs out of attempts, so queued and in-flight jobs
+    survive restarts. Each worker task has its own id (host:pid:n), recorded on the jobs it holds.
+    """
+
+    def __init__(self, collection, handler, workers: int, lease_seconds: int, max_attempts: int,
+                 job_timeout: int, poll_interval: float = 1.0):
+        self.collection = collection
+        self.handler = handler
+        self.workers = workers
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.job_timeout = job_timeout
+        self.poll_interval = poll_interval
+        self.process_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._tasks = []
+
+    async def submit(self, kind: str, payload: dict, user_id: str) -> str:
+        now = datetime.utcnow()
+        result = await self.collection.insert_one({
+            "kind": kind,
+            "payload": payload,
+            "user_id": user_id,
+            "status": "queued",
+            "stage": "queued",
+            "percent": 0,
+            "attempts": 0,
+            "created_at": now,
+            "updated_at": now,
+            "run_after": now,
+        })
+        return str(result.inserted_id)
+
+    async def get(self, job_id: str, user_id: str) -> dict | None:
+        try:
+            oid = ObjectId(job_id)
+        except Exception:
+            return None
+        return await self.collection.find_one({"_id": oid, "user_id": user_id})
+
+    async def claim(self, worker_id: str) -> dict | None:
+        now = datetime.utcnow()
+        return await self.collection.find_one_and_update(
+            claim_query(self.max_attempts, now),
+            {
+                "$set": {
+                    "status": "running",
+                    "worker": worker_id,
+                    "lease_until": now + timedelta(seconds=self.lease_seconds),
+                    "started_at": now,
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=CLAIM_ORDER,
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def reap(self):
+        """Fail jobs whose lease expired after their last allowed attempt."""
+        now = datetime.utcnow()
+        await self.collection.update_many(
+            {"status": "running", "lease_until": {"$lt": now}, "attempts": {"$gte": self.max_attempts}},
+            {"$set": {"status": "failed", "error": "Job timed out", "updated_at": now}},
+        )
+
+    async def report(self, job_id, stage: str, percent: int, **extra):
+        await self.collection.update_one(
+            {"_id": job_id, "status": "running"},
+            {"$set": {"stage": stage, "percent": percent, "updated_at": datetime.utcnow(), **extra}},
+        )
+
+    async def _heartbeat(self, job: dict):
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await self.collection.update_one(
+                {"_id": job["_id"], "worker": job["worker"], "status": "running"},
+                {"$set": {"lease_until": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}},
+            )
+
+    async def _finish(self, job: dict, error: str | None = None, result: dict | None = None, permanent: bool = False):
+        now = datetime.utcnow()
+        if error is None:
+            update = {"status": "succeeded", "stage": "done", "percent": 100, "result": result}
+        elif permanent or job["attempts"] >= self.max_attempts:
+            update = {"status": "failed", "error": error}
+        else:
+            # Retry with exponential backoff
+            delay = 5 * 2 ** (job["attempts"] - 1)
+            update = {"status": "queued", "stage": "queued", "error": error, "run_after": now + timedelta(seconds=delay)}
+        await self.collection.update_one(
+            {"_id": job["_id"], "worker": job["worker"]},
+            {"$set": {**update, "updated_at": now}, "$unset": {"lease_until": ""}},
+        )
+
+    async def _run(self, job: dict):
+        async def progress(stage: str, percent: int, **extra):
+            await self.report(job["_id"], stage, percent, **extra)
+
+        heartbeat = asyncio.ensure_future(self._heartbeat(job))
+        try:
+            result = await asyncio.wait_for(self.handler(job, progress), timeout=self.job_timeout)
+        except PermanentJobError as e:
+            await self._finish(job, error=str(e), permanent=True)
+        except asyncio.TimeoutError:
+            await self._finish(job, error=f"Job exceeded {self.job_timeout}s")
+        except Exception as e:
+            logger.exception(f"Job {job['_id']} failed (attempt {job['attempts']})")
+            await self._finish(job, error=str(e) or type(e).__name__)
+        else:
+            await self._finish(job, result=result)
+        finally:
+            heartbeat.cancel()
+
+    async def _worker(self, worker_id: str):
+        while True:
+            try:
+                job = await self.claim(worker_id)
+                if job is None:
+                    await self.reap()
+                    await asyncio.sleep(self.poll_interval)
+                    continue
+                logger.info(f"Worker {worker_id} claimed job {job['_id']} (attempt {job['attempts']})")
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker error: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [
+                asyncio.ensure_future(self._worker(f"{self.process_id}:{n}")) for n in range(self.workers)
+            ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
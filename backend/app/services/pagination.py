@@ -0,0 +1,72 @@
+# app/services/pagination.py
+
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+# Listings are ordered newest first by (created_at, _id); a cursor is the position of the last
+# document returned, base64-encoded so clients treat it as opaque. Documents without created_at
+# (written before it was recorded) sort after all others and are paged by _id alone.
+NEWEST_FIRST = [("created_at", -1), ("_id", -1)]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_position(position: dict) -> str:
+    """An opaque cursor for a JSON-serializable position."""
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+def decode_position(cursor: str) -> dict:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise InvalidCursor("Invalid cursor")
+    if not isinstance(position, dict):
+        raise InvalidCursor("Invalid cursor")
+    return position
+
+
+def encode_cursor(document: dict) -> str:
+    created_at = document.get("created_at")
+    return encode_position({"t": created_at.isoformat() if created_at else None, "id": str(document["_id"])})
+
+
+def decode_cursor(cursor: str) -> tuple[datetime | None, ObjectId]:
+    position = decode_position(cursor)
+    try:
+        created_at = datetime.fromisoformat(position["t"]) if position["t"] else None
+        return created_at, ObjectId(position["id"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise InvalidCursor("Invalid cursor")
+
+
+def after_cursor(cursor: str | None) -> dict:
+    """The filter selecting documents that come after `cursor` in NEWEST_FIRST order."""
+    if not cursor:
+        return {}
+    created_at, oid = decode_cursor(cursor)
+    if created_at is None:
+        return {"created_at": None, "_id": {"$lt": oid}}
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "_id": {"$lt": oid}},
+        {"created_at": None},
+    ]}
+
+
+async def keyset_page(collection, query: dict, projection: dict | None, limit: int,
+                      cursor: str | None = None) -> tuple[list[dict], str | None]:
+    """One page of `query` newest first, and the cursor of the next page (None on the last page)."""
+    position = after_cursor(cursor)
+    documents = await collection.find({"$and": [query, position]} if position else query, projection) \
+        .sort(NEWEST_FIRST).limit(limit + 1).to_list(length=limit + 1)
+    if len(documents) <= limit:
+        return documents, None
+    documents = documents[:limit]
+    return documents, encode_cursor(documents[-1])
@@ -0,0 +1,307 @@
+# app/services/pipeline.py
+
+import asyncio
+import logging
+from datetime import datetime
+
+from langdetect import detect, DetectorFactory, LangDetectException
+
+from app.services.analysis_store import (
+    start_shared_analysis, append_comments, finish_shared_analysis, abort_shared_analysis, append_refreshed_comments,
+    record_refresh, save_sampled_analysis, bucket_embedded_comments, analysis_comments,
+)
+from app.services.canonical import PostIdentity
+from app.services.deadline import time_left
+from app.services.fetch_post import stream_post_data
+from app.services.sampling import StratifiedSampler, estimate_proportions, interval_width
+from app.services.sentiment import batcher, count_labels
+from app.services.timestamps import parse_timestamp
+from app.services.topic import analyze_topics
+
+DetectorFactory.seed = 0  # for deterministic results
+
+logger = logging.getLogger(__name__)
+
+# Pages buffered between stages; bounds memory when the network outpaces inference
+STAGE_QUEUE_SIZE = 4
+
+# Under a request deadline, fetching stops early enough to leave this long for scoring the
+# comments already fetched, topics and storing; topics are dropped if they would not finish
+# with STORE_RESERVE_SECONDS to spare
+DEADLINE_RESERVE_SECONDS = 20
+STORE_RESERVE_SECONDS = 2
+
+
+def filter_english(comments: list[dict]) -> list[dict]:
+    filtered_comments = []
+    for comment in comments:
+        text = comment.get("text", "")
+        if not text.strip():
+            continue
+        try:
+            if detect(text) == "en":
+                filtered_comments.append(comment)
+        except LangDetectException:
+            # If detection fails, skip comment
+            continue
+    return filtered_comments
+
+
+async def _replay(data: dict, page_size: int = 100):
+    """Stream already-fetched post data in the shape `stream_post_data` yields."""
+    comments = data["comments"]
+    yield {**data, "comments": comments[:page_size]}
+    for start in range(page_size, len(comments), page_size):
+        yield {"comments": comments[start:start + page_size]}
+
+
+async def _drain(queue: asyncio.Queue):
+    while (item := await queue.get()) is not None:
+        yield item
+
+
+async def _no_progress(stage: str, percent: int, **extra):
+    pass
+
+
+def _fetch_budget_spent() -> bool:
+    left = time_left()
+    return left is not None and left < DEADLINE_RESERVE_SECONDS
+
+
+async def _topics_within_deadline(comment_texts: list[str]) -> list | None:
+    """Topic results, or None when they cannot finish before the request deadline."""
+    loop = asyncio.get_running_loop()
+    left = time_left()
+    budget = None if left is None else left - STORE_RESERVE_SECONDS
+    if budget is not None and budget <= 0:
+        return None
+    try:
+        # The executor thread runs to completion regardless; only its result is dropped
+        topics = await asyncio.wait_for(loop.run_in_executor(None, analyze_topics, comment_texts), budget)
+    except asyncio.TimeoutError:
+        return None
+    if "results" not in topics:
+        raise ValueError("Missing 'results' key in topic analysis output")
+    return topics["results"]
+
+
+async def _stream_into_analysis(stream, first_comments: list, append, progress=_no_progress,
+                                truncate: bool = True, prefiltered: bool = False) -> tuple[list[str], datetime | None, bool]:
+    """Run the fetch -> language filter -> sentiment stages over a comment stream.
+
+    Scored pages are stored with `append(page, counts)` as they complete. Returns the scored comment texts,
+    the newest comment timestamp seen (the high-water mark for later refreshes) and whether
+    fetching stopped early because of the request deadline (only with `truncate`).
+    `prefiltered` skips language detection for comments that are already English-only.
+    """
+    loop = asyncio.get_running_loop()
+    raw_pages = asyncio.Queue(maxsize=STAGE_QUEUE_SIZE)
+    english_pages = asyncio.Queue(maxsize=STAGE_QUEUE_SIZE)
+    comment_texts = []
+    high_water_mark = None
+    truncated = False
+
+    async def fetch_stage():
+        nonlocal truncated
+
+        async def put(page):
+            nonlocal high_water_mark
+            timestamps = [t for t in (parse_timestamp(c.get("timestamp")) for c in page) if t]
+            if timestamps:
+                high_water_mark = max([high_water_mark or timestamps[0], *timestamps])
+            await raw_pages.put(page)
+
+        try:
+            if first_comments:
+                await put(first_comments)
+            async for chunk in stream:
+                await put(chunk["comments"])
+                if truncate and _fetch_budget_spent():
+                    truncated = True
+                    break
+        finally:
+            await stream.aclose()
+        await raw_pages.put(None)
+
+    async def filter_stage():
+        async for page in _drain(raw_pages):
+            english = page if prefiltered else await loop.run_in_executor(None, filter_english, page)
+            if english:
+                await english_pages.put(english)
+        await english_pages.put(None)
+
+    async def sentiment_stage():
+        async for page in _drain(english_pages):
+            texts = [c["text"] for c in page]
+            # Shared batcher: concurrent pipelines score their pages in common model batches
+            result = await batcher.score(texts)
+            for comment, label in zip(page, result["labels"]):
+                comment["sentiment"] = label
+            await append(page, result["counts"])
+            comment_texts.extend(texts)
+            # The total is unknown while streaming, so report the running count within a fixed band
+            await progress("scoring", 40, comments_scored=len(comment_texts))
+
+    stages = [asyncio.ensure_future(stage()) for stage in (fetch_stage, filter_stage, sentiment_stage)]
+    try:
+        await asyncio.gather(*stages)
+    except BaseException:
+        # One failed stage would leave the others blocked on their queues
+        for stage in stages:
+            stage.cancel()
+        raise
+    return comment_texts, high_water_mark, truncated
+
+
+async def run_pipeline(url: str, identity: PostIdentity, canonical_url: str, progress=None,
+                       prefetched: dict | None = None) -> dict:
+    """Fetch, filter, score and store a post with the stages overlapping.
+
+    Comment pages flow fetch -> language filter -> sentiment through bounded queues and are
+    appended to a new generation of the shared analysis as soon as they are scored; it replaces
+    the published one only once complete, and is discarded if the run fails or is cancelled. Topic modeling needs the whole
+    corpus, so it runs once the stream is exhausted on the retained comment texts.
+    `progress(stage, percent, **extra)` is awaited at each stage boundary.
+
+    Under a request deadline (app.services.deadline) fetching stops early and topics are skipped
+    when they would not fit; the stored analysis lists what was cut short in `degraded`.
+    `prefetched` is post data fetched ahead of time (app.services.prefetch) to use instead.
+    """
+    progress = progress or _no_progress
+    await progress("fetching", 5)
+    stream = _replay(prefetched) if prefetched else stream_post_data(url)
+    header = await anext(stream)
+    post = header["post"]
+    post["id"] = str(post["id"])
+
+    run = await start_shared_analysis(identity, canonical_url, post, header.get("coverage"))
+    analysis_id, generation = run["_id"], run["generation"]
+
+    async def append(page, counts):
+        await append_comments(analysis_id, generation, page, counts)
+
+    try:
+        await progress("scoring", 10)
+        comment_texts, high_water_mark, truncated = await _stream_into_analysis(
+            stream, header["comments"], append, progress,
+            prefiltered=bool(prefetched and prefetched.get("english_only")),
+        )
+        degraded = ["comments"] if truncated else []
+
+        await progress("topics", 80, comments_scored=len(comment_texts))
+        topics = await _topics_within_deadline(comment_texts)
+        logger.info(f"Topics for {identity.key}: {topics}")
+        if topics is None:
+            logger.warning(f"Skipping topics for {identity.key}: request deadline reached")
+            topics, degraded = [], degraded + ["topics"]
+
+        await progress("storing", 95)
+        return await finish_shared_analysis(analysis_id, generation, topics, high_water_mark, degraded)
+    except BaseException:
+        # Failed or cancelled: drop the partial generation; readers keep the published one
+        await asyncio.shield(abort_shared_analysis(analysis_id, generation))
+        raise
+
+
+async def run_sampled_pipeline(url: str, identity: PostIdentity, canonical_url: str, sample_size: int,
+                               target_width: float | None = None, confidence: float = 0.95,
+                               max_sample_size: int = 5000, progress=None, prefetched: dict | None = None) -> dict:
+    """Score a stratified random sample of the comments and estimate the sentiment split.
+
+    The thread is still fetched in full (the strata need every comment's time and depth), but
+    language detection, sentiment and topics only run on the sample, so their cost stays flat
+    however large the thread is. With `target_width`, the sample grows by half its initial size
+    until every label's confidence interval is at most that wide or `max_sample_size` is reached.
+    """
+    loop = asyncio.get_running_loop()
+    progress = progress or _no_progress
+    await progress("fetching", 5)
+    stream = _replay(prefetched) if prefetched else stream_post_data(url)
+    header = await anext(stream)
+    post = header["post"]
+    post["id"] = str(post["id"])
+    comments = list(header["comments"])
+    degraded = []
+    async for chunk in stream:
+        comments.extend(chunk["comments"])
+        if _fetch_budget_spent():
+            await stream.aclose()
+            degraded.append("comments")
+            break
+
+    sampler = StratifiedSampler(comments)
+    drawn, scored_counts, scored = {}, {}, []
+    step = sample_size
+    while True:
+        await progress("scoring", 40, comments_scored=len(scored))
+        picks = sampler.draw(step)
+        strata = {id(comments[i]): key for key, i in picks}
+        for key, _ in picks:
+            drawn[key] = drawn.get(key, 0) + 1
+        english = await loop.run_in_executor(None, filter_english, [comments[i] for _, i in picks])
+        result = await batcher.score([c["text"] for c in english])
+        for comment, label in zip(english, result["labels"]):
+            comment["sentiment"] = label
+            counts = scored_counts.setdefault(strata[id(comment)], {})
+            counts[label] = counts.get(label, 0) + 1
+        scored.extend(english)
+
+        proportions = estimate_proportions(sampler, drawn, scored_counts, confidence)
+        done = sum(drawn.values()) >= max_sample_size or sampler.exhausted
+        if target_width is None or done or (scored and interval_width(proportions) <= target_width):
+            break
+        step = min(max(sample_size // 2, 1), max_sample_size - sum(drawn.values()))
+
+    estimate = {
+        "population": len(comments),
+        "sampled": sum(drawn.values()),
+        "scored": len(scored),
+        "confidence": confidence,
+        "proportions": proportions,
+        "intervalWidth": round(interval_width(proportions), 4) if scored else None,
+        "targetIntervalWidth": target_width,
+    }
+
+    await progress("topics", 80, comments_scored=len(scored))
+    topics = await _topics_within_deadline([c["text"] for c in scored])
+    if topics is None:
+        topics, degraded = [], degraded + ["topics"]
+
+    await progress("storing", 95)
+    sentiment = count_labels([c["sentiment"] for c in scored])
+    return await save_sampled_analysis(
+        identity, canonical_url, post, scored, sentiment, topics, estimate, header.get("coverage"), degraded
+    )
+
+
+async def stored_high_water_mark(analysis: dict) -> datetime | None:
+    if analysis.get("high_water_mark"):
+        return analysis["high_water_mark"]
+    # Analyses stored before refresh support: derive it from the stored comments once
+    comments = await analysis_comments(analysis)
+    timestamps = [t for t in (parse_timestamp(c.get("timestamp")) for c in comments) if t]
+    return max(timestamps, default=None)
+
+
+async def refresh_pipeline(analysis: dict) -> dict:
+    """Fetch and score only the comments newer than the analysis' high-water mark and merge them in.
+
+    Topics are kept as they are; new comments are merged into the stored comments and sentiment counts.
+    """
+    since = await stored_high_water_mark(analysis)
+    if since is None:
+        raise ValueError("This analysis has no comment timestamps to refresh from")
+    # New comments are appended to buckets, so embedded ones have to move there first
+    analysis = await bucket_embedded_comments(analysis)
+
+    stream = stream_post_data(analysis["url"], since=since)
+    header = await anext(stream)
+    # Never truncated: comments newer than the mark but not fetched would be skipped by the next refresh
+    async def append(page, counts):
+        await append_refreshed_comments(analysis, page, counts)
+
+    comment_texts, high_water_mark, _ = await _stream_into_analysis(stream, header["comments"], append, truncate=False)
+
+    logger.info(f"Refreshed {analysis['platform']}:{analysis['post_id']}: {len(comment_texts)} new comments since {since}")
+    return await record_refresh(analysis, len(comment_texts), high_water_mark or since)
@@ -0,0 +1,119 @@
+# app/services/prefetch.py
+
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+
+from app.core.config import settings
+from app.services.admission import AdmissionRejected
+from app.services.deadline import deadline_scope
+from app.services.fetch_post import fetch_post_data
+from app.services.pipeline import filter_english
+
+logger = logging.getLogger(__name__)
+
+
+class Prefetcher:
+    """Speculatively fetch a post while the user is still on the Add Post screen.
+
+    `start` launches the platform fetch (and optionally the language filter) in the background
+    and parks the task for `ttl` seconds; `take` hands it to the analysis that follows, waiting for
+    it if it is still running. At most `max_entries` are kept; the oldest is dropped first. A user
+    may have `max_per_user` prefetches outstanding (started and neither taken nor expired);
+    starting another raises AdmissionRejected (429).
+    """
+
+    def __init__(self, ttl: float, max_entries: int, max_per_user: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_per_user = max_per_user
+        self.entries: OrderedDict = OrderedDict()  # key -> (expires_at, task, user_id)
+        self.stats = {"started": 0, "hits": 0, "expired": 0, "evicted": 0, "failed": 0, "shed_user": 0}
+
+    async def _fetch(self, url: str, filter_language: bool) -> dict:
+        # Nobody waits on a prefetch, so it is bounded by its own time to live
+        with deadline_scope(self.ttl):
+            data = await fetch_post_data(url)
+            if filter_language:
+                loop = asyncio.get_running_loop()
+                data["comments"] = await loop.run_in_executor(None, filter_english, data["comments"])
+            data["english_only"] = filter_language
+            return data
+
+    def _drop(self, key: str):
+        _, task, _ = self.entries.pop(key)
+        task.cancel()
+
+    def _expire(self):
+        now = time.monotonic()
+        for key in [k for k, (expires_at, _, _) in self.entries.items() if expires_at <= now]:
+            self.stats["expired"] += 1
+            self._drop(key)
+
+    def status(self, key: str) -> str | None:
+        self._expire()
+        if key not in self.entries:
+            return None
+        _, task, _ = self.entries[key]
+        if not task.done():
+            return "running"
+        return "failed" if task.cancelled() or task.exception() else "ready"
+
+    def start(self, key: str, url: str, user_id: str, filter_language: bool = True) -> str:
+        current = self.status(key)
+        if current in ("running", "ready"):
+            return current
+        if current == "failed":
+            self._drop(key)
+
+        owned = [expires_at for expires_at, _, owner in self.entries.values() if owner == user_id]
+        if len(owned) >= self.max_per_user:
+            self.stats["shed_user"] += 1
+            retry_after = max(1, math.ceil(min(owned) - time.monotonic()))
+            raise AdmissionRejected(429, "Too many prefetches in progress for this user", retry_after)
+
+        while len(self.entries) >= self.max_entries:
+            self.stats["evicted"] += 1
+            self._drop(next(iter(self.entries)))
+
+        task = asyncio.ensure_future(self._fetch(url, filter_language))
+        task.add_done_callback(self._log_failure)
+        self.entries[key] = (time.monotonic() + self.ttl, task, user_id)
+        self.stats["started"] += 1
+        return "started"
+
+    def _log_failure(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception():
+            self.stats["failed"] += 1
+            logger.warning(f"Prefetch failed: {task.exception()!r}")
+
+    async def take(self, key: str) -> dict | None:
+        """The prefetched data for `key`, or None if there is none (or it failed)."""
+        self._expire()
+        if key not in self.entries:
+            return None
+        _, task, user_id = self.entries.pop(key)
+        try:
+            # Shielded: a cancelled analysis should not waste a fetch that another one could use
+            data = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.cancelled():
+                self.entries[key] = (time.monotonic() + self.ttl, task, user_id)
+            raise
+        except Exception:
+            return None
+        self.stats["hits"] += 1
+        return data
+
+    def snapshot(self) -> dict:
+        self._expire()
+        return {**self.stats, "entries": len(self.entries)}
+
+
+prefetcher = Prefetcher(
+    ttl=settings.prefetch_ttl_seconds,
+    max_entries=settings.prefetch_max_entries,
+    max_per_user=settings.prefetch_max_per_user,
+)
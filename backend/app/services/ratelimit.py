@@ -0,0 +1,154 @@
+# app/services/ratelimit.py
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# YouTube Data API v3 quota cost per call, by endpoint
+YOUTUBE_QUOTA_COSTS = {
+    "videos": 1,
+    "channels": 1,
+    "commentThreads": 1,
+    "comments": 1,
+    "search": 100,
+}
+
+# Adaptive rate control: multiplicative decrease on throttling, additive recovery on success
+THROTTLE_FACTOR = 0.5
+RECOVERY_STEP = 0.05
+MIN_RATE_FRACTION = 0.1
+
+
+class QuotaExceededError(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.base_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, cost: float = 1.0) -> float:
+        """Wait until `cost` tokens are available; returns the time spent waiting."""
+        waited = 0.0
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                delay = max(0.0, self.blocked_until - now)
+                if not delay and self.tokens >= cost:
+                    self.tokens -= cost
+                    return waited
+                if not delay:
+                    delay = (cost - self.tokens) / self.rate
+                waited += delay
+                await asyncio.sleep(delay)
+
+    def slow_down(self, pause: float = 0.0):
+        self.rate = max(self.base_rate * MIN_RATE_FRACTION, self.rate * THROTTLE_FACTOR)
+        if pause:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+
+    def recover(self):
+        self.rate = min(self.base_rate, self.rate + self.base_rate * RECOVERY_STEP)
+
+
+class RateScheduler:
+    """Central permit issuer shared by every platform fetcher.
+
+    Each request takes a permit from its platform bucket and, when a credential is given,
+    from that credential's bucket as well. YouTube calls are also charged against the daily quota.
+    """
+
+    def __init__(self, limits: dict[str, tuple[float, float]], youtube_daily_quota: int):
+        self.limits = limits
+        self.buckets: dict[str, TokenBucket] = {}
+        self.youtube_daily_quota = youtube_daily_quota
+        self.quota_day = None
+        self.quota_used = 0
+        self.stats = {}
+
+    def _bucket(self, name: str, platform: str) -> TokenBucket:
+        if name not in self.buckets:
+            rate, capacity = self.limits.get(platform, (1.0, 1.0))
+            self.buckets[name] = TokenBucket(rate, capacity)
+        return self.buckets[name]
+
+    def _platform_stats(self, platform: str) -> dict:
+        return self.stats.setdefault(platform, {"permits": 0, "throttled": 0, "wait_seconds": 0.0})
+
+    def _charge_youtube_quota(self, endpoint: str):
+        today = datetime.now(timezone.utc).date()
+        if self.quota_day != today:
+            self.quota_day, self.quota_used = today, 0
+        cost = YOUTUBE_QUOTA_COSTS.get(endpoint, 1)
+        if self.quota_used + cost > self.youtube_daily_quota:
+            raise QuotaExceededError(f"YouTube daily quota of {self.youtube_daily_quota} units exhausted")
+        self.quota_used += cost
+
+    async def acquire(self, platform: str, endpoint: str | None = None, credential: str | None = None):
+        if platform == "youtube":
+            self._charge_youtube_quota(endpoint or "")
+
+        waited = await self._bucket(platform, platform).acquire()
+        if credential:
+            waited += await self._bucket(f"{platform}:{credential}", platform).acquire()
+
+        stats = self._platform_stats(platform)
+        stats["permits"] += 1
+        stats["wait_seconds"] += waited
+
+    def report(self, platform: str, status: int, backoff: float | None = None, credential: str | None = None):
+        """Feed an upstream response back so the buckets can adapt."""
+        buckets = [self._bucket(platform, platform)]
+        if credential:
+            buckets.append(self._bucket(f"{platform}:{credential}", platform))
+
+        if status == 429 or backoff:
+            self._platform_stats(platform)["throttled"] += 1
+            logger.warning(f"{platform} throttled (status={status}, backoff={backoff}); slowing down")
+            for bucket in buckets:
+                bucket.slow_down(pause=backoff or 0.0)
+        elif status < 400:
+            for bucket in buckets:
+                bucket.recover()
+
+    def snapshot(self) -> dict:
+        return {
+            "platforms": {
+                name: {"rate": round(b.rate, 3), "base_rate": b.base_rate, "tokens": round(b.tokens, 2)}
+                for name, b in self.buckets.items()
+            },
+            "stats": self.stats,
+            "youtube_quota": {
+                "day": self.quota_day.isoformat() if self.quota_day else None,
+                "used": self.quota_used,
+                "limit": self.youtube_daily_quota,
+            },
+        }
+
+
+scheduler = RateScheduler(
+    limits={
+        # platform: (requests per second, burst)
+        "reddit": (settings.rate_limit_reddit, settings.rate_burst_reddit),
+        "youtube": (settings.rate_limit_youtube, 10),
+        "stackexchange": (settings.rate_limit_stackexchange, 10),
+        "facebook": (settings.rate_limit_facebook, 2),
+    },
+    youtube_daily_quota=settings.youtube_daily_quota,
+)
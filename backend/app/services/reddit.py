@@ -1,9 +1,24 @@
 import re
+import asyncio
+import heapq
+import itertools
+import logging
+import time
 from urllib.parse import urlparse
-from datetime import datetime
+from datetime import datetime, timezone
 import asyncpraw
+from asyncpraw.models import MoreComments
+from asyncprawcore.exceptions import ServerError, RequestException
 from app.core.config import settings
 import uuid
+import json
+from app.services.cache import cache
+from app.services.deadline import time_left
+from app.services.ratelimit import scheduler
+from app.services.resilience import resilience
+from app.services.timestamps import parse_timestamp
+
+logger = logging.getLogger(__name__)
 
 def extract_reddit_id(url: str) -> str:
     match = re.search(r'/comments/([A-Za-z0-9_]+)/', url)
@@ -16,31 +31,147 @@ def extract_reddit_id(url: str) -> str:
         return parts[idx + 1]
     raise ValueError('Invalid Reddit URL')
 
-async def fetch_reddit_data(url: str) -> dict:
+async def _load_more(more: MoreComments) -> list:
+    await scheduler.acquire("reddit", credential=settings.reddit_client_id)
+    return await more.comments()
+
+async def expand_comment_tree(submission, max_requests: int, time_budget: float, concurrency: int,
+                              since: datetime | None = None):
+    """Flatten a submission's comment tree, resolving "load more comments" stubs in parallel.
+
+    MoreComments stubs are expanded highest-scoring branch first (by the score of the parent
+    comment), with up to `concurrency` morechildren calls in flight, until `max_requests` calls
+    or `time_budget` seconds are used up. Returns the comments and a coverage report.
+    Every call takes a reddit rate permit: concurrent calls overlap their round trips while the
+    bucket has burst left, then proceed at the configured rate whatever the concurrency.
+
+    With `since` (a refresh, loaded with comment_sort "new"), only top-level stubs are expanded,
+    and none once a top-level comment not newer than `since` has been seen: top-level comments
+    come newest first, so the rest of the thread holds nothing new at that level.
+    """
+    comments, seen, scores = [], set(), {}
+    stubs, sequence = [], itertools.count()
+    cutoff = since.replace(tzinfo=timezone.utc).timestamp() if since else None
+    reached_since = False
+    skipped = 0
+
+    def collect(items):
+        nonlocal reached_since, skipped
+        for item in items:
+            top_level = item.parent_id == submission.fullname
+            if isinstance(item, MoreComments):
+                if cutoff is not None and not top_level:
+                    skipped += 1
+                    continue
+                priority = scores.get(item.parent_id, submission.score)
+                heapq.heappush(stubs, (-priority, -item.count, next(sequence), item))
+            elif item.id not in seen:
+                seen.add(item.id)
+                scores[item.fullname] = item.score
+                comments.append(item)
+                # Stickied comments are pinned first whatever their age
+                if cutoff is not None and top_level and not item.stickied and item.created_utc <= cutoff:
+                    reached_since = True
+
+    collect(submission.comments.list())
+
+    deadline = time.monotonic() + time_budget
+    requests, pending = 0, set()
+    while stubs or pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        while stubs and not reached_since and len(pending) < concurrency and requests < max_requests:
+            _, _, _, more = heapq.heappop(stubs)
+            pending.add(asyncio.ensure_future(_load_more(more)))
+            requests += 1
+        if not pending:
+            break
+        done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            try:
+                for comment in task.result():
+                    collect([comment])
+                    if not isinstance(comment, MoreComments):
+                        collect(comment.replies.list())
+            except Exception as e:
+                logger.warning(f"Failed to expand comments for {submission.id}: {e}")
+
+    for task in pending:
+        task.cancel()
+
+    reported = submission.num_comments or 0
+    coverage = {
+        "loaded": len(comments),
+        "reported_total": reported,
+        "ratio": round(min(1.0, len(comments) / reported), 3) if reported else 1.0,
+        "expansion_requests": requests,
+        "unexpanded_branches": len(stubs) + len(pending) + skipped,
+        "budget_exhausted": bool((stubs and not reached_since) or pending),
+    }
+    return comments, coverage
+
+async def fetch_reddit_data(url: str, max_age: int | None = None, since: datetime | None = None) -> dict:
+    """The submission and its comment tree, expanded within the configured budget.
+
+    With `since` (a refresh or watch poll) the thread is loaded newest first and expanded only
+    as far as needed to reach `since`, so a poll costs requests in proportion to the new
+    comments rather than to the thread; that partial thread bypasses the response cache.
+    """
+    post_id = extract_reddit_id(url)
+
+    # asyncpraw does not expose conditional requests, so cache the assembled thread by TTL only
+    cache_key = cache.make_key("reddit", f"submission/{post_id}")
+    if since is None:
+        entry = await cache.get("reddit", cache_key)
+        if entry and cache.is_fresh("reddit", entry, max_age):
+            cache.record_hit(entry)
+            return entry["payload"]
+    cache.stats["misses"] += 1
+
     reddit = asyncpraw.Reddit( 
         client_id=settings.reddit_client_id,
         client_secret=settings.reddit_client_secret,
         user_agent=settings.reddit_user_agent,
     )
 
-    post_id = extract_reddit_id(url)
     async with reddit:
-        submission = await reddit.submission(id=post_id)
-        await submission.load()
-        await submission.comments.replace_more(limit=0)
+        async def load_submission():
+            await scheduler.acquire("reddit", credential=settings.reddit_client_id)
+            # fetch=False: load() is the one request this permit pays for
+            submission = await reddit.submission(id=post_id, fetch=False)
+            if since:
+                submission.comment_sort = "new"
+            await submission.load()
+            return submission
+
+        submission = await resilience.call(
+            "reddit", load_submission, retry_on=(ServerError, RequestException, asyncio.TimeoutError)
+        )
+        loaded, coverage = await expand_comment_tree(
+            submission,
+            max_requests=settings.reddit_expand_max_requests,
+            time_budget=time_left(settings.reddit_expand_time_budget),
+            concurrency=settings.reddit_expand_concurrency,
+            since=since,
+        )
+        logger.info(f"Reddit {post_id}: loaded {coverage['loaded']}/{coverage['reported_total']} comments")
 
         comments = []
-        for comment in submission.comments.list():
+        for comment in loaded:
             comments.append({
                 "author": comment.author.name if comment.author else "deleted",
                 "text": comment.body,
-                "created_utc": comment.created_utc
+                "created_utc": comment.created_utc,
+                "depth": getattr(comment, "depth", 0)
             })
 
         # Get author avatar URL safely (if available)
         author_avatar = None
-        if submission.author:
+        # Refreshes keep the stored post, so they skip the avatar lookup
+        if submission.author and since is None:
             try:
+               await scheduler.acquire("reddit", credential=settings.reddit_client_id)
                redditor = await reddit.redditor(submission.author.name)
                await redditor.load()
                author_avatar = getattr(redditor, "icon_img", None)
@@ -49,7 +180,7 @@ async def fetch_reddit_data(url: str) -> dict:
 
         
 
-        return {
+        result = {
             "platform": "reddit",
             "post": {
                 "id": submission.id,
@@ -63,8 +194,30 @@ async def fetch_reddit_data(url: str) -> dict:
                     "id": str(uuid.uuid4()),
                     "author": comment["author"],
                     "text": comment["text"],
-                    "timestamp": datetime.utcfromtimestamp(comment["created_utc"]).isoformat() + 'Z'
+                    "timestamp": datetime.utcfromtimestamp(comment["created_utc"]).isoformat() + 'Z',
+                    "depth": comment["depth"]
                 }
                 for comment in comments
-            ]
+            ],
+            "coverage": coverage
         }
+        if since is None:
+            await cache.put("reddit", cache_key, result, len(json.dumps(result)))
+        return result
+
+
+REDDIT_PAGE_SIZE = 100
+
+async def stream_reddit_data(url: str, since: datetime | None = None):
+    """Yield the submission first, then its comments in pages.
+
+    The comments loaded with the submission arrive in a single response, so they are paged locally.
+    Reddit has no server-side "newer than" filter for a thread, so `since` is applied here.
+    """
+    data = await fetch_reddit_data(url, max_age=0 if since else None, since=since)
+    yield {"platform": data["platform"], "post": data["post"], "comments": [], "coverage": data.get("coverage")}
+    comments = data["comments"]
+    if since:
+        comments = [c for c in comments if (parse_timestamp(c["timestamp"]) or since) > since]
+    for start in range(0, len(comments), REDDIT_PAGE_SIZE):
+        yield {"comments": comments[start:start + REDDIT_PAGE_SIZE]}
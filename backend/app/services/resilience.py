@@ -0,0 +1,216 @@
+# app/services/resilience.py
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+
+import aiohttp
+
+from app.core.config import settings
+from app.services.deadline import time_left
+
+logger = logging.getLogger(__name__)
+
+# Latency samples kept per platform, and how many are needed before hedging kicks in
+LATENCY_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+HEDGE_PERCENTILE = 0.95
+
+RETRY_BASE_DELAY = 0.25
+RETRY_MAX_DELAY = 4.0
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while a platform's circuit breaker is open."""
+
+    def __init__(self, platform: str, retry_after: float):
+        super().__init__(f"{platform} is unavailable; retry in {retry_after:.0f}s")
+        self.platform = platform
+        self.retry_after = retry_after
+
+
+class UpstreamError(Exception):
+    """A retryable upstream response (5xx); carries it so callers can still inspect it."""
+
+    def __init__(self, status: int, data=None):
+        super().__init__(f"Upstream returned {status}")
+        self.status = status
+        self.data = data
+
+
+RETRYABLE_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, UpstreamError)
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and fails fast for `reset_timeout` seconds.
+
+    Then one probe request is let through (half-open): success closes the breaker, failure reopens it.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def allow(self, platform: str):
+        if self.state == "closed":
+            return
+        elapsed = time.monotonic() - self.opened_at
+        if self.state == "open" and elapsed >= self.reset_timeout:
+            self.state = "half_open"
+        if self.state == "half_open" and not self.probing:
+            self.probing = True
+            return
+        raise CircuitOpenError(platform, max(1.0, self.reset_timeout - elapsed))
+
+    def record_success(self):
+        self.state, self.failures, self.probing = "closed", 0, False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            self.state, self.opened_at, self.probing = "open", time.monotonic(), False
+
+
+class RetryBudget:
+    """Retries (and hedges) may add at most `ratio` extra load on top of first attempts.
+
+    Each call deposits `ratio` tokens, each retry withdraws one; `min_tokens` allows a trickle of
+    retries at low traffic.
+    """
+
+    def __init__(self, ratio: float, min_tokens: float = 3.0):
+        self.ratio = ratio
+        self.tokens = min_tokens
+        self.max_tokens = max(min_tokens, 100 * ratio)
+
+    def deposit(self):
+        self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class Resilience:
+    """Per-platform circuit breakers, hedged requests and budgeted, jittered retries.
+
+    `call(platform, fn)` runs `fn()` (a fresh upstream attempt per invocation). With `hedge`, an
+    attempt still running after the platform's p95 latency is duplicated and the first result wins;
+    only use it for idempotent requests.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float, max_attempts: int, budget_ratio: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_attempts = max_attempts
+        self.budget_ratio = budget_ratio
+        self.breakers: dict[str, CircuitBreaker] = {}
+        self.budgets: dict[str, RetryBudget] = {}
+        self.latencies: dict[str, deque] = {}
+        self.stats = {}
+
+    def _state(self, platform: str):
+        if platform not in self.breakers:
+            self.breakers[platform] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            self.budgets[platform] = RetryBudget(self.budget_ratio)
+            self.latencies[platform] = deque(maxlen=LATENCY_WINDOW)
+            self.stats[platform] = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "rejected": 0}
+        return self.breakers[platform], self.budgets[platform], self.latencies[platform], self.stats[platform]
+
+    def p95(self, platform: str) -> float | None:
+        samples = self.latencies.get(platform)
+        if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[int(len(ordered) * HEDGE_PERCENTILE) - 1]
+
+    async def _timed(self, platform: str, fn):
+        started = time.monotonic()
+        result = await fn()
+        self.latencies[platform].append(time.monotonic() - started)
+        return result
+
+    async def _hedged(self, platform: str, fn, budget: RetryBudget, stats: dict):
+        primary = asyncio.ensure_future(self._timed(platform, fn))
+        delay = self.p95(platform)
+        if delay is None:
+            return await primary
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and budget.withdraw():
+                stats["hedges"] += 1
+                tasks.add(asyncio.ensure_future(self._timed(platform, fn)))
+            while True:
+                done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((t for t in done if not t.exception()), None)
+                if winner is not None:
+                    if winner is not primary:
+                        stats["hedge_wins"] += 1
+                    return winner.result()
+                tasks -= done
+                if not tasks:
+                    # Every attempt failed; surface the first one's error
+                    return done.pop().result()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def call(self, platform: str, fn, hedge: bool = False, retry_on: tuple = RETRYABLE_ERRORS):
+        breaker, budget, _, stats = self._state(platform)
+        stats["calls"] += 1
+        budget.deposit()
+        for attempt in range(self.max_attempts):
+            try:
+                breaker.allow(platform)
+            except CircuitOpenError:
+                stats["rejected"] += 1
+                raise
+            try:
+                result = await (self._hedged(platform, fn, budget, stats) if hedge else self._timed(platform, fn))
+            except retry_on as e:
+                if time_left() == 0:
+                    # Our own deadline ran out; that says nothing about the upstream
+                    raise
+                breaker.record_failure()
+                delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+                left = time_left()
+                if attempt + 1 == self.max_attempts or (left is not None and left <= delay) or not budget.withdraw():
+                    raise
+                stats["retries"] += 1
+                logger.warning(f"{platform} request failed (attempt {attempt + 1}): {e!r}; retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+            else:
+                breaker.record_success()
+                return result
+            finally:
+                # A probe that ended any other way (cancelled, non-retryable error) must not wedge half-open
+                breaker.probing = False
+
+    def snapshot(self) -> dict:
+        return {
+            platform: {
+                "state": breaker.state,
+                "consecutive_failures": breaker.failures,
+                "p95_seconds": round(p95, 3) if (p95 := self.p95(platform)) is not None else None,
+                "retry_tokens": round(self.budgets[platform].tokens, 2),
+                **self.stats[platform],
+            }
+            for platform, breaker in self.breakers.items()
+        }
+
+
+resilience = Resilience(
+    failure_threshold=settings.breaker_failure_threshold,
+    reset_timeout=settings.breaker_reset_seconds,
+    max_attempts=settings.retry_max_attempts,
+    budget_ratio=settings.retry_budget_ratio,
+)
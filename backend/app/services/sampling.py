@@ -0,0 +1,98 @@
+# app/services/sampling.py
+
+import math
+import random
+from statistics import NormalDist
+
+from app.services.timestamps import parse_timestamp
+
+LABELS = ("positive", "neutral", "negative")
+TIME_BUCKETS = 4
+MAX_DEPTH_BUCKET = 2  # depth 0 (top level), 1, and 2+
+
+
+def _time_bucket_edges(comments: list[dict]) -> list:
+    timestamps = sorted(t for t in (parse_timestamp(c.get("timestamp")) for c in comments) if t)
+    if not timestamps:
+        return []
+    return [timestamps[len(timestamps) * i // TIME_BUCKETS] for i in range(1, TIME_BUCKETS)]
+
+
+def stratum_of(comment: dict, edges: list) -> tuple:
+    timestamp = parse_timestamp(comment.get("timestamp"))
+    time_bucket = sum(1 for edge in edges if timestamp and timestamp >= edge) if timestamp else -1
+    depth_bucket = min(int(comment.get("depth") or 0), MAX_DEPTH_BUCKET)
+    return time_bucket, depth_bucket
+
+
+class StratifiedSampler:
+    """Draws comments without replacement, stratified by time (quartiles) and thread depth.
+
+    Each draw is allocated to strata in proportion to their size, so repeated draws keep the
+    cumulative sample close to proportional while it grows.
+    """
+
+    def __init__(self, comments: list[dict], seed: int | None = None):
+        rng = random.Random(seed)
+        edges = _time_bucket_edges(comments)
+        self.strata: dict[tuple, list[int]] = {}
+        for index, comment in enumerate(comments):
+            self.strata.setdefault(stratum_of(comment, edges), []).append(index)
+        for indices in self.strata.values():
+            rng.shuffle(indices)
+        self.population = len(comments)
+        self.drawn = {key: 0 for key in self.strata}
+
+    @property
+    def exhausted(self) -> bool:
+        return all(self.drawn[key] >= len(indices) for key, indices in self.strata.items())
+
+    def draw(self, n: int) -> list[tuple[tuple, int]]:
+        """Return up to `n` new (stratum, comment index) pairs."""
+        target_total = sum(self.drawn.values()) + n
+        picks = []
+        for key, indices in self.strata.items():
+            share = math.ceil(target_total * len(indices) / self.population) if self.population else 0
+            take = min(len(indices), max(share, 1)) - self.drawn[key]
+            if take > 0:
+                picks.extend((key, i) for i in indices[self.drawn[key]:self.drawn[key] + take])
+                self.drawn[key] += take
+        return picks
+
+
+def estimate_proportions(sampler: StratifiedSampler, drawn: dict, scored: dict, confidence: float) -> dict:
+    """Stratified estimate of each label's share with normal-approximation confidence intervals.
+
+    `drawn[stratum]` counts sampled comments (including ones dropped by the language filter) and
+    `scored[stratum][label]` the scored ones. The language filter's pass rate in each stratum
+    scales its weight, so the estimate describes the English comments the full mode would score.
+    """
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    weights, total_weight = {}, 0.0
+    for key, indices in sampler.strata.items():
+        n_scored = sum(scored.get(key, {}).values())
+        if n_scored:
+            weights[key] = len(indices) * n_scored / drawn[key]
+            total_weight += weights[key]
+
+    proportions = {}
+    for label in LABELS:
+        estimate, variance = 0.0, 0.0
+        for key, weight in weights.items():
+            n_scored = sum(scored[key].values())
+            p = scored[key].get(label, 0) / n_scored
+            w = weight / total_weight
+            fpc = max(0.0, 1 - drawn[key] / len(sampler.strata[key]))
+            estimate += w * p
+            variance += w * w * p * (1 - p) / n_scored * fpc
+        half_width = z * math.sqrt(variance)
+        proportions[label] = {
+            "estimate": round(estimate, 4),
+            "low": round(max(0.0, estimate - half_width), 4),
+            "high": round(min(1.0, estimate + half_width), 4),
+        }
+    return proportions
+
+
+def interval_width(proportions: dict) -> float:
+    return max(p["high"] - p["low"] for p in proportions.values())
@@ -0,0 +1,482 @@
+# app/services/search.py
+
+import asyncio
+import bisect
+import itertools
+import math
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from operator import itemgetter
+
+from app.core.config import settings
+from app.services.analysis_store import (
+    analyses_collection, posts_collection, analysis_comments, comments_at, post_aggregates,
+)
+from app.services.pagination import InvalidCursor, decode_position, encode_position
+from app.services.search_index import Corpus, SearchIndex, Segment, SENTIMENTS, epoch_seconds, query_terms
+from app.services.singleflight import SingleFlight
+
+# Segments are shared by all users who analyzed a post; a user's search scores only their own posts
+index = SearchIndex(settings.search_index_dir, settings.search_cache_max_units)
+_builds = SingleFlight()
+# Segments loaded or built at once for one search (a cold start can touch every post of a user)
+_loading = asyncio.Semaphore(8)
+# Background indexing tasks, referenced until done so they are not garbage collected
+_warming: set[asyncio.Task] = set()
+# Per-user indexes, most recently searched last; each is loaded once and then kept current
+_user_indexes: OrderedDict[str, "UserIndex"] = OrderedDict()
+_user_loads = SingleFlight()
+_revisions = itertools.count()
+# Filtered and sorted matches of recent searches with their facets, so following pages are cut
+# from them instead of rescoring; keyed by everything that determines them, including the user
+# index revision, and bounded by the matches they hold
+_result_sets: OrderedDict[tuple, tuple] = OrderedDict()
+_result_set_sizes = {"entries": 0}
+
+USER_POST_PROJECTION = {
+    "post": 1, "platform": 1, "mode": 1, "url": 1, "created_at": 1, "comment_count": 1, "sentiment": 1,
+    "analysis_id": 1,
+}
+ANALYSIS_VERSION_PROJECTION = {"post": 1, "comment_count": 1, "analyzed_at": 1, "refreshed_at": 1, "generation": 1}
+
+# Time facet windows, matching the search endpoint's time filter values
+TIME_FACETS = {"1d": 1, "7d": 7, "30d": 30}
+
+
+def analysis_version(analysis: dict) -> str:
+    # Changes whenever comments are (re)stored: a new run publishes a new generation and sets
+    # analyzed_at, a refresh sets refreshed_at
+    return (f"{analysis.get('generation')}:{analysis.get('comment_count')}:{analysis.get('analyzed_at')}:"
+            f"{analysis.get('refreshed_at')}")
+
+
+def segment_key(post: dict) -> str:
+    # Legacy posts embed their own comments and are indexed on their own
+    return f"a{post['analysis_id']}" if "analysis_id" in post else f"p{post['_id']}"
+
+
+def dominant_sentiment(post: dict) -> str | None:
+    counts = post.get("sentiment") or {}
+    if not any(counts.get(label) for label in SENTIMENTS):
+        return None
+    return max(SENTIMENTS, key=lambda label: counts.get(label, 0))
+
+
+def post_time(post: dict) -> float:
+    """When the post was published (epoch seconds), falling back to when it was analyzed."""
+    published = epoch_seconds(post.get("post", {}).get("timestamp"))
+    if published == published:  # not NaN
+        return published
+    return epoch_seconds(post.get("created_at"))
+
+
+async def _segment(key: str, version: str, load) -> Segment:
+    loop = asyncio.get_running_loop()
+    async with _loading:
+        segment = await loop.run_in_executor(None, index.get, key, version)
+        if segment is not None:
+            return segment
+
+        async def build():
+            post, comments = await load()
+            return await loop.run_in_executor(None, index.put, key, version, post, comments)
+
+        return await _builds.do(f"{key}:{version}", build)
+
+
+def _analysis_loader(analysis_id):
+    async def load():
+        # Analyses not yet migrated to comment buckets still embed their comments
+        analysis = await analyses_collection.find_one({"_id": analysis_id}, {"post": 1, "comments": 1, "generation": 1}) or {}
+        return analysis.get("post", {}), await analysis_comments(analysis)
+    return load
+
+
+def _legacy_loader(post_id):
+    async def load():
+        post = await posts_collection.find_one({"_id": post_id}, {"post": 1, "comments": 1}) or {}
+        return post.get("post", {}), post.get("comments", [])
+    return load
+
+
+def _listing(post: dict, analysis: dict | None = None) -> dict:
+    """The fields of a user post that search filters, ranks and lists by."""
+    listing = {field: post[field] for field in ("_id", *USER_POST_PROJECTION) if field in post}
+    if analysis is not None:
+        # The generation the segment indexes, to read matched comments back from the same one
+        listing["generation"] = analysis.get("generation")
+    return listing
+
+
+class UserIndex:
+    """One user's searchable posts: their listing fields and a Corpus of their segments.
+
+    Loaded on the user's first search and then kept current in process: analyses that are stored
+    or refreshed replace their segment (warm), and linked or deleted posts are added or removed
+    (index_user_post, unindex_user_post). It is reloaded after `search_user_index_ttl_seconds` to
+    pick up changes made by other processes. Scoring runs in executor threads while updates come
+    from background tasks, so both hold `lock`.
+    """
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.posts: dict[str, dict] = {}  # segment key -> listing fields
+        self.corpus = Corpus()
+        self.lock = threading.Lock()
+        self.loaded_at = time.monotonic()
+        self.revision = next(_revisions)  # changes with every update
+
+    def load(self, entries: list[tuple[dict, Segment]]):
+        with self.lock:
+            for post, segment in entries:
+                self.posts[segment.key] = post
+                self.corpus.add(segment)
+            self.revision = next(_revisions)
+
+    def put(self, post: dict, segment: Segment):
+        self.load([(post, segment)])
+
+    def remove(self, key: str):
+        with self.lock:
+            self.posts.pop(key, None)
+            self.corpus.remove(key)
+            self.revision = next(_revisions)
+
+    def post_matches(self, terms: list[str]) -> list[tuple[dict, float | None]]:
+        """Every post with its BM25 score for `terms`; all posts, unscored, without terms."""
+        with self.lock:
+            if not terms:
+                return [(post, None) for post in self.posts.values()]
+            scores = self.corpus.score_posts(terms)
+            return [(self.posts[key], score) for key, score in scores.items()]
+
+    def comment_matches(self, terms: list[str], platform: str | None) -> tuple[dict, dict, dict]:
+        """Comment scores keyed by (segment key, unit), with the posts and segments they belong to."""
+        with self.lock:
+            within = None if not platform else {key for key, post in self.posts.items() if post.get("platform") == platform}
+            scores = self.corpus.score_comments(terms, within)
+            keys = {key for key, _ in scores}
+            return scores, {key: self.posts[key] for key in keys}, {key: self.corpus.segments[key] for key in keys}
+
+
+async def _load_user_index(user_id: str, previous: UserIndex | None) -> UserIndex:
+    """Read the user's posts and analysis versions, reusing segments of `previous` that are current."""
+    posts = await posts_collection.find({"user_id": user_id}, USER_POST_PROJECTION).to_list(length=None)
+    ids = list({p["analysis_id"] for p in posts if "analysis_id" in p})
+    analyses = {a["_id"]: a async for a in analyses_collection.find({"_id": {"$in": ids}}, ANALYSIS_VERSION_PROJECTION)}
+
+    sources, seen = [], set()
+    for post in posts:
+        key = segment_key(post)
+        if key in seen:
+            continue
+        seen.add(key)
+        if "analysis_id" in post:
+            analysis = analyses.get(post["analysis_id"])
+            if analysis is None:
+                continue
+            sources.append((_listing(post, analysis), key, analysis_version(analysis), _analysis_loader(analysis["_id"])))
+        else:
+            sources.append((_listing(post), key, f"legacy:{post.get('comment_count')}", _legacy_loader(post["_id"])))
+
+    known = previous.corpus.segments if previous is not None else {}
+
+    async def segment(key: str, version: str, load) -> Segment:
+        current = known.get(key)
+        if current is not None and current.version == version:
+            return current
+        return await _segment(key, version, load)
+
+    segments = await asyncio.gather(*(segment(key, version, load) for _, key, version, load in sources))
+    user_index = UserIndex(user_id)
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, user_index.load, [(post, s) for (post, *_), s in zip(sources, segments)])
+
+    _user_indexes[user_id] = user_index
+    _user_indexes.move_to_end(user_id)
+    while len(_user_indexes) > settings.search_max_user_indexes:
+        _user_indexes.popitem(last=False)
+    return user_index
+
+
+async def user_index(user_id: str) -> UserIndex:
+    """The user's index, loading it on first use (or once it is older than the reload interval)."""
+    current = _user_indexes.get(user_id)
+    if current is not None and time.monotonic() - current.loaded_at < settings.search_user_index_ttl_seconds:
+        _user_indexes.move_to_end(user_id)
+        return current
+    return await _user_loads.do(user_id, lambda: _load_user_index(user_id, current))
+
+
+def _in_background(name: str, work):
+    async def run():
+        try:
+            await work()
+        except Exception as e:
+            print(f"Search indexing failed for {name}: {e}")
+
+    task = asyncio.get_running_loop().create_task(run())
+    _warming.add(task)
+    task.add_done_callback(_warming.discard)
+
+
+def warm(analysis: dict | None):
+    """Index a freshly stored analysis in the background and swap it into loaded user indexes."""
+    if not analysis or "_id" not in analysis:
+        return
+    key = f"a{analysis['_id']}"
+
+    async def work():
+        segment = await _segment(key, analysis_version(analysis), _analysis_loader(analysis["_id"]))
+        loop = asyncio.get_running_loop()
+        for user_index in list(_user_indexes.values()):
+            post = user_index.posts.get(key)
+            if post is not None:
+                # References carry copies of the aggregates, updated along with the analysis
+                updated = {**post, **post_aggregates(analysis), "post": analysis.get("post", post.get("post"))}
+                updated["generation"] = analysis.get("generation")
+                await loop.run_in_executor(None, user_index.put, updated, segment)
+
+    _in_background(f"analysis {analysis['_id']}", work)
+
+
+def index_user_post(user_id: str, reference: dict, analysis: dict):
+    """Add a post the user just linked to their loaded index, if they have one."""
+    if user_id not in _user_indexes or "analysis_id" not in reference:
+        return
+
+    async def work():
+        segment = await _segment(
+            segment_key(reference), analysis_version(analysis), _analysis_loader(reference["analysis_id"])
+        )
+        user_index = _user_indexes.get(user_id)
+        if user_index is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, user_index.put, _listing(reference, analysis), segment
+            )
+
+    _in_background(f"post {reference.get('_id')}", work)
+
+
+def unindex_user_post(user_id: str, post: dict):
+    """Drop a deleted post from the user's loaded index, if they have one."""
+    user_index = _user_indexes.get(user_id)
+    if user_index is None:
+        return
+
+    async def work():
+        await asyncio.get_running_loop().run_in_executor(None, user_index.remove, segment_key(post))
+
+    _in_background(f"post {post.get('_id')}", work)
+
+
+def _facet_counts(matches: list[dict], platform: str | None, since_seconds: float | None,
+                  sentiments: list[str] | None) -> dict:
+    """Counts per platform, sentiment and time window among `matches`.
+
+    Each facet is counted with the other facets' filters applied but not its own, so every chip
+    shows how many results selecting it (instead of the current value) would give.
+    """
+    now = epoch_seconds(datetime.utcnow())
+    facets = {"platform": {}, "sentiment": {}, "time": dict.fromkeys([*TIME_FACETS, "any"], 0)}
+    for post in matches:
+        published = post_time(post)
+        sentiment = dominant_sentiment(post) or "none"
+        platform_ok = not platform or post.get("platform") == platform
+        time_ok = since_seconds is None or published >= since_seconds
+        sentiment_ok = not sentiments or sentiment in sentiments
+        if time_ok and sentiment_ok:
+            facets["platform"][post.get("platform", "")] = facets["platform"].get(post.get("platform", ""), 0) + 1
+        if platform_ok and time_ok:
+            facets["sentiment"][sentiment] = facets["sentiment"].get(sentiment, 0) + 1
+        if platform_ok and sentiment_ok:
+            facets["time"]["any"] += 1
+            for window, days in TIME_FACETS.items():
+                facets["time"][window] += published >= now - days * 86400
+    return facets
+
+
+async def _result_set(key: tuple, compute) -> tuple:
+    """The cached result set for `key`, computed in an executor thread on a miss.
+
+    `compute` returns (entries, ...) with entries sorted ascending by their first item.
+    """
+    found = _result_sets.get(key)
+    if found is not None:
+        _result_sets.move_to_end(key)
+        return found
+    found = await asyncio.get_running_loop().run_in_executor(None, compute)
+    _result_sets[key] = found
+    _result_set_sizes["entries"] += len(found[0])
+    while _result_set_sizes["entries"] > settings.search_result_cache_max_entries and len(_result_sets) > 1:
+        _, evicted = _result_sets.popitem(last=False)
+        _result_set_sizes["entries"] -= len(evicted[0])
+    return found
+
+
+def _page(entries: list, after: tuple | None, limit: int) -> tuple[list, bool]:
+    """Up to `limit` entries below `after` (all, without one), best first, and whether more follow."""
+    end = len(entries)
+    if after is not None:
+        try:
+            end = bisect.bisect_left(entries, after, key=itemgetter(0))
+        except TypeError:
+            raise InvalidCursor("Invalid cursor")
+    return entries[max(0, end - limit):end][::-1], end > limit
+
+
+def _cursor_since(position: dict, since: datetime | None) -> float | None:
+    # Later pages keep the first page's time window, so they page through the same result set
+    if since is None:
+        return None
+    pinned = position.get("since")
+    if not isinstance(pinned, (int, float)):
+        raise InvalidCursor("Cursor does not belong to this search")
+    return pinned
+
+
+async def search_posts(user_id: str, query: str | None, platform: str | None = None, since: datetime | None = None,
+                       sentiments: list[str] | None = None, limit: int = 20, cursor: str | None = None) -> dict:
+    """One page of the user's posts matching `query`, with facet counts over all matches.
+
+    Results are ranked by BM25 relevance, or newest first without a query, and paged with opaque
+    cursors on (sort key, _id). Matches are scored, filtered, sorted and counted into facets once
+    per search; following pages are cut from that cached result set. Returns {"results":
+    [(post, score)], "nextCursor", "total", "facets"}; the score is None when there is no query.
+    """
+    terms = query_terms(query or "")
+    order = "relevance" if terms else "newest"
+    since_seconds = epoch_seconds(since) if since else None
+    after = None
+    if cursor:
+        position = decode_position(cursor)
+        if position.get("by") != order or not isinstance(position.get("id"), str):
+            raise InvalidCursor("Cursor does not belong to this search")
+        after = (position.get("key"), position["id"])
+        since_seconds = _cursor_since(position, since)
+
+    user = await user_index(user_id)
+    sentiments = sorted(set(sentiments)) if sentiments else None
+
+    def accept(post: dict) -> bool:
+        if platform and post.get("platform") != platform:
+            return False
+        if since_seconds is not None and not post_time(post) >= since_seconds:
+            return False
+        return not sentiments or (dominant_sentiment(post) or "none") in sentiments
+
+    def sort_key(post: dict, score: float | None) -> tuple:
+        if score is None:
+            created_at = post.get("created_at")
+            return (epoch_seconds(created_at) if created_at else -math.inf, str(post["_id"]))
+        return (score, str(post["_id"]))
+
+    def compute() -> tuple:
+        matches = user.post_matches(terms)
+        facets = _facet_counts([post for post, _ in matches], platform, since_seconds, sentiments)
+        entries = sorted(((sort_key(post, score), post, score) for post, score in matches if accept(post)),
+                         key=itemgetter(0))
+        return entries, facets
+
+    key = ("posts", user_id, user.revision, tuple(terms), platform or None, since_seconds, tuple(sentiments or ()))
+    entries, facets = await _result_set(key, compute)
+    page, more = _page(entries, after, limit)
+
+    next_cursor = None
+    if more:
+        sort_position, post_id = page[-1][0]
+        next_cursor = encode_position({"by": order, "key": sort_position, "id": post_id, "since": since_seconds})
+    return {
+        "results": [(post, score) for _, post, score in page],
+        "nextCursor": next_cursor,
+        "total": len(entries),
+        "facets": facets,
+    }
+
+
+async def _comment_documents(hits: list[tuple[dict, int]]) -> dict[tuple, dict]:
+    """The stored comment for each (post, unit) hit, read from as few buckets as possible."""
+    positions: dict = {}
+    for post, unit in hits:
+        positions.setdefault(segment_key(post), (post, []))[1].append(unit - 1)
+
+    async def fetch(post: dict, wanted: list[int]) -> dict[int, dict]:
+        if "analysis_id" in post:
+            return await comments_at(post["analysis_id"], post.get("generation"), wanted)
+        legacy = await posts_collection.find_one({"_id": post["_id"]}, {"comments": 1}) or {}
+        comments = legacy.get("comments", [])
+        return {p: comments[p] for p in wanted if p < len(comments)}
+
+    keys = list(positions)
+    fetched = await asyncio.gather(*(fetch(*positions[key]) for key in keys))
+    return {(key, position + 1): comment for key, found in zip(keys, fetched) for position, comment in found.items()}
+
+
+async def search_comments(user_id: str, query: str, platform: str | None = None, since: datetime | None = None,
+                          sentiments: list[str] | None = None, author: str | None = None, order: str = "relevance",
+                          limit: int = 20, cursor: str | None = None) -> dict:
+    """One page of the comments across the user's posts that match `query`, after filters.
+
+    Ordered by BM25 relevance or newest first, and paged with opaque cursors on (sort key,
+    post, position); like search_posts, following pages are cut from a cached result set. Returns {"results": [(post, position, comment, score)], "nextCursor", "total"},
+    where position is the comment's index among its analysis' stored comments.
+    """
+    terms = query_terms(query)
+    if not terms:
+        raise ValueError("The query has no searchable words")
+    since_seconds = epoch_seconds(since) if since else None
+    after = None
+    if cursor:
+        position = decode_position(cursor)
+        if position.get("by") != order or not isinstance(position.get("seg"), str):
+            raise InvalidCursor("Cursor does not belong to this search")
+        after = (position.get("key"), position["seg"], position.get("unit"))
+        since_seconds = _cursor_since(position, since)
+
+    user = await user_index(user_id)
+    sentiment_codes = {SENTIMENTS.index(label) for label in sentiments or () if label in SENTIMENTS}
+    author = author.lower() if author else None
+
+    def compute() -> tuple:
+        scores, posts, segments = user.comment_matches(terms, platform)
+
+        def accept(key: str, unit: int) -> bool:
+            segment = segments[key]
+            if sentiments and segment.sentiments[unit] not in sentiment_codes:
+                return False
+            if since_seconds is not None and not segment.timestamps[unit] >= since_seconds:
+                return False
+            return author is None or segment.authors[unit].lower() == author
+
+        def sort_key(key: str, unit: int, score: float) -> tuple:
+            if order == "newest":
+                published = segments[key].timestamps[unit]
+                return (published if published == published else -math.inf, key, unit)
+            return (score, key, unit)
+
+        entries = sorted((sort_key(key, unit, score), score) for (key, unit), score in scores.items() if accept(key, unit))
+        return entries, posts
+
+    key = ("comments", user_id, user.revision, tuple(terms), platform or None, since_seconds,
+           tuple(sorted(sentiment_codes)) if sentiments else None, author, order)
+    entries, posts = await _result_set(key, compute)
+    page, more = _page(entries, after, limit)
+
+    next_cursor = None
+    if more:
+        sort_position, seg, unit = page[-1][0]
+        next_cursor = encode_position(
+            {"by": order, "key": sort_position, "seg": seg, "unit": unit, "since": since_seconds}
+        )
+
+    comments = await _comment_documents([(posts[key], unit) for (_, key, unit), _ in page])
+    return {
+        "results": [
+            (posts[key], unit - 1, comments[(key, unit)], score)
+            for (_, key, unit), score in page if (key, unit) in comments
+        ],
+        "nextCursor": next_cursor,
+        "total": len(entries),
+    }
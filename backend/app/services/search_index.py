@@ -0,0 +1,395 @@
+# app/services/search_index.py
+"""In-process BM25 full-text index over analyzed posts and their comments.
+
+The index is split into one segment per analysis: unit 0 is the post body, unit i >= 1 the i-th
+stored comment (the same position `comment_buckets` uses). Segments are immutable, rebuilt when
+their analysis changes (the caller passes a version string) and persisted to disk, so they are
+shared by every user who analyzed the post. A search only ever scores the segments of the
+posts the user owns, gathered in a Corpus that keeps their statistics (document counts, average
+lengths) as running totals and knows which segments contain each term.
+
+    python -m app.services.search_index --posts 500 --comments 200 --queries 200
+
+builds a synthetic corpus in a temporary directory and reports the cold load time (segments read
+from disk into a user's Corpus) and search latency percentiles once it is loaded.
+"""
+
+import heapq
+import math
+import os
+import pickle
+import re
+import tempfile
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+
+from app.services.timestamps import parse_timestamp
+
+# Okapi BM25 parameters
+K1 = 1.2
+B = 0.75
+# Post ranking adds the post body's own BM25 score, weighted by this, to the whole thread's
+POST_BODY_BOOST = 2.0
+
+# Bumped whenever the on-disk segment layout changes; older files are rebuilt
+INDEX_FORMAT = 2
+
+SENTIMENTS = ("positive", "neutral", "negative")
+_SENTIMENT_CODES = {label: i for i, label in enumerate(SENTIMENTS)}
+_EPOCH = datetime(1970, 1, 1)
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i if in into is it its me my no not of on or our "
+    "so that the their them then there these they this to was we were what when which who will with "
+    "you your".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN_RE.findall((text or "").lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def query_terms(query: str) -> list[str]:
+    # Each distinct term counts once; repeating a word in the query does not weight it
+    return list(dict.fromkeys(tokenize(query)))
+
+
+def epoch_seconds(value) -> float:
+    """A fetcher timestamp as seconds since the epoch, or NaN when it is missing or unparseable."""
+    parsed = value if isinstance(value, datetime) else parse_timestamp(value)
+    return (parsed - _EPOCH).total_seconds() if parsed else math.nan
+
+
+def idf(n_docs: int, df: int) -> float:
+    return math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+
+
+def bm25(tf: int, length: int, avg_length: float) -> float:
+    return tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / (avg_length or 1)))
+
+
+class Segment:
+    """The postings and per-unit metadata of one analysis.
+
+    Postings are packed into flat arrays (each term's units and frequencies at
+    units[starts[i]:starts[i + 1]] for term ordinal i), so a segment loads from disk in a few
+    large reads instead of one object per term.
+    """
+
+    __slots__ = ("key", "version", "terms", "starts", "units", "tfs", "lengths", "sentiments", "timestamps",
+                 "authors", "thread_tf", "thread_length")
+
+    def __init__(self, key: str, version: str):
+        self.key = key
+        self.version = version
+        self.terms: dict[str, int] = {}  # term -> ordinal
+        self.starts = array("I", [0])
+        self.units = array("I")
+        self.tfs = array("I")
+        self.lengths = array("I")
+        self.sentiments = array("b")  # index into SENTIMENTS, -1 when unlabeled
+        self.timestamps = array("d")  # epoch seconds, NaN when unknown
+        self.authors: list[str] = []
+        self.thread_tf: dict[str, int] = {}  # term frequencies over the post and all comments
+        self.thread_length = 0
+
+    @classmethod
+    def build(cls, key: str, version: str, post: dict, comments: list) -> "Segment":
+        segment = cls(key, version)
+        postings: dict[str, tuple[list, list]] = {}
+        units = [(post.get("text", ""), None, post.get("timestamp"), post.get("author", ""))]
+        units += [(c.get("text", ""), c.get("sentiment"), c.get("timestamp"), c.get("author", "")) for c in comments]
+        for unit, (text, sentiment, timestamp, author) in enumerate(units):
+            counts: dict[str, int] = {}
+            tokens = tokenize(text)
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for term, tf in counts.items():
+                entry = postings.get(term)
+                if entry is None:
+                    entry = postings[term] = ([], [])
+                entry[0].append(unit)
+                entry[1].append(tf)
+                segment.thread_tf[term] = segment.thread_tf.get(term, 0) + tf
+            segment.lengths.append(len(tokens))
+            segment.sentiments.append(_SENTIMENT_CODES.get(sentiment, -1))
+            segment.timestamps.append(epoch_seconds(timestamp))
+            segment.authors.append(author or "")
+        for ordinal, (term, (term_units, term_tfs)) in enumerate(postings.items()):
+            segment.terms[term] = ordinal
+            segment.units.extend(term_units)
+            segment.tfs.extend(term_tfs)
+            segment.starts.append(len(segment.units))
+        segment.thread_length = sum(segment.lengths)
+        return segment
+
+    def postings(self, term: str) -> tuple[array, array] | None:
+        """The units containing `term` in ascending order, and its frequency in each."""
+        ordinal = self.terms.get(term)
+        if ordinal is None:
+            return None
+        start, end = self.starts[ordinal], self.starts[ordinal + 1]
+        return self.units[start:end], self.tfs[start:end]
+
+    @property
+    def comment_count(self) -> int:
+        return len(self.lengths) - 1
+
+    @property
+    def comment_length(self) -> int:
+        return self.thread_length - self.lengths[0]
+
+    def body_tf(self, term: str) -> int:
+        ordinal = self.terms.get(term)
+        if ordinal is None:
+            return 0
+        start = self.starts[ordinal]
+        return self.tfs[start] if self.units[start] == 0 else 0
+
+    def comment_df(self, term: str) -> int:
+        ordinal = self.terms.get(term)
+        if ordinal is None:
+            return 0
+        start = self.starts[ordinal]
+        return self.starts[ordinal + 1] - start - (self.units[start] == 0)
+
+    def __getstate__(self):
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    def __setstate__(self, state):
+        for slot, value in state.items():
+            setattr(self, slot, value)
+
+
+class SearchIndex:
+    """Segments on disk under `directory`, with the most recently used ones kept in memory.
+
+    The memory cache is bounded by the total number of indexed units (posts plus comments).
+    Methods block on disk I/O and CPU; async callers run them in an executor.
+    """
+
+    def __init__(self, directory: str, max_cached_units: int):
+        self.directory = directory
+        self.max_cached_units = max_cached_units
+        self._cache: OrderedDict[str, Segment] = OrderedDict()
+        self._cached_units = 0
+        self._lock = Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.seg")
+
+    def _remember(self, segment: Segment):
+        with self._lock:
+            previous = self._cache.pop(segment.key, None)
+            if previous is not None:
+                self._cached_units -= len(previous.lengths)
+            self._cache[segment.key] = segment
+            self._cached_units += len(segment.lengths)
+            while self._cached_units > self.max_cached_units and len(self._cache) > 1:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_units -= len(evicted.lengths)
+
+    def get(self, key: str, version: str) -> Segment | None:
+        """The segment for `key` if one at `version` is cached or on disk."""
+        with self._lock:
+            segment = self._cache.get(key)
+            if segment is not None and segment.version == version:
+                self._cache.move_to_end(key)
+                return segment
+        try:
+            with open(self._path(key), "rb") as f:
+                index_format, segment = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError, TypeError, AttributeError):
+            return None
+        if index_format != INDEX_FORMAT or segment.version != version:
+            return None
+        self._remember(segment)
+        return segment
+
+    def put(self, key: str, version: str, post: dict, comments: list) -> Segment:
+        segment = Segment.build(key, version, post, comments)
+        # Written under a temporary name so a concurrent reader never sees a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump((INDEX_FORMAT, segment), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+        except OSError:
+            os.unlink(tmp)
+            raise
+        self._remember(segment)
+        return segment
+
+    def snapshot(self) -> dict:
+        return {"cachedSegments": len(self._cache), "cachedUnits": self._cached_units}
+
+
+class Corpus:
+    """A set of segments with their corpus statistics and a term -> segments directory.
+
+    Maintained incrementally as segments are added, replaced or removed, so scoring a query only
+    visits the segments containing its terms. Not thread-safe: mutate it from one thread at a time.
+    """
+
+    def __init__(self, segments=()):
+        self.segments: dict[str, Segment] = {}
+        self.term_segments: dict[str, set[str]] = {}
+        self.thread_length = 0
+        self.body_length = 0
+        self.comment_count = 0
+        self.comment_length = 0
+        for segment in segments:
+            self.add(segment)
+
+    def __len__(self) -> int:
+        return len(self.segments)
+
+    def _count(self, segment: Segment, sign: int):
+        self.thread_length += sign * segment.thread_length
+        self.body_length += sign * segment.lengths[0]
+        self.comment_count += sign * segment.comment_count
+        self.comment_length += sign * segment.comment_length
+
+    def add(self, segment: Segment):
+        self.remove(segment.key)
+        self.segments[segment.key] = segment
+        for term in segment.thread_tf:
+            self.term_segments.setdefault(term, set()).add(segment.key)
+        self._count(segment, 1)
+
+    def remove(self, key: str):
+        segment = self.segments.pop(key, None)
+        if segment is None:
+            return
+        for term in segment.thread_tf:
+            keys = self.term_segments[term]
+            keys.discard(key)
+            if not keys:
+                del self.term_segments[term]
+        self._count(segment, -1)
+
+    def _containing(self, term: str) -> list[Segment]:
+        return [self.segments[key] for key in self.term_segments.get(term, ())]
+
+    def score_posts(self, terms: list[str]) -> dict[str, float]:
+        """BM25 score of each segment's post (whole thread, plus the boosted post body) for `terms`."""
+        n = len(self.segments)
+        if not n or not terms:
+            return {}
+        avg_thread, avg_body = self.thread_length / n, self.body_length / n
+        scores: dict[str, float] = {}
+        for term in terms:
+            matching = self._containing(term)
+            if not matching:
+                continue
+            body_df = sum(s.body_tf(term) > 0 for s in matching)
+            thread_idf, body_idf = idf(n, len(matching)), idf(n, body_df)
+            for s in matching:
+                score = thread_idf * bm25(s.thread_tf[term], s.thread_length, avg_thread)
+                body_tf = s.body_tf(term)
+                if body_tf:
+                    score += POST_BODY_BOOST * body_idf * bm25(body_tf, s.lengths[0], avg_body)
+                scores[s.key] = scores.get(s.key, 0.0) + score
+        return scores
+
+    def score_comments(self, terms: list[str], within: set[str] | None = None) -> dict[tuple[str, int], float]:
+        """BM25 score of every comment matching any of `terms`, keyed by (segment key, unit).
+
+        Corpus statistics are taken over all segments; only those whose key is `within` are scored.
+        """
+        n = self.comment_count
+        if not n or not terms:
+            return {}
+        avg_length = self.comment_length / n
+        scores: dict[tuple[str, int], float] = {}
+        for term in terms:
+            matching = self._containing(term)
+            df = sum(s.comment_df(term) for s in matching)
+            if not df:
+                continue
+            term_idf = idf(n, df)
+            for s in matching:
+                if within is not None and s.key not in within:
+                    continue
+                lengths, key = s.lengths, s.key
+                for unit, tf in zip(*s.postings(term)):
+                    if unit:
+                        hit = (key, unit)
+                        scores[hit] = scores.get(hit, 0.0) + term_idf * bm25(tf, lengths[unit], avg_length)
+        return scores
+
+
+def top(scores: dict, limit: int, accept=None) -> list[tuple]:
+    """The `limit` best (score, key) pairs, ties broken by key, optionally only keys `accept`ed."""
+    items = ((score, key) for key, score in scores.items() if accept is None or accept(key))
+    return heapq.nlargest(limit, items)
+
+
+def _benchmark(n_posts: int, n_comments: int, n_queries: int, limit: int, seed: int):
+    import itertools
+    import random
+    import statistics
+    import time
+
+    rng = random.Random(seed)
+    vocabulary = [f"w{i}" for i in range(20000)]
+    # Zipf-like word frequencies, as in natural text
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+
+    def text(words):
+        return " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=words))
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = SearchIndex(directory, max_cached_units=n_posts * (n_comments + 1) + 1)
+        build, segments = 0.0, []
+        for p in range(n_posts):
+            post = {"text": text(40), "timestamp": "2024-01-01T00:00:00Z", "author": "author"}
+            comments = [
+                {"text": text(rng.randint(5, 60)), "sentiment": rng.choice(SENTIMENTS),
+                 "timestamp": "2024-01-02T00:00:00Z", "author": f"user{rng.randrange(1000)}"}
+                for _ in range(n_comments)
+            ]
+            started = time.perf_counter()
+            index.put(f"p{p}", "1", post, comments)
+            build += time.perf_counter() - started
+
+        # Cold load, as on a user's first search after a restart: every segment read back from
+        # disk into a fresh index, and the user's corpus assembled from them
+        started = time.perf_counter()
+        cold = SearchIndex(directory, max_cached_units=n_posts * (n_comments + 1) + 1)
+        corpus = Corpus(cold.get(f"p{p}", "1") for p in range(n_posts))
+        cold_load = time.perf_counter() - started
+
+        queries = [[rng.choice(vocabulary[:2000]) for _ in range(rng.randint(1, 3))] for _ in range(n_queries)]
+        timings = {"posts": [], "comments": []}
+        for terms in queries:
+            started = time.perf_counter()
+            top(corpus.score_posts(terms), limit)
+            timings["posts"].append(time.perf_counter() - started)
+            started = time.perf_counter()
+            top(corpus.score_comments(terms), limit)
+            timings["comments"].append(time.perf_counter() - started)
+
+    print(f"Indexed {n_posts} posts / {n_posts * n_comments} comments in {build:.2f}s")
+    print(f"Cold load of the corpus from disk: {cold_load * 1000:.0f} ms")
+    for kind, samples in timings.items():
+        cuts = statistics.quantiles(samples, n=100)
+        print(f"{kind:>8}: p50 {cuts[49] * 1000:.1f} ms  p95 {cuts[94] * 1000:.1f} ms  "
+              f"max {max(samples) * 1000:.1f} ms over {len(samples)} queries")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark BM25 search over a synthetic corpus")
+    parser.add_argument("--posts", type=int, default=500)
+    parser.add_argument("--comments", type=int, default=200, help="comments per post")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    _benchmark(args.posts, args.comments, args.queries, args.limit, args.seed)
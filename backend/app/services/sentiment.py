@@ -1,4 +1,5 @@
 from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
+import asyncio
 import torch
 
 # Load model once at startup
@@ -41,12 +42,84 @@ def analyze_sentiments(comments: list[str]) -> dict:
     label_map = {"LABEL_0": "negative", "LABEL_1": "neutral", "LABEL_2": "positive"}
     mapped_labels = [label_map.get(l, "neutral") for l in raw_labels]
 
-    counts = {"positive": 0, "neutral": 0, "negative": 0}
-    for label in mapped_labels:
-        counts[label] += 1
-
     return {
-        "counts": counts,
+        "counts": count_labels(mapped_labels),
         "labels": mapped_labels
     }
 
+
+def count_labels(labels: list[str]) -> dict:
+    counts = {"positive": 0, "neutral": 0, "negative": 0}
+    for label in labels:
+        counts[label] += 1
+    return counts
+
+
+class SentimentBatcher:
+    """Coalesce concurrent scoring requests into shared model batches.
+
+    Callers from different pipelines (e.g. every URL of a bulk analysis) await `score`; requests
+    that arrive within `max_wait` seconds of each other are concatenated and run through the model
+    in chunks of `max_batch` texts on a single worker, then split back per caller.
+    """
+
+    def __init__(self, max_batch: int = 64, max_wait: float = 0.02):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.pending = []
+        self.wakeup = asyncio.Event()
+        self.worker = None
+        self.stats = {"requests": 0, "model_calls": 0, "texts": 0}
+        self.backlog = 0  # texts waiting for or in the model
+
+    async def score(self, comments: list[str]) -> dict:
+        if not comments:
+            return analyze_sentiments([])
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((comments, future))
+        self.backlog += len(comments)
+        self.stats["requests"] += 1
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.ensure_future(self._run())
+        self.wakeup.set()
+        labels = await future
+        return {"counts": count_labels(labels), "labels": labels}
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.wakeup.wait()
+            # Give concurrent callers a moment to join this batch
+            await asyncio.sleep(self.max_wait)
+            self.wakeup.clear()
+            batch, self.pending = self.pending, []
+            # Callers cancelled while waiting (e.g. a client disconnect) are not scored
+            self.backlog -= sum(len(comments) for comments, future in batch if future.done())
+            batch = [(comments, future) for comments, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            texts = [text for comments, _ in batch for text in comments]
+            try:
+                labels = []
+                for start in range(0, len(texts), self.max_batch):
+                    result = await loop.run_in_executor(None, analyze_sentiments, texts[start:start + self.max_batch])
+                    labels.extend(result["labels"])
+                    self.stats["model_calls"] += 1
+                self.stats["texts"] += len(texts)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.backlog -= len(texts)
+
+            offset = 0
+            for comments, future in batch:
+                if not future.done():
+                    future.set_result(labels[offset:offset + len(comments)])
+                offset += len(comments)
+
+
+batcher = SentimentBatcher()
@@ -0,0 +1,36 @@
+# app/services/singleflight.py
+
+import asyncio
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution.
+
+    The first caller (leader) starts the work; callers arriving while it is in flight await the
+    same result. The work is shielded, so a leader that goes away does not cancel it for followers;
+    it is only cancelled once every caller waiting on it has been cancelled.
+    """
+
+    def __init__(self):
+        self._calls: dict = {}
+        self._waiters: dict = {}
+
+    def in_flight(self, key) -> bool:
+        return key in self._calls
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    # Nobody is left to read the result
+                    task.cancel()
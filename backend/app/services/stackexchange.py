@@ -3,9 +3,10 @@
 import logging
 import aiohttp
 from bs4 import BeautifulSoup
-from datetime import datetime
+from datetime import datetime, timezone
 from urllib.parse import urlparse
 import uuid
+from app.services.cache import cached_get_json
 BASE_URL = "https://api.stackexchange.com/2.3"
 logger = logging.getLogger(__name__)
 
@@ -20,50 +21,72 @@ def extract_question_id(url: str) -> str | None:
     logger.error(f"Invalid StackExchange URL: {url}")
     return None
 
+def api_site(hostname: str | None) -> str:
+    """The API `site` parameter for a Stack Exchange host.
+
+    math.stackexchange.com -> "math", meta.stackexchange.com -> "meta",
+    meta.stackoverflow.com -> "meta.stackoverflow", stackoverflow.com -> "stackoverflow".
+    """
+    host = (hostname or "stackoverflow.com").lower()
+    if host.startswith("www."):
+        host = host[len("www."):]
+    host = host.removesuffix(".com")
+    if host.endswith(".stackexchange"):
+        host = host[:-len(".stackexchange")]
+    return host
+
 async def fetch_post_metadata(session: aiohttp.ClientSession, question_id: str, site: str) -> dict | None:
     url = f"{BASE_URL}/questions/{question_id}"
     params = {"order": "desc", "sort": "activity", "site": site, "filter": "withbody"}
-    async with session.get(url, params=params) as response:
-        if response.status != 200:
-            logger.error(f"Failed to fetch post {question_id}: Status {response.status}")
-            return None
-        data = await response.json()
-        return data.get("items", [None])[0]
+    status, data = await cached_get_json(session, "stackexchange", url, params)
+    if status != 200:
+        logger.error(f"Failed to fetch post {question_id}: Status {status}")
+        return None
+    return data.get("items", [None])[0]
+
+async def iter_answers(session: aiohttp.ClientSession, question_id: str, site: str, max_pages: int = 10, since: datetime | None = None):
+    """Yield pages of answers (highest voted first) as they arrive.
 
-async def fetch_answers_flat(session: aiohttp.ClientSession, question_id: str, site: str) -> list[dict]:
+    With `since`, the API's fromdate filter returns only answers created after it, newest first.
+    """
     url = f"{BASE_URL}/questions/{question_id}/answers"
-    params = {"order": "desc", "sort": "votes", "site": site, "filter": "withbody"}
-    async with session.get(url, params=params) as response:
-        if response.status != 200:
-            logger.error(f"Failed to fetch answers for {question_id}: Status {response.status}")
-            return []
-        data = await response.json()
+    params = {"order": "desc", "sort": "votes", "site": site, "filter": "withbody", "pagesize": 100}
+    if since:
+        params.update({"sort": "creation", "fromdate": int(since.replace(tzinfo=timezone.utc).timestamp()) + 1})
+    for page_number in range(1, max_pages + 1):
+        params["page"] = page_number
+        status, data = await cached_get_json(session, "stackexchange", url, params, max_age=0 if since else None)
+        if status != 200:
+            logger.error(f"Failed to fetch answers for {question_id}: Status {status}")
+            return
         answers = []
         for item in data.get("items", []):
             text = clean_html(item.get("body", ""))
             if text:
                 answers.append({
+                    "id": str(item["answer_id"]) if item.get("answer_id") else None,
                     "author": item.get("owner", {}).get("display_name", "unknown"),
                     "text": text,
                     "created_utc": datetime.utcfromtimestamp(item.get("creation_date", 0)).isoformat()
                 })
-        return answers
+        if answers:
+            yield answers
+        if not data.get("has_more"):
+            return
 
-async def fetch_stackexchange_data(url: str) -> dict:
+async def stream_stackexchange_data(url: str, since: datetime | None = None):
+    """Yield the question first, then its answers page by page (only those newer than `since`)."""
     question_id = extract_question_id(url)
     if not question_id:
         raise ValueError("Invalid StackExchange URL")
 
-    domain = urlparse(url).netloc
-    site = domain.split(".")[0] if domain else "stackoverflow"
+    site = api_site(urlparse(url).hostname)
 
     async with aiohttp.ClientSession() as session:
         metadata = await fetch_post_metadata(session, question_id, site)
         if not metadata:
             raise ValueError("Question not found")
 
-        answers = await fetch_answers_flat(session, question_id, site)
-
         # Extract post fields
         post_id = metadata.get("question_id") or question_id
         title = metadata.get("title")
@@ -84,11 +107,7 @@ async def fetch_stackexchange_data(url: str) -> dict:
                 if refreshed_metadata.get("creation_date"):
                     timestamp = datetime.utcfromtimestamp(refreshed_metadata.get("creation_date", 0)).isoformat() or timestamp
 
-        # Assign unique IDs to comments if missing
-        for i, comment in enumerate(answers):
-            comment["id"] = comment.get("id") or f"c{i}"
-
-        return {
+        yield {
             "platform": "stackexchange",
             "post": {
                 "id": post_id or "",
@@ -97,13 +116,20 @@ async def fetch_stackexchange_data(url: str) -> dict:
                 "timestamp": timestamp or "",
                 "avatar": avatar or None  # <--- added here
             },
-            "comments": [
-                {
-                    "id": comment.get("id", "") or str(uuid.uuid4()),
-                    "author": comment.get("author", ""),
-                    "text": comment.get("text", ""),
-                    "timestamp": comment.get("created_utc", "")
-                }
-                for comment in answers
-            ]
+            "comments": []
         }
+
+        # Answers keep their Stack Exchange answer_id, stable across fetches, so answers added by a
+        # refresh never collide with stored ones
+        async for answers in iter_answers(session, question_id, site, since=since):
+            yield {
+                "comments": [
+                    {
+                        "id": comment.get("id", "") or str(uuid.uuid4()),
+                        "author": comment.get("author", ""),
+                        "text": comment.get("text", ""),
+                        "timestamp": comment.get("created_utc", "")
+                    }
+                    for comment in answers
+                ]
+            }
@@ -0,0 +1,21 @@
+# app/services/timestamps.py
+
+from datetime import datetime, timezone
+
+
+def parse_timestamp(value) -> datetime | None:
+    """Parse the comment/post timestamps the fetchers emit into naive UTC datetimes.
+
+    Fetchers use ISO 8601 strings with or without a trailing Z, or epoch seconds (Facebook posts).
+    """
+    if value is None or value == "":
+        return None
+    try:
+        if isinstance(value, (int, float)):
+            return datetime.utcfromtimestamp(value)
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except (ValueError, OverflowError, OSError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
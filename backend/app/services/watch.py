@@ -0,0 +1,143 @@
+# app/services/watch.py
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# New comments we aim to pick up per poll; the interval is sized from the observed velocity
+TARGET_COMMENTS_PER_POLL = 20
+COOL_DOWN_FACTOR = 2.0
+
+
+class WatchLimitError(Exception):
+    pass
+
+
+class Watch:
+    def __init__(self, key, target, interval: float, now: float):
+        self.key = key
+        self.target = target
+        self.subscribers: set[str] = set()
+        self.interval = interval
+        self.next_due = now + interval
+        self.last_polled = now
+        self.polls = 0
+        self.last_new_comments = 0
+        self.velocity = 0.0  # new comments per second over the last poll window
+
+    def to_dict(self) -> dict:
+        return {
+            "interval_seconds": round(self.interval, 1),
+            "polls": self.polls,
+            "last_new_comments": self.last_new_comments,
+            "comments_per_minute": round(self.velocity * 60, 2),
+        }
+
+
+class WatchScheduler:
+    """In-process scheduler that re-polls watched posts on an adaptive interval.
+
+    `refresher(target)` performs one delta refresh and returns the number of new comments; it goes
+    through the normal fetchers, so polls draw from the shared platform rate limiter. `clock` and
+    `sleep` are injectable so the schedule can be driven by a fake clock.
+    """
+
+    def __init__(self, refresher, max_watched: int, min_interval: float, max_interval: float,
+                 max_concurrent_polls: int = 4, clock=time.monotonic, sleep=asyncio.sleep):
+        self.refresher = refresher
+        self.max_watched = max_watched
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.clock = clock
+        self.sleep = sleep
+        self.watches: dict = {}
+        self.poll_slots = asyncio.Semaphore(max_concurrent_polls)
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def watch(self, key, target, subscriber: str) -> Watch:
+        watch = self.watches.get(key)
+        if watch is None:
+            if len(self.watches) >= self.max_watched:
+                raise WatchLimitError(f"This server is already watching {self.max_watched} posts")
+            watch = Watch(key, target, self.min_interval, self.clock())
+            self.watches[key] = watch
+            self._wakeup.set()
+        watch.subscribers.add(subscriber)
+        return watch
+
+    def unwatch(self, key, subscriber: str) -> bool:
+        watch = self.watches.get(key)
+        if watch is None or subscriber not in watch.subscribers:
+            return False
+        watch.subscribers.discard(subscriber)
+        if not watch.subscribers:
+            del self.watches[key]
+        return True
+
+    def next_interval(self, watch: Watch, new_comments: int, elapsed: float) -> float:
+        if new_comments <= 0:
+            # Post is cooling down: back off geometrically
+            return min(self.max_interval, watch.interval * COOL_DOWN_FACTOR)
+        velocity = new_comments / max(elapsed, 1e-6)
+        return max(self.min_interval, min(self.max_interval, TARGET_COMMENTS_PER_POLL / velocity))
+
+    async def poll(self, watch: Watch):
+        async with self.poll_slots:
+            started = self.clock()
+            try:
+                new_comments = await self.refresher(watch.target)
+            except LookupError:
+                logger.info(f"Watched post {watch.key} no longer exists; dropping watch")
+                self.watches.pop(watch.key, None)
+                return
+            except Exception as e:
+                logger.warning(f"Watch poll for {watch.key} failed: {e}")
+                new_comments = 0
+
+            now = self.clock()
+            elapsed = now - watch.last_polled
+            watch.velocity = max(new_comments, 0) / max(elapsed, 1e-6)
+            watch.interval = self.next_interval(watch, new_comments, elapsed)
+            watch.last_polled = now
+            watch.next_due = now + watch.interval
+            watch.polls += 1
+            watch.last_new_comments = new_comments
+            logger.info(f"Polled {watch.key} in {now - started:.1f}s: {new_comments} new, next in {watch.interval:.0f}s")
+
+    async def run_once(self):
+        now = self.clock()
+        due = [w for w in self.watches.values() if w.next_due <= now]
+        # Keep due watches from being picked up again while their poll is running
+        for watch in due:
+            watch.next_due = float("inf")
+        await asyncio.gather(*(self.poll(w) for w in due))
+
+    async def run(self):
+        while True:
+            await self.run_once()
+            next_due = min((w.next_due for w in self.watches.values()), default=self.clock() + self.max_interval)
+            delay = max(0.0, min(next_due - self.clock(), self.max_interval))
+            self._wakeup.clear()
+            sleeper = asyncio.ensure_future(self.sleep(delay))
+            waker = asyncio.ensure_future(self._wakeup.wait())
+            try:
+                await asyncio.wait({sleeper, waker}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                sleeper.cancel()
+                waker.cancel()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
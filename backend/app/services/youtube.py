@@ -4,11 +4,12 @@ import re
 import os
 import logging
 import aiohttp
-import asyncio
 from datetime import datetime
 from urllib.parse import urlparse, parse_qs
 import uuid
 from app.core.config import settings
+from app.services.cache import cached_get_json
+from app.services.timestamps import parse_timestamp
 
 YOUTUBE_API_KEY = settings.youtube_api_key
 BASE_URL = "https://www.googleapis.com/youtube/v3"
@@ -17,7 +18,8 @@ logger = logging.getLogger(__name__)
 
 def extract_video_id(url: str) -> str | None:
     patterns = [
-        r"(?:https?:\/\/)?(?:www\.)?youtube\.com\/watch\?v=([\w-]+)",
+        r"(?:https?:\/\/)?(?:www\.|m\.)?youtube\.com\/watch\?(?:[^#]*&)?v=([\w-]+)",
+        r"(?:https?:\/\/)?(?:www\.|m\.)?youtube\.com\/(?:shorts|embed|live)\/([\w-]+)",
         r"(?:https?:\/\/)?(?:www\.)?youtu\.be\/([\w-]+)"
     ]
     for pattern in patterns:
@@ -29,16 +31,22 @@ def extract_video_id(url: str) -> str | None:
 async def fetch_video_details(session: aiohttp.ClientSession, video_id: str) -> dict | None:
     url = f"{BASE_URL}/videos"
     params = {"part": "snippet", "id": video_id, "key": YOUTUBE_API_KEY}
-    async with session.get(url, params=params) as resp:
-        data = await resp.json()
-        items = data.get("items", [])
-        if not items:
-            return None
-        return items[0]["snippet"]
+    _, data = await cached_get_json(session, "youtube", url, params)
+    items = data.get("items", [])
+    if not items:
+        return None
+    return items[0]["snippet"]
+
+async def iter_video_comments(session: aiohttp.ClientSession, video_id: str, max_comments: int = 200, since: datetime | None = None):
+    """Yield pages of top-level comments as they arrive.
 
-async def fetch_video_comments(session: aiohttp.ClientSession, video_id: str, max_comments: int = 200) -> list[dict]:
+    A first fetch takes the `max_comments` most relevant threads. With `since`, threads are
+    requested newest first and paging continues, uncapped, until the first comment not newer than
+    it: a refresh moves the high-water mark to the newest comment, so any newer one left unfetched
+    would never be picked up.
+    """
     url = f"{BASE_URL}/commentThreads"
-    comments = []
+    fetched = 0
     params = {
         "part": "snippet",
         "videoId": video_id,
@@ -46,24 +54,31 @@ async def fetch_video_comments(session: aiohttp.ClientSession, video_id: str, ma
         "maxResults": 100,
         "key": YOUTUBE_API_KEY,
     }
+    if since:
+        params["order"] = "time"
+        max_comments = None
 
-    while len(comments) < max_comments:
-        async with session.get(url, params=params) as resp:
-            data = await resp.json()
-            for item in data.get("items", []):
-                snippet = item["snippet"]["topLevelComment"]["snippet"]
-                comments.append({
-                    "author": snippet.get("authorDisplayName", "unknown"),
-                    "text": snippet.get("textDisplay", ""),
-                    "created_utc": snippet.get("publishedAt", "")
-                })
-                if len(comments) >= max_comments:
-                    break
-            if "nextPageToken" not in data:
+    while max_comments is None or fetched < max_comments:
+        _, data = await cached_get_json(session, "youtube", url, params, max_age=0 if since else None)
+        page = []
+        reached_since = False
+        items = data.get("items", [])
+        for item in items if max_comments is None else items[:max_comments - fetched]:
+            snippet = item["snippet"]["topLevelComment"]["snippet"]
+            if since and (parse_timestamp(snippet.get("publishedAt")) or since) <= since:
+                reached_since = True
                 break
-            params["pageToken"] = data["nextPageToken"]
-            await asyncio.sleep(0.1)
-    return comments
+            page.append({
+                "author": snippet.get("authorDisplayName", "unknown"),
+                "text": snippet.get("textDisplay", ""),
+                "created_utc": snippet.get("publishedAt", "")
+            })
+        fetched += len(page)
+        if page:
+            yield page
+        if reached_since or "nextPageToken" not in data:
+            break
+        params["pageToken"] = data["nextPageToken"]
 
 async def fetch_channel_avatar(session: aiohttp.ClientSession, channel_id: str) -> str | None:
     url = f"{BASE_URL}/channels"
@@ -72,19 +87,19 @@ async def fetch_channel_avatar(session: aiohttp.ClientSession, channel_id: str)
         "id": channel_id,
         "key": YOUTUBE_API_KEY,
     }
-    async with session.get(url, params=params) as resp:
-        data = await resp.json()
-        items = data.get("items", [])
-        if not items:
-            return None
-        thumbnails = items[0]["snippet"]["thumbnails"]
-        # Pick highest resolution thumbnail available, fallback order
-        for res in ["maxres", "high", "medium", "default"]:
-            if res in thumbnails:
-                return thumbnails[res]["url"]
+    _, data = await cached_get_json(session, "youtube", url, params)
+    items = data.get("items", [])
+    if not items:
         return None
+    thumbnails = items[0]["snippet"]["thumbnails"]
+    # Pick highest resolution thumbnail available, fallback order
+    for res in ["maxres", "high", "medium", "default"]:
+        if res in thumbnails:
+            return thumbnails[res]["url"]
+    return None
 
-async def fetch_youtube_data(url: str) -> dict:
+async def stream_youtube_data(url: str, since: datetime | None = None):
+    """Yield the post first, then its comments page by page (only those newer than `since`)."""
     video_id = extract_video_id(url)
     if not video_id:
         raise ValueError("Invalid YouTube URL")
@@ -99,8 +114,6 @@ async def fetch_youtube_data(url: str) -> dict:
         if channel_id:
             avatar_url = await fetch_channel_avatar(session, channel_id)
 
-        comments = await fetch_video_comments(session, video_id)
-
         post = {
             "id": video_id,
             "author": snippet.get("channelTitle", "unknown"),
@@ -108,17 +121,17 @@ async def fetch_youtube_data(url: str) -> dict:
             "timestamp": snippet.get("publishedAt", "1970-01-01T00:00:00Z"),
             "avatar": avatar_url
         }
-        formatted_comments = [
-            {
-                "id": str(uuid.uuid4()),  # generate a unique id for each comment
-                "author": c.get("author", "unknown"),
-                "text": c.get("text", ""),
-                "timestamp": c.get("created_utc", "")
+        yield {"platform": "youtube", "post": post, "comments": []}
+
+        async for page in iter_video_comments(session, video_id, since=since):
+            yield {
+                "comments": [
+                    {
+                        "id": str(uuid.uuid4()),  # generate a unique id for each comment
+                        "author": c.get("author", "unknown"),
+                        "text": c.get("text", ""),
+                        "timestamp": c.get("created_utc", "")
+                    }
+                    for c in page
+                ]
             }
-            for c in comments
-        ]
-        return {
-            "platform": "youtube",
-            "post": post,
-            "comments": formatted_comments
-        }
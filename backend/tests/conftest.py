@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# Settings require platform credentials; tests never call the platforms
+os.environ.setdefault("REDDIT_CLIENT_ID", "test")
+os.environ.setdefault("REDDIT_CLIENT_SECRET", "test")
+os.environ.setdefault("YOUTUBE_API_KEY", "test")
+os.environ.setdefault("SEARCH_INDEX_DIR", tempfile.mkdtemp(prefix="search-index-"))
+os.environ.setdefault("RESPONSE_CACHE_DIR", tempfile.mkdtemp(prefix="response-cache-"))
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from app.services.admission import AdmissionController, AdmissionRejected
+
+
+def controller(**overrides):
+    limits = {"max_in_flight": 1, "max_queue": 1, "max_per_user": 2, "max_wait": 1.0, "max_inference_backlog": 100}
+    return AdmissionController(**{**limits, **overrides})
+
+
+def test_speculative_work_needs_an_idle_slot():
+    admission = controller()
+
+    async def run():
+        admission.check_speculative()  # idle: allowed
+        async with admission.admit("a"):
+            with pytest.raises(AdmissionRejected) as rejected:
+                admission.check_speculative()
+            assert rejected.value.status_code == 503
+        admission.check_speculative()
+
+    asyncio.run(run())
+    assert admission.stats["shed_speculative"] == 1
+
+
+def test_speculative_work_is_shed_under_inference_backlog():
+    admission = controller(inference_backlog=lambda: 101)
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.check_speculative()
+    assert rejected.value.status_code == 503
+
+
+def test_per_user_limit_rejects_with_429():
+    admission = controller(max_in_flight=4, max_per_user=1)
+
+    async def run():
+        async with admission.admit("a"):
+            with pytest.raises(AdmissionRejected) as rejected:
+                async with admission.admit("a"):
+                    pass
+            assert rejected.value.status_code == 429
+            async with admission.admit("b"):
+                pass
+
+    asyncio.run(run())
@@ -0,0 +1,154 @@
+"""Async routes must reach Mongo only through Motor, which runs pymongo in executor threads.
+
+A synchronous pymongo call made on the event loop thread blocks every other request while it
+waits on the network; these tests fail if any route (or app module) does that.
+"""
+
+import ast
+import asyncio
+import pathlib
+import re
+import sys
+import threading
+import types
+
+import pytest
+from bson import ObjectId
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+from pymongo.synchronous.topology import Topology
+
+from app.auth import get_current_user, verify_token
+
+APP_DIR = pathlib.Path(__file__).resolve().parents[1] / "app"
+
+
+# Routes that serve in-process state only
+NO_MONGO = ["GET /api/stats"]
+
+
+class NoDatabase(Exception):
+    pass
+
+
+@pytest.fixture
+def mongo_calls(monkeypatch):
+    """Record whether each pymongo operation runs on an event loop; none touches the network.
+
+    Every operation selects a server first, so that is where they are intercepted: Motor binds the
+    Collection methods it wraps when its classes are built, which patching those would miss.
+    """
+    calls = []
+
+    def select_servers(self, *args, **kwargs):
+        try:
+            asyncio.get_running_loop()
+            on_loop = True
+        except RuntimeError:
+            on_loop = False
+        calls.append((on_loop, threading.current_thread().name))
+        raise NoDatabase("server selection")
+
+    monkeypatch.setattr(Topology, "_select_servers_loop", select_servers)
+    return calls
+
+
+@pytest.fixture
+def stubbed_models():
+    """Stand-ins for the modules that load the ML models (and the browser used for Facebook).
+
+    Routes under test fail at their first Mongo call, so nothing reaches the models. Modules
+    imported against the stand-ins are dropped again afterwards.
+    """
+    class Batcher:
+        backlog = 0
+        stats = {}
+
+        async def score(self, comments):
+            raise AssertionError("no comments are scored in this test")
+
+    def module(name, **attributes):
+        stub = types.ModuleType(name)
+        stub.__dict__.update(attributes)
+        return stub
+
+    stubs = {
+        "app.services.sentiment": module("app.services.sentiment", batcher=Batcher(), count_labels=lambda labels: {}),
+        "app.services.topic": module("app.services.topic", analyze_topics=lambda texts: []),
+    }
+    try:
+        import playwright.sync_api  # noqa: F401
+    except ImportError:
+        stubs["playwright"] = module("playwright")
+        stubs["playwright.sync_api"] = module(
+            "playwright.sync_api", sync_playwright=None, TimeoutError=type("TimeoutError", (Exception,), {})
+        )
+    before = set(sys.modules)
+    sys.modules.update(stubs)
+    try:
+        yield
+    finally:
+        for name in set(sys.modules) - before:
+            del sys.modules[name]
+
+
+def routers():
+    from app.api import analyze, home, jobs, posts, prefetch, profile, search, stats, users
+    from app.routes import user
+
+    return [(analyze.router, "/api"), (posts.router, ""), (jobs.router, "/api"), (prefetch.router, "/api"),
+            (stats.router, "/api"), (home.router, "/api"), (search.router, "/api"), (profile.router, ""),
+            (users.router, ""), (user.router, "")]
+
+
+def test_routes_reach_mongo_only_from_executor_threads(mongo_calls, stubbed_models):
+    app = FastAPI()
+    for router, prefix in routers():
+        app.include_router(router, prefix=prefix)
+    principal = {"uid": "uid", "email": "user@example.com", "name": "User"}
+    app.dependency_overrides[get_current_user] = lambda: principal
+    app.dependency_overrides[verify_token] = lambda: principal
+
+    @app.middleware("http")
+    async def authenticate(request, call_next):
+        request.state.user = principal  # app.routes.user reads the principal from the request state
+        return await call_next(request)
+
+    url = "https://www.reddit.com/r/test/comments/abc123/title/"
+    # One body for every route: each reads the fields it needs (profile, analysis URL(s))
+    body = {"uid": "uid", "email": "user@example.com", "displayName": "User", "photoURL": "", "url": url,
+            "urls": [url]}
+    unreached = []
+    # One client for every request: Motor stays bound to the event loop it first ran on
+    with TestClient(app, raise_server_exceptions=False) as client:
+        for route in app.routes:
+            if not isinstance(route, APIRoute):
+                continue
+            path = re.sub(r"\{[^}]+\}", str(ObjectId()), route.path)
+            params = {p.alias: "feedback" for p in route.dependant.query_params if p.required}
+            for method in route.methods:
+                before = len(mongo_calls)
+                client.request(method, path, params=params, json=body)
+                if len(mongo_calls) == before:
+                    unreached.append(f"{method} {route.path}")
+
+    on_loop = [call for call in mongo_calls if call[0]]
+    assert not on_loop, f"Synchronous Mongo calls on the event loop: {on_loop}"
+    # Guard against the test passing because requests failed before reaching the driver
+    assert unreached == NO_MONGO, f"Routes that never reached Mongo: {unreached}"
+
+
+def test_app_uses_only_the_async_client():
+    offenders = []
+    for path in APP_DIR.rglob("*.py"):
+        tree = ast.parse(path.read_text(encoding="utf-8"))
+        for node in ast.walk(tree):
+            names = []
+            if isinstance(node, ast.ImportFrom) and node.module and node.module.startswith("pymongo"):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == "pymongo":
+                names = [node.attr]
+            if "MongoClient" in names:
+                offenders.append(f"{path.relative_to(APP_DIR.parent)}:{node.lineno}")
+    assert not offenders, f"Synchronous MongoClient used in: {offenders}"
@@ -0,0 +1,50 @@
+import asyncio
+import os
+import time
+
+from app.services.cache import ResponseCache
+
+
+def test_put_then_get_round_trips(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttls={})
+
+    async def run():
+        await cache.put("youtube", "k", {"items": [1, 2]}, size=10, etag='"abc"')
+        return await cache.get("youtube", "k")
+
+    entry = asyncio.run(run())
+    assert entry["payload"] == {"items": [1, 2]}
+    assert entry["etag"] == '"abc"'
+    assert asyncio.run(cache.get("youtube", "missing")) is None
+
+
+def test_evicts_least_recently_used_entries_beyond_the_cap(tmp_path):
+    payload = os.urandom(2000).hex()  # incompressible
+    cache = ResponseCache(str(tmp_path), ttls={})
+
+    async def run():
+        for key in ("a", "b", "c"):
+            await cache.put("reddit", key, payload, size=len(payload))
+        # Room for three and a half entries
+        cache.max_bytes = cache.size_bytes * 7 // 6
+        await cache.get("reddit", "a")  # "b" is now the least recently used
+        await cache.put("reddit", "d", payload, size=len(payload))
+
+    asyncio.run(run())
+    assert cache.size_bytes <= cache.max_bytes
+    assert not (tmp_path / "reddit" / "b.json.z").exists()
+    assert (tmp_path / "reddit" / "a.json.z").exists()
+    assert (tmp_path / "reddit" / "d.json.z").exists()
+    assert cache.stats["evictions"] == 1
+
+
+def test_existing_entries_count_towards_the_cap(tmp_path):
+    payload = os.urandom(2000).hex()
+    first = ResponseCache(str(tmp_path), ttls={})
+    asyncio.run(first.put("reddit", "old", payload, size=len(payload)))
+    time.sleep(0.01)
+
+    second = ResponseCache(str(tmp_path), ttls={}, max_bytes=first.size_bytes * 3 // 2)
+    asyncio.run(second.put("reddit", "new", payload, size=len(payload)))
+    assert not (tmp_path / "reddit" / "old.json.z").exists()
+    assert (tmp_path / "reddit" / "new.json.z").exists()
@@ -0,0 +1,56 @@
+import pytest
+
+from app.services.canonical import canonical_identity, canonicalize_url
+from app.services.stackexchange import api_site
+
+
+def test_facebook_query_identified_posts_are_distinct():
+    first = canonical_identity("https://www.facebook.com/permalink.php?story_fbid=111&id=42")
+    second = canonical_identity("https://www.facebook.com/permalink.php?story_fbid=222&id=42")
+    assert first != second
+    assert first == canonical_identity("https://m.facebook.com/permalink.php?id=42&story_fbid=111&fbclid=x")
+
+
+@pytest.mark.parametrize("url_a, url_b", [
+    ("https://www.facebook.com/story.php?story_fbid=1&id=9", "https://www.facebook.com/story.php?story_fbid=2&id=9"),
+    ("https://www.facebook.com/watch/?v=123", "https://www.facebook.com/watch/?v=456"),
+    ("https://www.facebook.com/photo.php?fbid=7", "https://www.facebook.com/photo.php?fbid=8"),
+])
+def test_facebook_identifying_params_are_part_of_the_id(url_a, url_b):
+    assert canonical_identity(url_a) != canonical_identity(url_b)
+
+
+def test_facebook_path_identified_posts_keep_their_id():
+    identity = canonical_identity("https://www.facebook.com/somepage/posts/pfbid0abc/?ref=share")
+    assert identity.post_id == "somepage/posts/pfbid0abc"
+
+
+def test_facebook_query_page_without_an_id_is_rejected():
+    with pytest.raises(ValueError):
+        canonical_identity("https://www.facebook.com/permalink.php")
+
+
+def test_stackexchange_meta_sites_do_not_collide():
+    so_meta = canonical_identity("https://meta.stackoverflow.com/questions/123/title")
+    se_meta = canonical_identity("https://meta.stackexchange.com/questions/123/title")
+    assert so_meta != se_meta
+    assert so_meta.post_id == "meta.stackoverflow/123"
+    assert se_meta.post_id == "meta/123"
+    assert canonical_identity("https://math.stackexchange.com/questions/5/x").post_id == "math/5"
+    assert canonical_identity("https://stackoverflow.com/questions/5/x").post_id == "stackoverflow/5"
+
+
+@pytest.mark.parametrize("host, site", [
+    ("stackoverflow.com", "stackoverflow"),
+    ("www.stackoverflow.com", "stackoverflow"),
+    ("meta.stackoverflow.com", "meta.stackoverflow"),
+    ("math.stackexchange.com", "math"),
+    ("math.meta.stackexchange.com", "math.meta"),
+    ("meta.stackexchange.com", "meta"),
+])
+def test_api_site(host, site):
+    assert api_site(host) == site
+
+
+def test_canonicalize_drops_tracking_params():
+    assert canonicalize_url("http://www.youtube.com/watch?v=abc&utm_source=x&si=y") == "https://youtube.com/watch?v=abc"
@@ -0,0 +1,73 @@
+"""Explain every hot query against a disposable Mongo with the registry applied.
+
+Uses MONGO_TEST_URI when set, otherwise starts a throwaway `mongod` from PATH; skipped when
+neither is available.
+"""
+
+import asyncio
+import os
+import shutil
+import socket
+import subprocess
+import time
+import uuid
+
+import pytest
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.db.indexes import INDEXES, apply_indexes, find_collscans, hot_queries
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def mongo_uri(tmp_path_factory):
+    if os.environ.get("MONGO_TEST_URI"):
+        yield os.environ["MONGO_TEST_URI"]
+        return
+    mongod = shutil.which("mongod")
+    if mongod is None:
+        pytest.skip("No MONGO_TEST_URI and no mongod on PATH")
+    port = _free_port()
+    process = subprocess.Popen(
+        [mongod, "--dbpath", str(tmp_path_factory.mktemp("mongo")), "--port", str(port), "--bind_ip", "127.0.0.1"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    pytest.skip("mongod did not start")
+                time.sleep(0.2)
+        yield f"mongodb://127.0.0.1:{port}"
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def test_every_hot_query_collection_has_an_index():
+    indexed = {spec.collection for spec in INDEXES}
+    assert {query.collection for query in hot_queries()} <= indexed
+
+
+def test_no_hot_query_scans_a_collection(mongo_uri):
+    async def run():
+        client = AsyncIOMotorClient(mongo_uri, serverSelectionTimeoutMS=5000)
+        db = client[f"test_indexes_{uuid.uuid4().hex[:8]}"]
+        try:
+            changes = await apply_indexes(db)
+            assert not [change for change in changes if change.startswith("failed")]
+            return await find_collscans(db)
+        finally:
+            await client.drop_database(db.name)
+            client.close()
+
+    assert asyncio.run(run()) == []
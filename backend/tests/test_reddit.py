@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from asyncpraw.models import MoreComments
+
+from app.services import reddit
+
+SINCE = datetime(2024, 1, 1, 12, 0)
+NEW, OLD = SINCE.replace(tzinfo=timezone.utc).timestamp() + 60, SINCE.replace(tzinfo=timezone.utc).timestamp() - 60
+
+
+class Stub(MoreComments):
+    """A "load more comments" stub that resolves to `children` and records that it was expanded."""
+
+    def __init__(self, parent_id: str, children: list, expanded: list):
+        super().__init__(None, _data={"count": len(children), "parent_id": parent_id, "children": []})
+        self.loaded, self.expanded = children, expanded
+
+    async def comments(self):
+        self.expanded.append(self.parent_id)
+        return self.loaded
+
+
+def comment(id: str, parent_id: str, created_utc: float, replies=(), stickied=False):
+    return SimpleNamespace(id=id, fullname=f"t1_{id}", parent_id=parent_id, created_utc=created_utc, score=1,
+                           stickied=stickied, replies=SimpleNamespace(list=lambda: list(replies)))
+
+
+def submission(items: list):
+    return SimpleNamespace(id="post", fullname="t3_post", score=10, num_comments=len(items),
+                           comments=SimpleNamespace(list=lambda: items))
+
+
+@pytest.fixture(autouse=True)
+def no_rate_limit(monkeypatch):
+    async def acquire(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(reddit.scheduler, "acquire", acquire)
+
+
+def expand(items: list, since=None):
+    return asyncio.run(reddit.expand_comment_tree(submission(items), max_requests=32, time_budget=10, concurrency=4,
+                                                  since=since))
+
+
+def test_refresh_expands_only_top_level_stubs_until_it_reaches_since():
+    expanded = []
+    # Each top-level "load more" holds the next (older) top-level comments and another stub
+    oldest_page = [comment("c5", "t3_post", OLD)]
+    older_page = [comment("c3", "t3_post", NEW), comment("c4", "t3_post", OLD), Stub("t3_post", oldest_page, expanded)]
+    items = [
+        comment("pinned", "t3_post", OLD, stickied=True),
+        comment("c1", "t3_post", NEW),
+        Stub("t1_c1", [comment("r1", "t1_c1", NEW)], expanded),  # replies of an existing comment
+        comment("c2", "t3_post", NEW),
+        Stub("t3_post", older_page, expanded),
+    ]
+
+    comments, coverage = expand(items, since=SINCE)
+
+    # The first top-level stub is expanded; it reaches `since`, so the one it returns is not
+    assert expanded == ["t3_post"]
+    assert [c.id for c in comments] == ["pinned", "c1", "c2", "c3", "c4"]
+    assert coverage["expansion_requests"] == 1 and not coverage["budget_exhausted"]
+
+
+def test_first_load_expands_every_stub():
+    expanded = []
+    items = [
+        comment("c1", "t3_post", OLD),
+        Stub("t1_c1", [comment("r1", "t1_c1", OLD)], expanded),
+        Stub("t3_post", [comment("c2", "t3_post", OLD)], expanded),
+    ]
+
+    comments, coverage = expand(items)
+
+    assert sorted(expanded) == ["t1_c1", "t3_post"]
+    assert {c.id for c in comments} == {"c1", "r1", "c2"}
+    assert coverage["expansion_requests"] == 2
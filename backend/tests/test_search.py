@@ -0,0 +1,175 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app.services import search
+from app.services.pagination import InvalidCursor
+
+NOW = datetime.utcnow()
+
+
+class Corpus:
+    """A user's posts indexed into segments and loaded as their UserIndex, without Mongo."""
+
+    def __init__(self, monkeypatch):
+        self.user_id = f"user-{uuid.uuid4().hex[:8]}"
+        self.user = search.UserIndex(self.user_id)
+        self.comments = {}  # analysis id -> stored comments
+        monkeypatch.setitem(search._user_indexes, self.user_id, self.user)
+        monkeypatch.setattr(search, "comments_at", self.comments_at)
+
+    def add(self, text: str, comments: list[str] = (), platform="reddit", age_days=0) -> dict:
+        published = NOW - timedelta(days=age_days)
+        post = {
+            "_id": ObjectId(), "analysis_id": ObjectId(), "platform": platform, "created_at": published,
+            "post": {"text": text, "timestamp": published.isoformat()}, "generation": 1,
+        }
+        stored = [
+            {"text": text, "author": f"author{i}", "sentiment": "positive", "timestamp": published.isoformat()}
+            for i, text in enumerate(comments)
+        ]
+        self.comments[post["analysis_id"]] = stored
+        segment = search.index.put(search.segment_key(post), str(uuid.uuid4()), post["post"], stored)
+        self.user.put(post, segment)
+        return post
+
+    async def comments_at(self, analysis_id, generation, positions):
+        assert generation == 1
+        stored = self.comments[analysis_id]
+        return {p: stored[p] for p in positions if p < len(stored)}
+
+
+@pytest.fixture
+def corpus(monkeypatch):
+    return Corpus(monkeypatch)
+
+
+def titles(results) -> list[str]:
+    return [post["post"]["text"] for post, _ in results]
+
+
+def all_pages(fetch, limit: int) -> tuple[list, list[dict]]:
+    results, pages, cursor = [], [], None
+    while True:
+        page = asyncio.run(fetch(limit=limit, cursor=cursor))
+        pages.append(page)
+        results += page["results"]
+        cursor = page["nextCursor"]
+        if cursor is None:
+            return results, pages
+
+
+def test_posts_are_ranked_by_bm25(corpus):
+    corpus.add("camera quality great")
+    corpus.add("battery screen drain noon")
+    corpus.add("battery battery drain noon")
+    corpus.add("battery screen drain noon speakers keyboard hinge trackpad")
+
+    found = asyncio.run(search.search_posts(corpus.user_id, "battery"))
+
+    # More mentions rank first, then the shorter post among equal mentions
+    assert titles(found["results"]) == [
+        "battery battery drain noon",
+        "battery screen drain noon",
+        "battery screen drain noon speakers keyboard hinge trackpad",
+    ]
+    scores = [score for _, score in found["results"]]
+    assert scores == sorted(scores, reverse=True) and scores[-1] > 0
+    assert found["total"] == 3 and found["nextCursor"] is None
+
+
+def test_rarer_terms_weigh_more(corpus):
+    for i in range(5):
+        corpus.add(f"battery report {i}")
+    corpus.add("overheating report")
+
+    found = asyncio.run(search.search_posts(corpus.user_id, "battery overheating"))
+
+    assert titles(found["results"])[0] == "overheating report"
+    assert found["total"] == 6
+
+
+def test_post_pages_continue_without_gaps_or_duplicates(corpus):
+    for i in range(8):
+        corpus.add(f"battery {'battery ' * i}note {i}", age_days=i)
+    since = NOW - timedelta(days=30)
+    everything = asyncio.run(search.search_posts(corpus.user_id, "battery", since=since, limit=100))
+
+    for query in ("battery", None):
+        fetch = lambda **page: search.search_posts(corpus.user_id, query, since=since, **page)
+        paged, pages = all_pages(fetch, limit=3)
+        ids = [post["_id"] for post, _ in paged]
+        assert len(pages) == 3
+        assert len(set(ids)) == len(ids) == 8
+        assert all(page["total"] == 8 and page["facets"] == pages[0]["facets"] for page in pages)
+        if query:
+            assert ids == [post["_id"] for post, _ in everything["results"]]
+        else:
+            assert titles(paged)[0] == "battery note 0"  # newest first without a query
+
+
+def test_cursor_of_another_search_is_rejected(corpus):
+    for i in range(3):
+        corpus.add(f"battery {i}")
+    page = asyncio.run(search.search_posts(corpus.user_id, "battery", limit=1))
+
+    with pytest.raises(InvalidCursor):
+        asyncio.run(search.search_posts(corpus.user_id, None, cursor=page["nextCursor"]))
+    with pytest.raises(InvalidCursor):
+        asyncio.run(search.search_comments(corpus.user_id, "battery", cursor=page["nextCursor"]))
+
+
+def test_comment_hits_return_the_matching_comment(corpus):
+    first = corpus.add("phone review", ["love the screen", "battery died in an hour", "meh"])
+    second = corpus.add("tablet review", ["battery battery battery, all day long", "the battery is fine"],
+                        platform="youtube")
+
+    found = asyncio.run(search.search_comments(corpus.user_id, "battery"))
+
+    hits = [(post["_id"], position, comment["text"]) for post, position, comment, _ in found["results"]]
+    # Three mentions rank first; each hit is the comment at its stored position
+    assert sorted(hits) == sorted([
+        (second["_id"], 0, "battery battery battery, all day long"),
+        (second["_id"], 1, "the battery is fine"),
+        (first["_id"], 1, "battery died in an hour"),
+    ])
+    assert hits[0] == (second["_id"], 0, "battery battery battery, all day long")
+    assert found["total"] == 3
+
+    on_reddit = asyncio.run(search.search_comments(corpus.user_id, "battery", platform="reddit"))
+    assert [(post["_id"], position) for post, position, _, _ in on_reddit["results"]] == [(first["_id"], 1)]
+    by_author = asyncio.run(search.search_comments(corpus.user_id, "battery", author="AUTHOR1"))
+    assert {(post["_id"], position) for post, position, _, _ in by_author["results"]} == {
+        (first["_id"], 1), (second["_id"], 1),
+    }
+
+
+def test_comment_pages_continue_without_gaps_or_duplicates(corpus):
+    for i in range(4):
+        corpus.add(f"post {i}", [f"battery {'battery ' * j}comment" for j in range(5)])
+    everything = asyncio.run(search.search_comments(corpus.user_id, "battery", limit=100))
+
+    for order in ("relevance", "newest"):
+        fetch = lambda **page: search.search_comments(corpus.user_id, "battery", order=order, **page)
+        paged, pages = all_pages(fetch, limit=6)
+        hits = [(post["_id"], position) for post, position, _, _ in paged]
+        assert len(pages) == 4
+        assert len(set(hits)) == len(hits) == 20
+        if order == "relevance":
+            assert hits == [(post["_id"], position) for post, position, _, _ in everything["results"]]
+
+
+def test_index_updates_reach_the_next_search(corpus):
+    kept = corpus.add("battery kept")
+    dropped = corpus.add("battery dropped")
+    assert asyncio.run(search.search_posts(corpus.user_id, "battery"))["total"] == 2
+
+    corpus.user.remove(search.segment_key(dropped))
+    corpus.add("battery added")
+
+    found = asyncio.run(search.search_posts(corpus.user_id, "battery"))
+    assert sorted(titles(found["results"])) == ["battery added", "battery kept"]
+    assert kept["_id"] in [post["_id"] for post, _ in found["results"]]
@@ -0,0 +1,95 @@
+import asyncio
+
+from app.services.watch import COOL_DOWN_FACTOR, TARGET_COMMENTS_PER_POLL, WatchScheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def scheduler(new_comments: list[int], clock: FakeClock, min_interval=60, max_interval=3600):
+    """A scheduler whose refresher reports the next value of `new_comments` on each poll."""
+    results = iter(new_comments)
+
+    async def refresher(target):
+        return next(results)
+
+    return WatchScheduler(refresher, max_watched=10, min_interval=min_interval, max_interval=max_interval,
+                          clock=clock)
+
+
+def poll_when_due(watches: WatchScheduler, clock: FakeClock, polls: int, key="post") -> list[float]:
+    """Advance the clock to each due time and poll; returns the intervals chosen after each poll."""
+    intervals = []
+
+    async def run():
+        watch = watches.watches[key]
+        for _ in range(polls):
+            clock.now = watch.next_due
+            await watches.run_once()
+            intervals.append(watch.interval)
+
+    asyncio.run(run())
+    return intervals
+
+
+def test_quiet_post_backs_off_geometrically_up_to_the_cap():
+    clock = FakeClock()
+    watches = scheduler([0] * 8, clock)
+    watches.watch("post", "target", "uid")
+
+    intervals = poll_when_due(watches, clock, 8)
+
+    expected, interval = [], 60.0
+    for _ in range(8):
+        interval = min(3600.0, interval * COOL_DOWN_FACTOR)
+        expected.append(interval)
+    assert intervals == expected
+    assert intervals[-1] == 3600.0
+    assert intervals.count(3600.0) > 1  # stays at the cap
+
+
+def test_new_comments_reset_the_backoff():
+    clock = FakeClock()
+    watches = scheduler([0, 0, 0, 0, 40], clock)
+    watches.watch("post", "target", "uid")
+
+    intervals = poll_when_due(watches, clock, 5)
+
+    assert intervals[:4] == [120.0, 240.0, 480.0, 960.0]
+    # 40 comments over the 960s window: sized to pick up TARGET_COMMENTS_PER_POLL next time
+    assert intervals[4] == TARGET_COMMENTS_PER_POLL / (40 / 960)
+
+
+def test_busy_post_is_polled_no_faster_than_the_floor():
+    clock = FakeClock()
+    watches = scheduler([10_000], clock)
+    watches.watch("post", "target", "uid")
+
+    assert poll_when_due(watches, clock, 1) == [60.0]
+
+
+def test_watch_is_not_polled_before_it_is_due():
+    clock = FakeClock()
+    polled = []
+
+    async def refresher(target):
+        polled.append(clock.now)
+        return 0
+
+    watches = WatchScheduler(refresher, max_watched=10, min_interval=60, max_interval=3600, clock=clock)
+    watch = watches.watch("post", "target", "uid")
+
+    async def run():
+        clock.now += 59
+        await watches.run_once()
+        clock.now += 1
+        await watches.run_once()
+
+    asyncio.run(run())
+    assert polled == [1060.0]
+    assert watch.next_due == 1060.0 + 120.0
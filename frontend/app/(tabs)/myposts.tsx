@@ -32,28 +32,36 @@ export default function MyPostsScreen() {
 
   const [posts, setPosts] = useState<Post[]>([]);
   const [loading, setLoading] = useState(true);
+  // /api/posts/mine returns one page at a time; the next page's cursor comes in X-Next-Cursor
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   // Track which posts have expanded text
   const [expandedPosts, setExpandedPosts] = useState<{ [id: string]: boolean }>({});
 
+  const fetchPage = async (cursor: string | null) => {
+    const token = await getIdToken();
+    const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+    const res = await fetch(`${API_URL}/api/posts/mine${query}`, {
+      headers: {
+        Authorization: `Bearer ${token}`,
+      },
+    });
+
+    if (!res.ok) {
+      throw new Error('Failed to fetch posts');
+    }
+
+    const data: Post[] = await res.json();
+    setNextCursor(res.headers.get('X-Next-Cursor'));
+    return data;
+  };
+
   useEffect(() => {
     const fetchMyPosts = async () => {
       setLoading(true);
       try {
-        const token = await getIdToken();
-        const res = await fetch(`${API_URL}/api/posts/mine`, {
-          headers: {
-            Authorization: `Bearer ${token}`,
-          },
-        });
-
-        if (!res.ok) {
-          throw new Error('Failed to fetch posts');
-        }
-
-        const data = await res.json();
-        console.log('Fetched posts:', data); // Debug log
-        setPosts(data);
+        setPosts(await fetchPage(null));
       } catch (err) {
         console.error('❌ Error fetching posts:', err);
       } finally {
@@ -64,6 +72,19 @@ export default function MyPostsScreen() {
     fetchMyPosts();
   }, []);
 
+  const loadMore = async () => {
+    if (loading || loadingMore || !nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const page = await fetchPage(nextCursor);
+      setPosts((loaded) => [...loaded, ...page]);
+    } catch (err) {
+      console.error('❌ Error fetching more posts:', err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const toggleText = (postId: string) => {
     setExpandedPosts((prev) => ({
       ...prev,
@@ -145,6 +166,11 @@ export default function MyPostsScreen() {
           keyExtractor={(item) => item._id}
           renderItem={renderItem}
           contentContainerStyle={styles.container}
+          onEndReached={loadMore}
+          onEndReachedThreshold={0.5}
+          ListFooterComponent={
+            loadingMore ? <ActivityIndicator size="small" color="#5E2B97" style={{ marginVertical: 16 }} /> : null
+          }
         />
       )}
     </>
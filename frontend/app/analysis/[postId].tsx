@@ -28,6 +28,12 @@ export default function AnalysisScreen() {
   const [error, setError] = useState<string | null>(null);
   const [showAllComments, setShowAllComments] = useState(false);
   const [showFullText, setShowFullText] = useState(false);
+  // Comments are paged in by bucket from /comments once the list is opened
+  const [comments, setComments] = useState<any[]>([]);
+  const [nextBucket, setNextBucket] = useState(0);
+  const [totalBuckets, setTotalBuckets] = useState<number | null>(null);
+  const [loadingComments, setLoadingComments] = useState(false);
+  const [commentsError, setCommentsError] = useState<string | null>(null);
 
   useEffect(() => {
     if (!postId) {
@@ -38,6 +44,10 @@ export default function AnalysisScreen() {
 
     setLoading(true);
     setError(null);
+    setComments([]);
+    setNextBucket(0);
+    setTotalBuckets(null);
+    setCommentsError(null);
 
     const unsubscribe = onAuthStateChanged(auth, async (user) => {
       if (!user) {
@@ -70,12 +80,54 @@ export default function AnalysisScreen() {
     return () => unsubscribe();
   }, [postId]);
 
+  const loadComments = async () => {
+    if (loadingComments || (totalBuckets !== null && nextBucket >= totalBuckets)) return;
+    setLoadingComments(true);
+    setCommentsError(null);
+    try {
+      const user = auth.currentUser;
+      if (!user) {
+        throw new Error('User not authenticated');
+      }
+      const idToken = await user.getIdToken();
+      const res = await fetch(`${API_URL}/api/analyze/${postId}/comments?bucket=${nextBucket}`, {
+        headers: {
+          'Authorization': `Bearer ${idToken}`,
+          'Content-Type': 'application/json',
+        },
+      });
+      if (res.status === 404 && nextBucket === 0) {
+        // No stored comments
+        setTotalBuckets(0);
+        return;
+      }
+      if (!res.ok) {
+        throw new Error(`Error fetching comments: ${res.status}`);
+      }
+      const page = await res.json();
+      setComments((loaded) => [...loaded, ...page.comments]);
+      setTotalBuckets(page.buckets);
+      setNextBucket(page.bucket + 1);
+    } catch (e: any) {
+      setCommentsError(e.message || 'Failed to fetch comments.');
+    } finally {
+      setLoadingComments(false);
+    }
+  };
+
+  const toggleComments = () => {
+    const show = !showAllComments;
+    setShowAllComments(show);
+    if (show && totalBuckets === null) {
+      loadComments();
+    }
+  };
+
   if (loading) return <Text style={{ padding: 20 }}>Loading...</Text>;
   if (error) return <Text style={{ padding: 20, color: 'red' }}>{error}</Text>;
   if (!data) return <Text style={{ padding: 20 }}>No data found.</Text>;
 
-  const { platform, comments, sentiment, topics, post } = data;
-  const safeComments = Array.isArray(comments) ? comments : [];
+  const { platform, sentiment, topics, post, commentCount } = data;
   const maxLength = 180;
   const isLong = post.text.length > maxLength;
   const displayedText = showFullText || !isLong ? post.text : post.text.slice(0, maxLength);
@@ -138,16 +190,16 @@ export default function AnalysisScreen() {
             )}
           </Text>
 
-          <TouchableOpacity onPress={() => setShowAllComments(!showAllComments)}>
+          <TouchableOpacity onPress={toggleComments}>
             <Text style={styles.commentsToggle}>
-              comments {showAllComments ? '▲' : '▼'}
+              {typeof commentCount === 'number' ? `${commentCount} ` : ''}comments {showAllComments ? '▲' : '▼'}
             </Text>
           </TouchableOpacity>
 
-          {showAllComments && safeComments.length > 0 && (
+          {showAllComments && comments.length > 0 && (
             <View style={styles.commentContainer}>
               <FlatList
-                data={safeComments}
+                data={comments}
                 keyExtractor={(_, index) => index.toString()}
                 renderItem={({ item }) => {
                   type SentimentType = 'positive' | 'neutral' | 'negative';
@@ -166,6 +218,15 @@ export default function AnalysisScreen() {
               />
             </View>
           )}
+          {showAllComments && loadingComments && <Text style={styles.commentsStatus}>Loading comments...</Text>}
+          {showAllComments && commentsError && (
+            <Text style={[styles.commentsStatus, { color: 'red' }]}>{commentsError}</Text>
+          )}
+          {showAllComments && !loadingComments && totalBuckets !== null && nextBucket < totalBuckets && (
+            <TouchableOpacity onPress={loadComments}>
+              <Text style={styles.commentsToggle}>Load more comments</Text>
+            </TouchableOpacity>
+          )}
         </View>
 
         {sentiment && <SentimentSemiCircle data={sentiment} />}
@@ -211,6 +272,7 @@ const styles = StyleSheet.create({
     fontWeight: '600',
   },
   commentsToggle: { color: '#5E2B97', fontWeight: '500', marginBottom: 6 },
+  commentsStatus: { color: '#666', marginBottom: 6 },
   commentContainer: {
     maxHeight: 180,
     paddingVertical: 8,